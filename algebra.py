@@ -1,6 +1,7 @@
 from parsall.lexing import DefaultLexer
 from parsall.core.Streams import TokenStream
 from parsall.core.rule import *
+from parsall.logic import NodeFactory
 
 rules = [
     AlphaCharacterRule(),
@@ -12,33 +13,36 @@ rules = [
 
 lexer = DefaultLexer(rules)
 
-result = lexer.tokenise("ABCZ'+C'(AB)'")
+# Every expression is built from shared nodes, a repeated subterm is only stored once
+factory = NodeFactory()
 
-is_symbol = lambda x: x[0] == 'Symbol'
+is_symbol = lambda x: x is not None and x[0] == 'Symbol'
 
-tokens = TokenStream(result)
+def peek_text(tokens: TokenStream):
+    token = tokens.peek()
+    return None if token is None else token[1]
 
 def collect_symbol(tokens: TokenStream):
     _, symbol = tokens.pop()
     
-    if tokens.peek()[1] == "'":
+    if peek_text(tokens) == "'":
         tokens.pop()
-        return ('NOT', symbol)
+        return factory.negate(factory.variable(symbol))
     else:
-        return (symbol)
+        return factory.variable(symbol)
     
 def collect_term(tokens: TokenStream):
     ANDS = []
     while is_symbol(tokens.peek()):
         ANDS.append(collect_symbol(tokens))
     else:
-        return ('AND', ANDS)
+        return factory.conjunction(ANDS)
     
 def collect_expression(tokens: TokenStream):
 
-    expr = ""
+    expr = None
 
-    if tokens.peek()[1] == '(':
+    if peek_text(tokens) == '(':
         tokens.pop()
         expr = collect_expression(tokens)
         if tokens.pop()[1] != ')':
@@ -46,21 +50,27 @@ def collect_expression(tokens: TokenStream):
     else:
         expr = collect_term(tokens)
 
-    if tokens.peek()[1] == "+":
+    if peek_text(tokens) == "+":
         tokens.pop()
-        return ('OR', expr, collect_expression(tokens))
-    elif tokens.peek()[1] == '(':
+        return factory.disjunction([expr, collect_expression(tokens)])
+    elif peek_text(tokens) == '(':
         ANDS = [expr]
         ANDS.append(collect_expression(tokens))
-        return ('AND', ANDS)
-    elif tokens.peek()[1] == "'":
-        return ('NOT', expr)
+        return factory.conjunction(ANDS)
+    elif peek_text(tokens) == "'":
+        tokens.pop()
+        return factory.negate(expr)
     else:
         return (expr)
 
-tree = []
-tree = collect_expression(tokens)
+if __name__ == "__main__":
+    result = lexer.tokenise("ABCZ'+C'(AB)'")
+    tokens = TokenStream(result)
+
+    tree = collect_expression(tokens)
 
+    print(tree, "simplified:", factory.simplify(tree))
 
-from pprint import pprint
-pprint(tree)
\ No newline at end of file
+    table = factory.truth_table(tree)
+    print(table, "minterms:", table.minterms())
+    print(factory.stats())
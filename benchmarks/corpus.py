@@ -0,0 +1,93 @@
+"""
+Synthetic, deterministic inputs for the benchmarks, generated to any size.
+"""
+import random
+from parsall.semantics import cpp, python
+
+
+def python_rules():
+    """The rules of the `python` language pack, as used by textparser.py."""
+    return python.rules()
+
+
+PYTHON_IGNORE = python.ignore
+
+
+def cpp_rules():
+    """The rules of the `cpp` language pack."""
+    return cpp.rules()
+
+
+CPP_IGNORE = cpp.ignore
+
+
+def _name(rng):
+    return rng.choice(["value", "count", "item", "node", "result", "index", "buffer", "total"]) + str(rng.randint(0, 99))
+
+
+def python_source(size: int, seed=0) -> str:
+    """Roughly `size` characters of Python-like code."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.15:
+            line = f"def {_name(rng)}({_name(rng)}, {_name(rng)}=None):"
+        elif kind < 0.25:
+            line = f"    # {' '.join(_name(rng) for _ in range(rng.randint(2, 12)))}"
+        elif kind < 0.35:
+            line = f"    {_name(rng)} = \"{'x' * rng.randint(0, 60)}\""
+        elif kind < 0.45:
+            line = f"    for {_name(rng)} in {_name(rng)}[{rng.randint(0, 9)}:]:"
+        elif kind < 0.55:
+            line = f"    if {_name(rng)} >= {rng.randint(0, 9999)} and not {_name(rng)}:"
+        else:
+            line = f"    {_name(rng)} = {_name(rng)}.{_name(rng)}({rng.randint(0, 999)}, {_name(rng)}) * {rng.randint(1, 9)}"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def cpp_source(size: int, seed=0) -> str:
+    """Roughly `size` characters of C++-like code."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.1:
+            line = f"static_cast<unsigned int>({_name(rng)}) <<= {rng.randint(0, 31)};"
+        elif kind < 0.2:
+            line = f"// {' '.join(_name(rng) for _ in range(rng.randint(2, 12)))}"
+        elif kind < 0.25:
+            line = f"/* {' '.join(_name(rng) for _ in range(rng.randint(2, 30)))} */"
+        elif kind < 0.35:
+            line = f"const char* {_name(rng)} = \"{'y' * rng.randint(0, 60)}\";"
+        elif kind < 0.5:
+            line = f"for (int {_name(rng)} = 0; {_name(rng)} <= {rng.randint(0, 999)}; ++{_name(rng)}) {{"
+        elif kind < 0.6:
+            line = f"if ({_name(rng)} != {_name(rng)} && {_name(rng)} || !{_name(rng)}) {{ return {rng.randint(0, 9)}; }}"
+        else:
+            line = f"{_name(rng)}[{rng.randint(0, 99)}] += {_name(rng)} * ({_name(rng)} - {rng.randint(0, 999)}) % {rng.randint(1, 9)};"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def boolean_expressions(size: int, seed=0):
+    """Sum-of-products boolean expressions in algebra.py syntax, about `size` characters in total."""
+    rng = random.Random(seed)
+    expressions = []
+    length = 0
+    while length < size:
+        terms = []
+        for _ in range(rng.randint(1, 20)):
+            term = "".join(rng.choice("ABCDEFGH") + ("'" if rng.random() < 0.3 else "") for _ in range(rng.randint(1, 6)))
+            if rng.random() < 0.2:
+                term += "(" + "+".join(rng.choice("ABCDEFGH") for _ in range(rng.randint(2, 4))) + ")"
+            terms.append(term)
+        expression = "(" + "+".join(terms) + ")'"
+        expressions.append(expression)
+        length += len(expression)
+    return expressions
@@ -0,0 +1,80 @@
+"""
+Table driven `ExpressionRule` against the equivalent chain of `BinaryOpRule`s,
+one per precedence level, on long and deeply nested C++ style expressions.
+
+    python -m benchmarks.expressions
+"""
+import random
+import sys
+import time
+from functools import partial
+from parsall.core._parser import *
+
+# Loosest to tightest, roughly the C++ binary operator levels
+LEVELS = [
+    ['||'], ['&&'], ['|'], ['^'], ['&'], ['==', '!='], ['<', '<=', '>', '>='],
+    ['<<', '>>'], ['+', '-'], ['*', '/', '%'],
+]
+
+
+def make_tokens(operands=20000, depth=12, seed=0):
+    """A flat run of random binary operators with every few operands wrapped in brackets."""
+    random.seed(seed)
+    ops = [op for level in LEVELS for op in level]
+
+    def expression(n, nesting):
+        tokens = []
+        for i in range(n):
+            if i:
+                op = random.choice(ops)
+                tokens.append((op, op))
+            if nesting < depth and random.random() < 0.3:
+                tokens.append(("(", "("))
+                tokens.extend(expression(3, nesting + 1))
+                tokens.append((")", ")"))
+            else:
+                tokens.append(("number", str(random.randint(0, 99))))
+        return tokens
+
+    return expression(operands, 0)
+
+
+def chain_parser(tokens):
+    term = partial(ChoiceRule, alternatives=[NumberRule, ParenRule])
+    rule = term
+    for level in reversed(LEVELS):
+        rule = partial(BinaryOpRule, ops=level, next_rule=rule)
+    return Parser(tokens, rule, term)
+
+
+def table_parser(tokens):
+    table = OperatorTable()
+    for precedence, level in enumerate(LEVELS):
+        table.add_infix(level, precedence)
+
+    term = partial(ChoiceRule, alternatives=[NumberRule, ParenRule])
+    return Parser(tokens, partial(ExpressionRule, operators=table, operand=term), term)
+
+
+def run(name, make_parser, tokens, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        parser = make_parser(tokens)
+        start = time.perf_counter()
+        tree = parser.parse()
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{name:<16} {best * 1000:9.1f} ms {len(tokens) / best:12.0f} tokens/s")
+    return tree
+
+
+if __name__ == "__main__":
+    # The chain recurses once per level per bracket, give it room
+    sys.setrecursionlimit(100000)
+
+    tokens = make_tokens()
+    print(f"{len(tokens)} tokens, {len(LEVELS)} precedence levels")
+
+    chained = run("BinaryOpRule", chain_parser, tokens)
+    table = run("ExpressionRule", table_parser, tokens)
+    assert repr(chained) == repr(table)
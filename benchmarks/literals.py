@@ -0,0 +1,119 @@
+"""
+Throughput of the span based rules against the old character-by-character
+implementations on input dominated by long string literals and comments.
+
+    python -m benchmarks.literals
+"""
+import random
+import time
+from parsall.core.Streams import CharacterStream
+from parsall.lexing import DefaultLexer
+from parsall.core.rule import *
+
+
+class LegacyStringRule(SyntaxRule):
+    """StringRule as it was, building the lexeme with `+=` one pop() at a time."""
+
+    def match(self, char_stream: CharacterStream) -> str:
+        quote = char_stream.peek()
+        if quote != '"' and quote != "'":
+            return None
+
+        char_stream.pop()
+
+        match_text = ""
+        while True:
+            next_char = char_stream.pop()
+            if next_char == quote:
+                return ("string", match_text)
+            elif next_char == "\\":
+                next_char = char_stream.pop()
+                if next_char == quote or next_char in "\\trxn":
+                    match_text += next_char
+                else:
+                    raise ValueError("Syntax error in input text: " + next_char)
+            else:
+                match_text += next_char
+
+
+class LegacyCommentRule(SyntaxRule):
+    """CommentRule as it was, walking to the terminator one pop() at a time."""
+
+    def __init__(self, comment_pattern, terminator) -> None:
+        self.begin = comment_pattern
+        self.terminator = terminator
+        self.pattern_length = len(comment_pattern)
+
+    def match(self, char_stream: CharacterStream) -> str:
+        if char_stream.lookahead(self.pattern_length) != self.begin:
+            return None
+
+        char_stream.advance(self.pattern_length)
+
+        comment_string = ""
+        while char_stream.peek() != self.terminator:
+            comment_string += char_stream.pop()
+        char_stream.pop()
+
+        return ("Comment", comment_string)
+
+
+class LegacyIdentifierRule(SyntaxRule):
+    def match(self, char_stream: CharacterStream) -> str:
+        first_char = char_stream.peek()
+        if not first_char.isalpha() and first_char != '_':
+            return None
+
+        identifier = char_stream.pop()
+        while True:
+            next_char = char_stream.peek()
+            if next_char is None or not (next_char.isalnum() or next_char == '_'):
+                break
+            identifier += char_stream.pop()
+
+        return ("symbol", identifier)
+
+
+def make_input(lines=2000, literal_length=2000, seed=0):
+    """Assignments of long base64-ish strings, each preceded by a long comment."""
+    random.seed(seed)
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+    out = []
+    for i in range(lines):
+        blob = "".join(random.choice(alphabet) for _ in range(literal_length))
+        out.append(f"# {blob[::-1]}\n")
+        out.append(f"value_{i} = \"{blob}\"\n")
+    return "".join(out)
+
+
+def rules(string_rule, comment_rule, identifier_rule):
+    return [
+        identifier_rule,
+        NumberRule(),
+        CharacterRule("operator", "="),
+        CharacterRule("newline", "\n"),
+        comment_rule,
+        string_rule,
+    ]
+
+
+def run(name, lexer, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = lexer.tokenise(text)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{name:<12} {best * 1000:9.1f} ms {len(text) / best / 1e6:9.2f} MB/s {len(tokens) / best:12.0f} tokens/s")
+    return tokens
+
+
+if __name__ == "__main__":
+    text = make_input()
+    print(f"{len(text) / 1e6:.1f} MB of input")
+
+    legacy = DefaultLexer(rules(LegacyStringRule(), LegacyCommentRule("#", "\n"), LegacyIdentifierRule()), ignore=" \t")
+    current = DefaultLexer(rules(StringRule(), CommentRule("#", "\n"), IdentifierRule()), ignore=" \t")
+
+    expected = run("legacy", legacy, text)
+    assert run("span", current, text) == expected
@@ -0,0 +1,248 @@
+"""
+Lexer and parser throughput benchmarks with regression tracking.
+
+Every case runs in a fresh process so peak RSS is measured per case.
+
+    python -m benchmarks.suite                              # run everything at the default sizes
+    python -m benchmarks.suite --sizes 10KB,1MB,100MB --output results.json
+    python -m benchmarks.suite --baseline results.json      # compare against a stored run
+    python -m benchmarks.suite --list
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from benchmarks import corpus
+
+# name -> function(size) returning (tokens processed, characters processed)
+CASES = {}
+
+
+def case(name):
+    def register(function):
+        CASES[name] = function
+        return function
+    return register
+
+
+def _lex(rules, ignore, source, size, compiled=False):
+    from parsall.lexing import DefaultLexer
+    text = source(size)
+    lexer = DefaultLexer(rules(), ignore=ignore, compiled=compiled)
+
+    start = time.perf_counter()
+    tokens = lexer.tokenise(text)
+    return time.perf_counter() - start, len(tokens), len(text)
+
+
+case("lex.python")(partial(_lex, corpus.python_rules, corpus.PYTHON_IGNORE, corpus.python_source))
+case("lex.python.compiled")(partial(_lex, corpus.python_rules, corpus.PYTHON_IGNORE, corpus.python_source, compiled=True))
+case("lex.cpp")(partial(_lex, corpus.cpp_rules, corpus.CPP_IGNORE, corpus.cpp_source))
+case("lex.cpp.compiled")(partial(_lex, corpus.cpp_rules, corpus.CPP_IGNORE, corpus.cpp_source, compiled=True))
+
+
+def _lex_snippets(size, many=False):
+    from parsall.lexing import DefaultLexer
+    # One line per input, the shape of expression and config line traffic
+    snippets = [line + "\n" for line in corpus.python_source(size).splitlines()]
+    lexer = DefaultLexer(corpus.python_rules(), ignore=corpus.PYTHON_IGNORE, compiled=True)
+
+    start = time.perf_counter()
+    if many:
+        results = lexer.tokenise_many(snippets)
+    else:
+        results = [lexer.tokenise(snippet) for snippet in snippets]
+    return time.perf_counter() - start, sum(map(len, results)), sum(map(len, snippets))
+
+
+case("lex.snippets")(_lex_snippets)
+case("lex.snippets.many")(partial(_lex_snippets, many=True))
+
+
+@case("tokenstream.peek_pop")
+def _token_stream(size):
+    from parsall.core.Streams import TokenStream
+    from parsall.lexing import DefaultLexer
+    text = corpus.python_source(size)
+    tokens = DefaultLexer(corpus.python_rules(), ignore=corpus.PYTHON_IGNORE, compiled=True).tokenise(text)
+
+    start = time.perf_counter()
+    stream = TokenStream(tokens)
+    while stream.peek() is not None:
+        stream.peek(1)
+        stream.pop()
+    return time.perf_counter() - start, len(tokens), len(text)
+
+
+def _expression(make_parser, size):
+    from benchmarks.expressions import make_tokens
+    # Roughly 15 tokens per operand with the default nesting
+    tokens = make_tokens(operands=max(1, size // 30))
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))
+    parser = make_parser(tokens)
+
+    start = time.perf_counter()
+    parser.parse()
+    return time.perf_counter() - start, len(tokens), sum(len(token[1]) for token in tokens)
+
+
+@case("parser.binary_op_chain")
+def _binary_op_chain(size):
+    from benchmarks.expressions import chain_parser
+    return _expression(chain_parser, size)
+
+
+@case("parser.expression_rule")
+def _expression_rule(size):
+    from benchmarks.expressions import table_parser
+    return _expression(table_parser, size)
+
+
+@case("algebra.parse")
+def _algebra(size):
+    import algebra
+    from parsall.core.Streams import TokenStream
+    expressions = corpus.boolean_expressions(size)
+
+    start = time.perf_counter()
+    count = 0
+    for expression in expressions:
+        tokens = algebra.lexer.tokenise(expression)
+        algebra.collect_expression(TokenStream(tokens))
+        count += len(tokens)
+    return time.perf_counter() - start, count, sum(map(len, expressions))
+
+
+def _run_case(name, size):
+    seconds, tokens, characters = CASES[name](size)
+
+    peak_rss = None
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != "darwin":
+            peak_rss *= 1024
+
+    return {
+        "case": name,
+        "size": size,
+        "seconds": seconds,
+        "tokens": tokens,
+        "characters": characters,
+        "tokens_per_sec": tokens / seconds if seconds else None,
+        "mb_per_sec": characters / seconds / 1e6 if seconds else None,
+        "peak_rss": peak_rss,
+    }
+
+
+def run(names, sizes, repeat=1):
+    """
+        Run every case at every size, keeping the fastest of `repeat` runs.
+    """
+    results = []
+    for name in names:
+        for size in sizes:
+            best = None
+            for _ in range(repeat):
+                # A fresh process per run so peak RSS belongs to this case alone
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    result = pool.submit(_run_case, name, size).result()
+                if best is None or result["seconds"] < best["seconds"]:
+                    best = result
+            results.append(best)
+            print(format_result(best), flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+        Print the change against a baseline run.
+
+        Returns
+        -------
+            The cases that got slower by more than `threshold` (a fraction)
+    """
+    previous = {(r["case"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["case"], result["size"]))
+        if old is None or not old["tokens_per_sec"] or not result["tokens_per_sec"]:
+            continue
+
+        change = result["tokens_per_sec"] / old["tokens_per_sec"] - 1
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(result)
+        print(f"{result['case']:<28} {format_size(result['size']):>8} {change:+8.1%}{flag}")
+    return regressions
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, scale in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * scale)
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for suffix, scale in (("GB", 1 << 30), ("MB", 1 << 20), ("KB", 1 << 10)):
+        if size >= scale:
+            return f"{size / scale:g}{suffix}"
+    return f"{size}B"
+
+
+def format_result(result) -> str:
+    rss = f"{result['peak_rss'] / (1 << 20):8.1f} MB RSS" if result["peak_rss"] else ""
+    return (f"{result['case']:<28} {format_size(result['size']):>8} {result['seconds'] * 1000:10.1f} ms "
+            f"{result['tokens_per_sec']:12.0f} tokens/s {result['mb_per_sec']:8.2f} MB/s {rss}")
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arguments.add_argument("cases", nargs="*", help="case names or prefixes, all cases by default")
+    arguments.add_argument("--sizes", default="64KB,1MB", help="comma separated input sizes, e.g. 10KB,1MB,200MB")
+    arguments.add_argument("--repeat", type=int, default=1)
+    arguments.add_argument("--output", help="write the results to this JSON file")
+    arguments.add_argument("--baseline", help="compare against the results in this JSON file")
+    arguments.add_argument("--threshold", type=float, default=0.1, help="slowdown counted as a regression")
+    arguments.add_argument("--list", action="store_true", help="list the cases and exit")
+    options = arguments.parse_args(argv)
+
+    if options.list:
+        print("\n".join(CASES))
+        return 0
+
+    names = [name for name in CASES if not options.cases or any(name.startswith(c) for c in options.cases)]
+    sizes = [parse_size(size) for size in options.sizes.split(",")]
+    results = run(names, sizes, options.repeat)
+
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "timestamp": time.time(),
+                "results": results,
+            }, file, indent=2)
+
+    if options.baseline:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,68 +1,39 @@
-from enum import Enum
-
-
-class Expression:
-    def __init__(self, one, two):
-        pass
-
-class Identifier:
-    pass
-
-class RuleGroup:
-    pass
-
-class Assigment:
-    pass
-
-class UnaryOP:
-    pass
-
-class KeyWordStatement:
-    pass
-
-class Chain:
-    pass
-
-class MatchTokenID:
-    pass
-
-class MatchToken:
-    pass
-
-class Ignore:
-    pass
-
-class TokenType(Enum):
-    Identifier = 1
-    Keyword = 2
-    Operator = 3
-    Delimiter = 4
-    Literal = 5
-    Comment = 6
-    String = 7
-    Regular_Expression = 8
-    Markup_Tag = 9
-    Entity_Reference = 10
-    Whitespace = 11
-    Directive = 12
-    Number = 13
-    Float = 14
-    Int = 15
-    Word = 16
-    Grammar = 17
-    ScopeModifier = 18
-    Bracket = 19
-
-symbol = MatchTokenID(TokenType.Identifier)
-def_keyword = MatchToken(TokenType.Keyword, "def")
-
-function_def = Chain([def_keyword, symbol])
+from parsall.core.rule import *
+from parsall.grammar import Chain, Ignore, MatchToken, MatchTokenID, Parser, RuleGroup
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+lexer = DefaultLexer([
+    WordSet("keyword", python.keywords, word_boundary=True),
+    IdentifierRule(),
+    NumberRule(),
+    CharacterSet("operator", python.standard_operators),
+    CharacterSet("bracket", python.standard_brackets),
+    CharacterSet("delim", ',.:'),
+    CharacterRule("newline", '\n'),
+    CommentRule("#", '\n'),
+    StringRule()
+], ignore=" \t\r")
+
+symbol = MatchTokenID("symbol")
+def_keyword = MatchToken("keyword", "def")
+
+function_def = Chain([def_keyword, symbol], name="function_def")
+class_def = Chain([MatchToken("keyword", "class"), symbol], name="class_def")
+assignment = Chain([symbol, MatchToken("operator", "="), RuleGroup([symbol, MatchTokenID("Number"), MatchTokenID("string")])], name="assignment")
 
 # will match function defs, will ignore all else
 grammar = [
     function_def,
+    class_def,
+    assignment,
     Ignore()
 ]
 
-parser = Parser(grammar)
-parser.parse(tokens)
\ No newline at end of file
+if __name__ == "__main__":
+    with open("test.code", 'r') as file:
+        tokens = lexer.tokenise(file.read())
+
+    parser = Parser(grammar)
+    for match in parser.parse(tokens):
+        print(match.name, [value for _, value in match.tokens])
@@ -0,0 +1 @@
+from parsall.languages import get_lexer, register_language
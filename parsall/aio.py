@@ -0,0 +1,126 @@
+import asyncio
+import codecs
+from time import perf_counter
+from parsall.core.Streams import CharacterStream
+from parsall.lexing import DefaultLexer
+
+
+async def read_chunks(source, chunk_size=65536, encoding="utf-8"):
+    """
+        Turn an `asyncio.StreamReader` (or anything with an async `read`) or an async
+        iterable of str/bytes chunks into an async iterator of text chunks.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    read = getattr(source, "read", None)
+    if read is not None:
+        while chunk := await read(chunk_size):
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    else:
+        async for chunk in source:
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    # Anything left over is an incomplete character, this raises for it
+    decoder.decode(b"", final=True)
+
+
+def _error_position(lexer: DefaultLexer, text: str, position: int) -> int:
+    """
+        Where lexing the token after `position` gives up, the end of the text for a token
+        that runs into it.
+    """
+    char_stream = CharacterStream(text)
+    char_stream.position = lexer.skip.match(text, position).end()
+    try:
+        lexer._match(char_stream)
+    except (ValueError, SyntaxError):
+        pass
+    return char_stream.position
+
+
+def trusted_tokens(lexer: DefaultLexer, text: str, position: int, final: bool, margin: int):
+    """
+        Lex `text` from `position`, yielding `(token, start, end)` up to the last token
+        that can not change once more text arrives.
+
+        Unless `final`, tokens ending within `margin` characters of the end of `text` are
+        held back, as are errors found there since the token may only be cut off.
+        An error found earlier is raised.
+    """
+    limit = len(text) - margin
+    try:
+        for token, start, position in lexer.scan(text, position):
+            if not final and position > limit:
+                return
+            yield token, start, position
+    except (ValueError, SyntaxError):
+        if final or _error_position(lexer, text, position) < limit:
+            raise
+
+
+def _lex_window(lexer, text, position, final, margin):
+    return list(trusted_tokens(lexer, text, position, final, margin))
+
+
+async def atokenise(lexer: DefaultLexer, source, *, chunk_size=65536, encoding="utf-8",
+                    yield_every=1000, yield_interval=0.005, executor=None, margin=256):
+    """
+        Tokenise an async source without blocking the event loop for long.
+
+        Text is lexed as it arrives, control goes back to the loop at least every
+        `yield_every` tokens or `yield_interval` seconds. With an `executor` each
+        buffered window is lexed there instead of on the loop (a process pool pickles
+        the lexer for every window, so give it large chunks).
+
+        A token cut off by the end of the buffered text is retried once more text has
+        been read. An error more than `margin` characters before the end of the buffered
+        text is raised straight away.
+
+        Args:
+            lexer: The lexer to tokenise with.
+            source: An `asyncio.StreamReader` or an async iterable of str or bytes chunks.
+            chunk_size: How much to read at a time from a reader.
+            encoding: Used to decode bytes chunks.
+            yield_every: Tokens handed out between trips to the event loop.
+            yield_interval: Seconds spent between trips to the event loop.
+            executor: Optional `concurrent.futures` executor to lex in.
+            margin: How far past the end of a token a rule may look ahead.
+    """
+    loop = asyncio.get_running_loop()
+    chunks = read_chunks(source, chunk_size, encoding).__aiter__()
+
+    text = ""
+    final = False
+    wanted = 1
+    count = 0
+    last_yield = perf_counter()
+
+    while True:
+        # Read at least one more chunk, or twice as much text if nothing could be lexed
+        while not final and len(text) < wanted:
+            try:
+                text += await chunks.__anext__()
+            except StopAsyncIteration:
+                final = True
+
+        if executor is None:
+            window = trusted_tokens(lexer, text, 0, final, margin)
+        else:
+            window = await loop.run_in_executor(executor, _lex_window, lexer, text, 0, final, margin)
+
+        position = 0
+        for token, _, position in window:
+            yield token
+
+            count += 1
+            if count >= yield_every or perf_counter() - last_yield >= yield_interval:
+                await asyncio.sleep(0)
+                count = 0
+                last_yield = perf_counter()
+
+        if final:
+            break
+
+        # Only the text after the last trusted token is kept
+        text = text[position:]
+        wanted = len(text) + 1 if position else 2 * len(text) + 1
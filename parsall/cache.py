@@ -0,0 +1,266 @@
+import hashlib
+import os
+import struct
+import sys
+from collections import OrderedDict
+from typing import List, Tuple
+from parsall.core.files import atomic_write
+
+# Bump when the fingerprint or the on-disk layout changes, old entries then simply miss
+FORMAT_VERSION = 2
+
+# Values the binary token format stores natively, anything else is only cached in memory
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def _describe(value, seen, modules):
+    """
+        A deterministic text description of a rule (or anything a rule holds), built
+        from its class and attributes rather than `repr`, which may contain addresses.
+        The module of every class and function met is added to `modules`.
+    """
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return repr(value)
+
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__ + "[" + ",".join(_describe(item, seen, modules) for item in value) + "]"
+
+    if isinstance(value, (set, frozenset)):
+        return "set{" + ",".join(sorted(_describe(item, seen, modules) for item in value)) + "}"
+
+    if isinstance(value, dict):
+        items = sorted(_describe(key, seen, modules) + ":" + _describe(item, seen, modules) for key, item in value.items())
+        return "dict{" + ",".join(items) + "}"
+
+    pattern = getattr(value, "pattern", None)
+    if isinstance(pattern, (str, bytes)) and hasattr(value, "flags"):
+        return f"re({pattern!r},{value.flags})"
+
+    code = getattr(value, "__code__", None)
+    if code is not None:
+        # A function is identified by what it does, lambdas all share a name. What it
+        # captured counts too, and its module's stamp catches edits co_code misses.
+        modules.add(value.__module__)
+        cells = []
+        for cell in getattr(value, "__closure__", None) or ():
+            try:
+                cells.append(cell.cell_contents)
+            except ValueError:
+                cells.append(None)
+        digest = hashlib.sha256(code.co_code).hexdigest()[:16]
+        return f"fn({value.__module__}.{value.__qualname__},{digest},{_describe(code.co_consts, seen, modules)},{_describe(cells, seen, modules)})"
+
+    if callable(value) and not hasattr(value, "__dict__"):
+        # Builtins such as str.isdecimal
+        return f"fn({getattr(value, '__qualname__', type(value).__name__)})"
+
+    cls = type(value)
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    if id(value) in seen:
+        return name + "<cycle>"
+
+    modules.add(cls.__module__)
+    seen.add(id(value))
+    attributes = getattr(value, "__dict__", None) or {}
+    fields = ",".join(f"{key}={_describe(attributes[key], seen, modules)}" for key in sorted(attributes))
+    seen.discard(id(value))
+    return f"{name}({fields})"
+
+
+def fingerprint(syntax_rules, ignore) -> str:
+    """
+        A hash identifying a rule list and ignore set, equal for lexers configured the
+        same way in any process running the same code.
+
+        It covers the rules' attributes, and the source files (path, modification time
+        and size) of parsall's lexer modules and of every module a rule's class or
+        function comes from. Upgrading parsall or editing a custom rule changes it.
+    """
+    from parsall.core.files import CORE_MODULES, module_stamp
+
+    modules = set(CORE_MODULES)
+    description = f"v{FORMAT_VERSION};{_describe(list(syntax_rules), set(), modules)};{_describe(ignore, set(), modules)}"
+    stamps = ";".join(module_stamp(module) for module in sorted(modules))
+    return hashlib.sha256(f"{description};{stamps}".encode("utf-8")).hexdigest()
+
+
+def dumps(tokens: List[Tuple]) -> bytes:
+    """
+        Serialise a token list in the `parsall.core.serial` format.
+
+        Raises
+        ------
+            ValueError: A value is not a string, number, bool or None
+    """
+    from parsall.core import serial
+    for _, value in tokens:
+        if type(value) not in _PLAIN_TYPES:
+            raise ValueError(f"Can not store a {type(value).__name__} token value in the token cache")
+    return serial.dumps(tokens)
+
+
+def loads(data: bytes) -> List[Tuple]:
+    from parsall.core import serial
+    return list(serial.loads(data, objects=False))
+
+
+def token_size(tokens: List[Tuple]) -> int:
+    """
+        Approximate memory held by a token list. Kind names are shared so only counted once.
+    """
+    size = sys.getsizeof(tokens)
+    kinds = set()
+    for token in tokens:
+        kind, value = token
+        size += sys.getsizeof(token) + sys.getsizeof(value)
+        kinds.add(kind)
+    return size + sum(sys.getsizeof(kind) for kind in kinds)
+
+
+class TokenCache:
+    """
+        Caches `DefaultLexer.tokenise` results by a hash of the input text and the
+        lexer's rule fingerprint, so unchanged input is never lexed twice.
+
+        Recent results are kept in memory, least recently used first out once they
+        take more than `max_bytes`. With a `directory` every result is also written
+        there and survives between runs. One cache can be shared by several lexers.
+
+        Cached token lists are copied on the way out, so callers may modify them.
+
+        Args:
+            directory: Where to keep the on-disk tier, None to only cache in memory.
+            max_bytes: Memory budget for the in-memory tier.
+    """
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        """key -> (tokens, size), most recently used last."""
+        self.size = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.disk_writes = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, rule_fingerprint: str) -> str:
+        digest = hashlib.sha256(rule_fingerprint.encode("ascii"))
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".tokens")
+
+    def get(self, key: str):
+        """
+            The tokens cached under `key`, or None.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+        if self.directory is not None:
+            try:
+                with open(self.path(key), "rb") as file:
+                    tokens = loads(file.read())
+            except (OSError, ValueError, IndexError, struct.error):
+                # Missing, or written by another version / cut short, treat as a miss
+                pass
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+                self._remember(key, tokens)
+                return list(tokens)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, tokens: List[Tuple]):
+        tokens = list(tokens)
+        self._remember(key, tokens)
+
+        if self.directory is not None:
+            try:
+                data = dumps(tokens)
+            except ValueError:
+                # Custom token values, only cached in memory
+                return
+            atomic_write(self.path(key), data)
+            self.disk_writes += 1
+
+    def tokenise(self, lexer, input_text: str) -> List[Tuple]:
+        """
+            `lexer.tokenise(input_text)`, from the cache when possible.
+        """
+        key = self.key(input_text, lexer.fingerprint)
+        tokens = self.get(key)
+        if tokens is None:
+            tokens = lexer._tokenise(input_text)
+            self.put(key, tokens)
+        return tokens
+
+    def _remember(self, key: str, tokens: List[Tuple]):
+        size = token_size(tokens)
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+
+        if size > self.max_bytes:
+            # Would push everything else out and still not fit, only keep it on disk
+            return
+
+        self.entries[key] = (tokens, size)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+            self.evicted_bytes += evicted
+
+    def clear(self, disk=False):
+        """
+            Empty the in-memory tier, and the directory too with `disk=True`.
+        """
+        self.entries.clear()
+        self.size = 0
+
+        if disk and self.directory is not None:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".tokens"):
+                        os.unlink(os.path.join(root, name))
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "memory_hits": self.hits - self.disk_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "disk_writes": self.disk_writes,
+        }
+
+    def __repr__(self):
+        return f"TokenCache({len(self.entries)} entries, {self.size} bytes, {self.hit_rate:.1%} hits)"
@@ -51,7 +51,10 @@ class Stream:
         """
         Returns the next `n` items in the input stream without consuming them.
         """
-        return self.items[self.position : self.position + n]
+        end = self.position + n
+        if end > self.length:
+            end = self.length
+        return self.items[self.position : end]
 
     def __iter__(self):
         """
@@ -94,4 +97,140 @@ class CharacterStream(Stream):
         Args:
             stream (str): The string to use as the character stream.
         """
-        super().__init__(stream, len(stream))
\ No newline at end of file
+        super().__init__(stream, len(stream))
+        self.offset = 0
+        """Absolute position in the source of `items[0]`."""
+
+        # `length` may be set below `len(items)` to end the stream early, the text
+        # past it is never read (see `DefaultLexer.tokenise_many`)
+
+    def match(self, pattern):
+        """
+        Match a compiled regex at the current position without consuming anything.
+        Rules use this to find the end of a run in one call instead of popping characters.
+
+        Returns:
+            The `re.Match`, or None.
+        """
+        return pattern.match(self.items, self.position, self.length)
+
+    def find(self, sub: str) -> int:
+        """
+        Find the next occurrence of `sub` at or after the current position, without consuming anything.
+
+        Returns:
+            The index of `sub` in `items`, or -1 if it does not occur.
+        """
+        return self.items.find(sub, self.position, self.length)
+
+class BufferedCharacterStream(CharacterStream):
+    """
+        A character stream fed from an iterable of text chunks rather than one string.
+
+        Chunks are pulled in as `peek`/`pop`/`lookahead` need them, so a token can
+        straddle any number of chunk boundaries. Call `release()` between tokens to drop
+        the text already consumed, keeping memory bounded by the chunk size plus the
+        longest token.
+    """
+
+    def __init__(self, chunks):
+        """
+        Initialize a new buffered character stream.
+
+        Args:
+            chunks: Any iterable of strings, e.g. a generator reading a file.
+        """
+        super().__init__("")
+        self.chunks = iter(chunks)
+        self.exhausted = False
+
+    def fill(self, n) -> bool:
+        """
+        Make sure at least `n` characters are buffered past the current position.
+
+        Returns:
+            False if the source ran out before `n` characters were available.
+        """
+        while self.length < self.position + n:
+            if self.exhausted:
+                return False
+            try:
+                chunk = next(self.chunks)
+            except StopIteration:
+                self.exhausted = True
+                return False
+            self.items += chunk
+            self.length = len(self.items)
+        return True
+
+    def release(self):
+        """
+        Forget everything before the current position. Only call this between tokens.
+        """
+        # Only compact once the dead prefix is worth copying the tail for
+        if self.position and self.position * 2 >= self.length:
+            self.items = self.items[self.position:]
+            self.offset += self.position
+            self.length -= self.position
+            self.position = 0
+
+    def match(self, pattern):
+        # A match running into the end of the buffer might continue in the next chunk. Keep
+        # one extra character past the match so two character units (escapes) are not cut
+        self.fill(1)
+        m = super().match(pattern)
+        while m is not None and m.end() + 1 >= self.length and self.fill(self.length - self.position + 1):
+            m = super().match(pattern)
+        return m
+
+    def find(self, sub: str) -> int:
+        start = self.position
+        while (index := self.items.find(sub, start)) == -1 and not self.exhausted:
+            # Only the tail could still be the start of a match once more text arrives
+            start = max(start, self.length - len(sub) + 1)
+            self.fill(self.length - self.position + 1)
+        return index
+
+    def pop(self):
+        self.fill(1)
+        return super().pop()
+
+    def peek(self, n=0):
+        self.fill(n + 1)
+        return super().peek(n)
+
+    def advance(self, n=1):
+        self.fill(n)
+        self.position += n
+
+    def lookahead(self, n) -> str:
+        self.fill(n)
+        return super().lookahead(n)
+
+    def __next__(self):
+        self.fill(1)
+        return super().__next__()
+
+
+class MappedStream(Stream):
+    """
+        A byte stream over a memory mapped file. Nothing is read until it is touched.
+
+        `peek`/`pop` return byte values (ints) and `lookahead` returns bytes.
+    """
+
+    def __init__(self, path):
+        """
+        Map a file into memory.
+
+        Args:
+            path: The file to map, it must not be empty.
+        """
+        import mmap
+
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(mapped, len(mapped))
+
+    def close(self):
+        self.items.close()
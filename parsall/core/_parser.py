@@ -1,5 +1,7 @@
+from array import array
+from collections import OrderedDict
 from typing import List, Tuple
-from core.Streams import TokenStream
+from parsall.core.Streams import TokenStream
 from enum import Enum
 
 class TokenType(Enum):
@@ -35,10 +37,15 @@ class TokenType(Enum):
 
 
 
+# Shared by every leaf instead of a new empty list each
+NO_CHILDREN = ()
+
 class ASTNode:
+    __slots__ = ("type", "children", "value")
+
     def __init__(self, type_: str, children: List["ASTNode"] = None, value=None):
         self.type = type_
-        self.children = children or []
+        self.children = children or NO_CHILDREN
         self.value = value
 
     def __repr__(self):
@@ -50,13 +57,331 @@ class ASTNode:
         else:
             return f"{self.type}()"
 
+class FlatTree:
+    """
+        An AST stored as parallel arrays rather than one `ASTNode` per node.
+
+        Node `i` has a kind id `kinds[i]`, its first child `first_child[i]`, its next
+        sibling `next_sibling[i]` (-1 for none) and the index of the token it came from
+        `tokens[i]` (-1 for none). Values that do not come from a token are kept in
+        a side table.
+
+        Nodes are added bottom up, children before their parent, which is the order a
+        parser finishes them in:
+
+            tree = FlatTree()
+            left = tree.add("number", token=0)
+            right = tree.add("number", token=2)
+            tree.add("+", [left, right])
+    """
+
+    def __init__(self):
+        self.kinds = array('H')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.tokens = array('i')
+        self.values = {}
+
+        self.kind_names: List[str] = []
+        self.kind_ids = {}
+
+    def add(self, kind: str, children: List[int] = NO_CHILDREN, token: int = -1, value=None) -> int:
+        """
+            Add a node over already added `children`.
+
+            Returns
+            -------
+                The index of the new node
+        """
+        kind_id = self.kind_ids.get(kind)
+        if kind_id is None:
+            kind_id = self.kind_ids[kind] = len(self.kind_names)
+            self.kind_names.append(kind)
+
+        index = len(self.kinds)
+        self.kinds.append(kind_id)
+        self.first_child.append(children[0] if children else -1)
+        self.next_sibling.append(-1)
+        self.tokens.append(token)
+        if value is not None:
+            self.values[index] = value
+
+        for child, sibling in zip(children, children[1:]):
+            self.next_sibling[child] = sibling
+
+        return index
+
+    @classmethod
+    def from_node(cls, node: ASTNode) -> "FlatTree":
+        """
+            Flatten an `ASTNode` tree, the root is the last node.
+        """
+        tree = cls()
+        # Post-order without recursion, so deep trees do not hit the recursion limit
+        stack = [(node, False)]
+        done = []
+        while stack:
+            current, expanded = stack.pop()
+            if expanded:
+                children = done[len(done) - len(current.children):] if current.children else NO_CHILDREN
+                del done[len(done) - len(children):]
+                done.append(tree.add(current.type, children, value=current.value))
+            else:
+                stack.append((current, True))
+                for child in reversed(current.children):
+                    stack.append((child, False))
+        return tree
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def root(self) -> int:
+        return len(self.kinds) - 1
+
+    def kind(self, index: int) -> str:
+        return self.kind_names[self.kinds[index]]
+
+    def value(self, index: int, tokens=None):
+        """
+            The node's value, taken from `tokens` when the node refers to a token.
+        """
+        if index in self.values:
+            return self.values[index]
+        token = self.tokens[index]
+        if token != -1 and tokens is not None:
+            return tokens[token][1]
+        return None
+
+    def children(self, index: int):
+        child = self.first_child[index]
+        while child != -1:
+            yield child
+            child = self.next_sibling[child]
+
+    def walk(self, root: int = None):
+        """
+            Yield `(index, depth)` for every node below `root` in pre-order.
+        """
+        root = self.root if root is None else root
+        first_child = self.first_child
+        next_sibling = self.next_sibling
+
+        stack = [(root, 0)]
+        while stack:
+            index, depth = stack.pop()
+            yield index, depth
+
+            # Push children in reverse so the first child is visited first
+            children = []
+            child = first_child[index]
+            while child != -1:
+                children.append(child)
+                child = next_sibling[child]
+            for child in reversed(children):
+                stack.append((child, depth + 1))
+
+    def visit(self, enter, leave=None, root: int = None):
+        """
+            Call `enter(index)` on the way down and `leave(index)` on the way back up.
+            Returning False from `enter` skips the node's children.
+        """
+        root = self.root if root is None else root
+        stack = [(root, False)]
+        while stack:
+            index, leaving = stack.pop()
+            if leaving:
+                leave(index)
+                continue
+
+            if enter(index) is False:
+                continue
+            if leave is not None:
+                stack.append((index, True))
+
+            children = list(self.children(index))
+            for child in reversed(children):
+                stack.append((child, False))
+
+    def to_node(self, root: int = None, tokens=None) -> ASTNode:
+        """
+            Rebuild `ASTNode`s, mostly useful for printing small trees.
+        """
+        built = {}
+
+        def leave(index):
+            children = [built.pop(child) for child in self.children(index)]
+            built[index] = ASTNode(self.kind(index), children, self.value(index, tokens))
+
+        self.visit(lambda index: None, leave, root)
+        return built[self.root if root is None else root]
+
+
+class PackratMemo:
+    """
+        Memo table for packrat parsing, mapping `(rule key, token position)` to the
+        node a rule produced there and the position it finished at.
+
+        By default every result is kept for the whole parse. Pass `limit` to keep only
+        the most recently used entries, or `window` to forget positions that are more
+        than `window` tokens behind the furthest position reached.
+    """
+
+    def __init__(self, limit: int = None, window: int = None):
+        self.limit = limit
+        self.window = window
+        self.table = OrderedDict() if limit is not None else {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Sliding window bookkeeping
+        self.by_position = {}
+        self.lowest = 0
+        self.highest = 0
+
+    def get(self, key, position):
+        entry = self.table.get((key, position))
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if self.limit is not None:
+            self.table.move_to_end((key, position))
+        return entry
+
+    def put(self, key, position, node, end):
+        self.table[(key, position)] = (node, end)
+
+        if self.limit is not None and len(self.table) > self.limit:
+            self.table.popitem(last=False)
+            self.evictions += 1
+
+        if self.window is not None:
+            self.by_position.setdefault(position, []).append(key)
+            self.highest = max(self.highest, position)
+
+            # Positions only move forward overall, so sweep the old ones out in order
+            while self.lowest < self.highest - self.window:
+                for old_key in self.by_position.pop(self.lowest, ()):
+                    if self.table.pop((old_key, self.lowest), None) is not None:
+                        self.evictions += 1
+                self.lowest += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.table),
+            "hit_rate": self.hit_rate,
+        }
+
+
+class Parser:
+    """
+        Drives `ParserRule`s over a token stream.
+
+        `expression` and `term` are rule factories (called with the parser) used by
+        `parse_expression` and `parse_term`. Rules should be run through `apply`, which
+        rewinds the stream when a rule fails so alternatives can be tried, and with
+        `packrat=True` remembers every result so no rule is run twice at one position.
+    """
+
+    EOF = ("EOF", None)
+
+    def __init__(self, tokens, expression=None, term=None, *, packrat=False, memo_limit=None, memo_window=None):
+        self.tokens = tokens if isinstance(tokens, TokenStream) else TokenStream(tokens)
+        self.expression = expression
+        self.term = term
+        self.memo = PackratMemo(memo_limit, memo_window) if packrat else None
+
+    def peek_token(self):
+        token = self.tokens.peek()
+        return Parser.EOF if token is None else token
+
+    def get_token(self):
+        return self.tokens.pop()
+
+    def apply(self, rule: "ParserRule"):
+        """
+            Run `rule` at the current position, rewinding on failure.
+
+            Returns
+            -------
+                The node matched, or None
+        """
+        start = self.tokens.position
+
+        if self.memo is not None:
+            key = rule.key
+            entry = self.memo.get(key, start)
+            if entry is not None:
+                self.tokens.position = entry[1]
+                return entry[0]
+
+        node = rule.match()
+        if node is None:
+            self.tokens.position = start
+
+        if self.memo is not None:
+            self.memo.put(key, start, node, self.tokens.position)
+
+        return node
+
+    def parse_expression(self):
+        return self.apply(self.expression(self))
+
+    def parse_term(self):
+        return self.apply(self.term(self))
+
+    def parse(self):
+        node = self.parse_expression()
+        if self.peek_token() is not Parser.EOF:
+            raise ValueError(f"Unexpected token {self.peek_token()!r}")
+        return node
+
+
 class ParserRule:
     def __init__(self, parser):
         self.parser = parser
 
+    @property
+    def key(self):
+        """
+            Identifies what this rule matches, for the packrat memo. Rules taking
+            extra arguments must include them.
+        """
+        return type(self)
+
     def match(self):
         raise NotImplementedError()
 
+class ChoiceRule(ParserRule):
+    """
+        Ordered choice: the first alternative to match wins, the stream is rewound between tries.
+    """
+    def __init__(self, parser, alternatives: List[type]):
+        super().__init__(parser)
+        self.alternatives = alternatives
+
+    @property
+    def key(self):
+        return (ChoiceRule, tuple(self.alternatives))
+
+    def match(self):
+        for alternative in self.alternatives:
+            node = self.parser.apply(alternative(self.parser))
+            if node is not None:
+                return node
+        return None
+
 class NumberRule(ParserRule):
     def match(self):
         if self.parser.peek_token()[0] == "number":
@@ -80,6 +405,10 @@ class UnaryOpRule(ParserRule):
         super().__init__(parser)
         self.op = op
 
+    @property
+    def key(self):
+        return (UnaryOpRule, self.op)
+
     def match(self):
         if self.parser.peek_token()[0] == self.op:
             self.parser.get_token()  # Consume operator
@@ -93,12 +422,121 @@ class BinaryOpRule(ParserRule):
         self.ops = ops
         self.next_rule = next_rule
 
+    @property
+    def key(self):
+        return (BinaryOpRule, tuple(self.ops), self.next_rule)
+
     def match(self):
-        left = self.next_rule().match()
+        left = self.parser.apply(self.next_rule(self.parser))
+        if left is None:
+            return None
 
         while self.parser.peek_token()[0] in self.ops:
             op_token = self.parser.get_token()
-            right = self.next_rule(self.parser).match()
+            right = self.parser.apply(self.next_rule(self.parser))
+            if right is None:
+                raise ValueError(f"Expected an operand after {op_token[1]!r}")
             left = ASTNode(op_token[1], [left, right])
 
-        return left
\ No newline at end of file
+        return left
+
+LEFT = "left"
+RIGHT = "right"
+
+class OperatorTable:
+    """
+        Operators for `ExpressionRule`, keyed by token type. A higher precedence binds tighter.
+
+            table = OperatorTable()
+            table.add_infix(['+', '-'], 10)
+            table.add_infix(['*', '/'], 20)
+            table.add_infix(['='], 1, RIGHT)
+            table.add_prefix(['-', '!'], 30)
+            table.add_postfix(['++', '--'], 40)
+    """
+
+    def __init__(self):
+        self.infix = {}
+        self.prefix = {}
+        self.postfix = {}
+
+    def add_infix(self, ops: List[str], precedence: int, associativity=LEFT) -> "OperatorTable":
+        for op in ops:
+            self.infix[op] = (precedence, associativity == RIGHT)
+        return self
+
+    def add_prefix(self, ops: List[str], precedence: int) -> "OperatorTable":
+        for op in ops:
+            self.prefix[op] = precedence
+        return self
+
+    def add_postfix(self, ops: List[str], precedence: int) -> "OperatorTable":
+        for op in ops:
+            self.postfix[op] = precedence
+        return self
+
+class ExpressionRule(ParserRule):
+    """
+        Table driven expression parsing in a single loop, instead of one
+        `BinaryOpRule` per precedence level.
+
+        Operands are matched with `operand` (e.g. a `ChoiceRule` of numbers and
+        brackets), operators are read from the `OperatorTable`. Nodes are built the
+        same way `BinaryOpRule` and `UnaryOpRule` build them.
+    """
+    def __init__(self, parser, operators: OperatorTable, operand: type):
+        super().__init__(parser)
+        self.operators = operators
+        self.operand = operand
+
+    @property
+    def key(self):
+        return (ExpressionRule, id(self.operators), self.operand)
+
+    def match(self):
+        parser = self.parser
+        infix = self.operators.infix
+        prefix = self.operators.prefix
+        postfix = self.operators.postfix
+
+        operands = []
+        # Pending operators as (precedence, op text, is_prefix)
+        pending = []
+
+        def reduce(precedence, right_associative):
+            # Build every pending operator binding tighter than the incoming one
+            while pending and (pending[-1][0] > precedence or (pending[-1][0] == precedence and not right_associative)):
+                _, op, is_prefix = pending.pop()
+                if is_prefix:
+                    operands.append(ASTNode(op, [operands.pop()]))
+                else:
+                    right = operands.pop()
+                    operands.append(ASTNode(op, [operands.pop(), right]))
+
+        while True:
+            while parser.peek_token()[0] in prefix:
+                op_token = parser.get_token()
+                pending.append((prefix[op_token[0]], op_token[1], True))
+
+            node = parser.apply(self.operand(parser))
+            if node is None:
+                if not pending:
+                    return None
+                raise ValueError(f"Expected an operand after {pending[-1][1]!r}")
+            operands.append(node)
+
+            while parser.peek_token()[0] in postfix:
+                op_token = parser.get_token()
+                reduce(postfix[op_token[0]], False)
+                operands.append(ASTNode(op_token[1], [operands.pop()]))
+
+            op_type = parser.peek_token()[0]
+            if op_type not in infix:
+                break
+
+            precedence, right_associative = infix[op_type]
+            reduce(precedence, right_associative)
+            pending.append((precedence, parser.get_token()[1], False))
+
+        reduce(float("-inf"), False)
+        return operands[0]
@@ -0,0 +1,80 @@
+import re
+
+# Character class bits
+DIGIT = 1
+"""`str.isdecimal()`, what `\\d` matches."""
+IDENTIFIER_START = 2
+"""A letter or underscore."""
+WORD = 4
+"""`str.isalnum()` or underscore, what `\\w` matches."""
+
+
+def _classify(character: str) -> int:
+    bits = 0
+    if character.isdecimal():
+        bits |= DIGIT
+    if character.isalpha() or character == "_":
+        bits |= IDENTIFIER_START
+    if character.isalnum() or character == "_":
+        bits |= WORD
+    return bits
+
+
+TABLE = bytes(_classify(chr(code)) for code in range(256))
+"""Class bits of the first 256 code points, indexed by `ord()`."""
+
+# Anything past the table, filled in as it is seen
+_wide = {}
+
+
+def classes(character: str) -> int:
+    """
+        The class bits of a single character.
+    """
+    code = ord(character)
+    if code < 256:
+        return TABLE[code]
+
+    bits = _wide.get(character)
+    if bits is None:
+        bits = _wide[character] = _classify(character)
+    return bits
+
+
+def is_word(character) -> bool:
+    return character is not None and classes(character) & WORD != 0
+
+
+class ClassSet:
+    """
+        The characters having any of the `mask` bits, usable as a rule's `first_set`.
+    """
+
+    def __init__(self, mask: int):
+        self.mask = mask
+
+    def __contains__(self, character):
+        return character is not None and classes(character) & self.mask != 0
+
+
+# Whole runs of a class are found with one regex call (`char_stream.match(RUNS[DIGIT])`)
+# rather than a test per character
+RUNS = {
+    DIGIT: re.compile(r"\d+"),
+    WORD: re.compile(r"\w+"),
+}
+
+
+def _character_class(characters) -> str:
+    return "[" + "".join(re.escape(c) for c in characters) + "]"
+
+
+def compile_ignore(ignore):
+    """
+        Build the pattern used to skip ignored characters. Only single characters can
+        ever match `char_stream.peek() in ignore`, so anything longer is dropped.
+    """
+    characters = [c for c in ignore if len(c) == 1]
+    if not characters:
+        return re.compile("")
+    return re.compile(_character_class(characters) + "*")
@@ -0,0 +1,445 @@
+import codecs
+import re
+from typing import List
+from parsall.core.Streams import CharacterStream, BufferedCharacterStream
+from parsall.core.rule import *
+from parsall.core.charclass import compile_ignore, _character_class
+from parsall.core.tokens import SLICE
+
+# Handler marking an alternative that hands the position back to the interpreted
+# rules. It means "the compiled pattern cannot decide this position exactly, let
+# the real rules run (and raise if they want to)". Compared by identity.
+FALLBACK = object()
+
+
+class RegexSegment:
+    """
+        A run of consecutive built-in rules fused into one master regex.
+        Alternatives are kept in rule order so the first matching rule still wins.
+    """
+
+    def __init__(self, rules: List[SyntaxRule], pattern: str, handlers: dict):
+        self.rules = rules
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.handlers = handlers
+        self._byte_regex = None
+
+    @property
+    def byte_regex(self):
+        """
+            The same pattern over UTF-8 bytes. Character classes are ASCII only there,
+            so callers fall back to the rules around any non-ASCII text.
+        """
+        if self._byte_regex is None:
+            self._byte_regex = re.compile(self.pattern.encode("utf-8"))
+        return self._byte_regex
+
+
+class RuleSegment:
+    """
+        A single rule that could not be compiled, it is called as normal.
+    """
+
+    def __init__(self, rule: SyntaxRule):
+        self.rule = rule
+
+
+def _unescape(match_text: str) -> str:
+    # StringRule keeps the escaped character itself rather than translating it
+    return re.sub(r"\\(.)", r"\1", match_text, flags=re.DOTALL)
+
+
+def _string_handler(match_text: str):
+    return ("string", _unescape(match_text[1:-1]))
+
+
+def _number_handler(match_text: str):
+    return ("Number", int(match_text))
+
+
+class _CommentHandler:
+    def __init__(self, begin_length: int, terminator_length: int):
+        self.begin_length = begin_length
+        self.terminator_length = terminator_length
+
+    def __call__(self, match_text: str):
+        return ("Comment", match_text[self.begin_length:-self.terminator_length])
+
+
+def _translate(rule: SyntaxRule):
+    """
+        Translate a single built-in rule into a list of `(pattern, handler)` alternatives.
+
+        A handler is either a token name (the token value is the matched text),
+        a callable taking the matched text, or `FALLBACK`.
+
+        Returns
+        -------
+            None if the rule can not be compiled
+    """
+    # Exact type checks: subclasses may override match() and must stay interpreted
+    kind = type(rule)
+
+    if kind is WordRule:
+        return [(re.escape(rule.word), rule.token_name)]
+
+    if kind is CharacterRule:
+        # match() compares a single character, longer (or empty) values never match there
+        if len(rule.character) != 1:
+            return None
+        return [(re.escape(rule.character), rule.token_name)]
+
+    if kind is AlphaCharacterRule:
+        return [("[A-Z]", "Symbol")]
+
+    if kind is NumberRule:
+        return [("\\d+", _number_handler)]
+
+    if kind is IdentifierRule:
+        # \w is exactly str.isalnum() plus '_', the first character is the tricky one
+        return [("[A-Za-z_]\\w*", "symbol"), ("[^\\x00-\\x7f]", FALLBACK)]
+
+    if kind is StringRule:
+        body = lambda q: q + "(?:[^" + q + "\\\\]|\\\\[" + q + "\\\\trxn])*" + q
+        # An unterminated string or bad escape falls back so the rule raises as usual
+        return [(body('"') + "|" + body("'"), _string_handler), ("[\"']", FALLBACK)]
+
+    if kind is CommentRule:
+        if not rule.begin or not rule.terminator:
+            return None
+        begin = re.escape(rule.begin)
+        pattern = begin + "(?s:.*?)" + re.escape(rule.terminator)
+        return [(pattern, _CommentHandler(rule.pattern_length, len(rule.terminator))), (begin, FALLBACK)]
+
+    if kind is WordSet:
+        if not rule.words:
+            # Nothing to match, an empty pattern would match without consuming
+            return []
+        # Python's alternation is first-match, trying longer words first gives longest-match
+        words = sorted(rule.words, key=len, reverse=True)
+        boundary = "(?!\\w)" if rule.word_boundary else ""
+        return [("|".join(re.escape(word) + boundary for word in words), rule.token_name)]
+
+    if kind in (Ruleset, CharacterSet):
+        alternatives = []
+        for child in rule.rules:
+            translated = _translate(child)
+            if translated is None:
+                return None
+            alternatives.extend(translated)
+        return alternatives
+
+    return None
+
+
+def _literal_length(rule: SyntaxRule) -> int:
+    """
+        Longest fixed text a rule has to see before it can decide, used by the
+        streaming tokeniser to keep enough characters buffered.
+    """
+    if isinstance(rule, WordRule):
+        return rule.length
+    if isinstance(rule, CommentRule):
+        return rule.pattern_length + len(rule.terminator)
+    if isinstance(rule, WordSet):
+        return max(map(len, rule.words), default=0) + rule.word_boundary
+    if isinstance(rule, Ruleset):
+        return max((_literal_length(child) for child in rule.rules), default=1)
+    return 1
+
+
+def _build_segment(rules: List[SyntaxRule], alternatives) -> RegexSegment:
+    # Merge neighbouring alternatives that produce the same plain token
+    merged = []
+    for pattern, handler in alternatives:
+        if merged and isinstance(handler, str) and merged[-1][1] == handler:
+            merged[-1] = (merged[-1][0] + "|" + pattern, handler)
+        else:
+            merged.append((pattern, handler))
+
+    groups = []
+    handlers = {}
+    for index, (pattern, handler) in enumerate(merged):
+        name = f"r{index}"
+        handlers[name] = handler
+        groups.append(f"(?P<{name}>{pattern})")
+
+    return RegexSegment(rules, "|".join(groups), handlers)
+
+
+def compile_rules(rules: List[SyntaxRule]) -> list:
+    """
+        Group the rule list into segments. Consecutive compilable rules share one
+        `RegexSegment`, everything else becomes a `RuleSegment`. Rule priority is preserved.
+    """
+    segments = []
+    pending_rules = []
+    pending_alternatives = []
+
+    for rule in rules:
+        translated = _translate(rule)
+        if translated is not None:
+            pending_rules.append(rule)
+            pending_alternatives.extend(translated)
+            continue
+
+        # Rules without alternatives never match, leave them out of the regex
+        if pending_alternatives:
+            segments.append(_build_segment(pending_rules, pending_alternatives))
+        pending_rules, pending_alternatives = [], []
+        segments.append(RuleSegment(rule))
+
+    if pending_alternatives:
+        segments.append(_build_segment(pending_rules, pending_alternatives))
+
+    return segments
+
+
+def compile_ignore_bytes(ignore):
+    """
+        `compile_ignore` over UTF-8 bytes, multi-byte characters become alternatives.
+    """
+    characters = [c for c in ignore if len(c) == 1]
+    ascii = [c for c in characters if c < "\x80"]
+    alternatives = [_character_class(ascii)] if ascii else []
+    alternatives.extend(re.escape(c) for c in characters if c >= "\x80")
+    if not alternatives:
+        return re.compile(b"")
+    return re.compile(("(?:" + "|".join(alternatives) + ")*").encode("utf-8"))
+
+
+def _decode_from(data, position: int, chunk_size=4096):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while position < len(data):
+        yield decoder.decode(data[position:position + chunk_size])
+        position += chunk_size
+    if tail := decoder.decode(b"", final=True):
+        yield tail
+
+
+class CompiledTokeniser:
+    """
+        Drop in replacement for the interpreted `DefaultLexer.tokenise` loop.
+        Produces the same token tuples as running the rules one at a time.
+    """
+
+    def __init__(self, syntax_rules: List[SyntaxRule], ignore):
+        self.segments = compile_rules(syntax_rules)
+        self.ignore = ignore
+        self.skip = compile_ignore(ignore)
+        self.lookahead = max((_literal_length(rule) for rule in syntax_rules), default=1)
+
+    def tokenise(self, input_text: str):
+        return [token for token, _, _ in self.scan(input_text)]
+
+    def _match_at(self, char_stream, streaming=False):
+        """
+            Try the segments in rule order at the stream's position, without reading
+            past `char_stream.length`.
+
+            With `streaming` the stream is a `BufferedCharacterStream`. The regex only
+            sees what is buffered, so a match running into the end of the buffer is
+            retried once more text has been read.
+
+            Returns
+            -------
+                `(token, start)` with the stream moved past the token, or `(None, None)`
+                if no rule matched
+        """
+        for segment in self.segments:
+            start = char_stream.position
+            if isinstance(segment, RegexSegment):
+                m = segment.regex.match(char_stream.items, start, char_stream.length)
+                while streaming and m is not None and m.end() == char_stream.length and not char_stream.exhausted:
+                    char_stream.fill(char_stream.length - start + 1)
+                    m = segment.regex.match(char_stream.items, start, char_stream.length)
+                if m is None:
+                    continue
+
+                handler = segment.handlers[m.lastgroup]
+                if handler is FALLBACK:
+                    match = self._interpret(segment.rules, char_stream)
+                    if match is None:
+                        continue
+                elif isinstance(handler, str):
+                    match = (handler, m.group())
+                    char_stream.position = m.end()
+                else:
+                    match = handler(m.group())
+                    char_stream.position = m.end()
+            else:
+                match = segment.rule.match(char_stream)
+                if match is None:
+                    continue
+
+            return match, start
+
+        return None, None
+
+    def scan(self, input_text: str, start: int = 0):
+        """
+            Yield `(token, start, end)` for every token, where `input_text[start:end]`
+            is the text the token was lexed from.
+        """
+        char_stream = CharacterStream(input_text)
+        length = len(input_text)
+        skip = self.skip.match
+        match_at = self._match_at
+
+        position = start
+        while True:
+            position = skip(input_text, position).end()
+            if position >= length:
+                break
+
+            char_stream.position = position
+            match, start = match_at(char_stream)
+            position = char_stream.position
+            if match is None:
+                # If no rule matches, raise an error
+                raise ValueError("Syntax error in input text: " + input_text[position:position + 1])
+
+            yield match, start, position
+
+    def tokenise_many(self, input_text: str, ends) -> List[list]:
+        """
+            Tokenise several inputs joined into `input_text`, each ending at the next
+            offset in `ends`, in one loop. Nothing is matched across an end.
+
+            Returns
+            -------
+                The token list of each input
+        """
+        char_stream = CharacterStream(input_text)
+        skip = self.skip.match
+        match_at = self._match_at
+        results = []
+
+        position = 0
+        for length in ends:
+            # The rules must not see past this input
+            char_stream.length = length
+            tokens = []
+
+            while True:
+                position = skip(input_text, position, length).end()
+                if position >= length:
+                    break
+
+                char_stream.position = position
+                match, _ = match_at(char_stream)
+                position = char_stream.position
+                if match is None:
+                    # If no rule matches, raise an error
+                    raise ValueError("Syntax error in input text: " + input_text[position:position + 1])
+                tokens.append(match)
+
+            results.append(tokens)
+            position = length
+
+        return results
+
+    def iter_tokens(self, char_stream):
+        """
+            Tokenise a `BufferedCharacterStream`, yielding tokens as they are found.
+        """
+        skip = self.skip.match
+        lookahead = self.lookahead
+
+        while True:
+            # Ignored characters can run across chunks too
+            while True:
+                char_stream.fill(1)
+                char_stream.position = skip(char_stream.items, char_stream.position).end()
+                if char_stream.position < char_stream.length or char_stream.exhausted:
+                    break
+            if char_stream.position >= char_stream.length:
+                break
+
+            char_stream.fill(lookahead)
+
+            match, _ = self._match_at(char_stream, streaming=True)
+            if match is None:
+                # If no rule matches, raise an error
+                raise ValueError("Syntax error in input text: " + char_stream.lookahead(1))
+
+            yield match
+            char_stream.release()
+
+    def scan_bytes(self, data, start: int = 0):
+        """
+            Tokenise UTF-8 encoded `data` (bytes, or an `mmap`) without decoding it.
+
+            Yields `(kind, start, end, value)` with byte offsets. `value` is `SLICE`
+            when the token's value is exactly `data[start:end]` decoded, which is left
+            to the consumer. Around non-ASCII text and for rules that could not be
+            compiled, a decoded window is handed to the real rules instead.
+        """
+        skip = compile_ignore_bytes(self.ignore).match
+        segments = self.segments
+        length = len(data)
+
+        position = start
+        while True:
+            position = skip(data, position).end()
+            if position >= length:
+                break
+
+            for segment in segments:
+                token_start = position
+                if isinstance(segment, RegexSegment):
+                    # Classes like \w and \d are ASCII only over bytes, so never trust
+                    # a match starting on or running into a non-ASCII byte
+                    m = None if data[position] >= 0x80 else segment.byte_regex.match(data, position)
+                    handler = segment.handlers[m.lastgroup] if m is not None else FALLBACK
+                    if m is not None and m.end() < length and data[m.end()] >= 0x80:
+                        handler = FALLBACK
+
+                    if handler is not FALLBACK:
+                        position = m.end()
+                        if isinstance(handler, str):
+                            token = (handler, token_start, position, SLICE)
+                        elif handler is _number_handler:
+                            token = ("Number", token_start, position, int(m.group()))
+                        elif handler is _string_handler:
+                            if b"\\" in m.group():
+                                token = ("string", token_start, position, _string_handler(m.group().decode("utf-8"))[1])
+                            else:
+                                token = ("string", token_start + 1, position - 1, SLICE)
+                        else:
+                            token = (handler(m.group())[0], token_start + handler.begin_length,
+                                     position - handler.terminator_length, SLICE)
+                        yield token
+                        break
+
+                    if m is None and data[position] < 0x80:
+                        continue
+                    rules = segment.rules
+                else:
+                    rules = [segment.rule]
+
+                match, position = self._interpret_bytes(rules, data, position)
+                if match is None:
+                    continue
+                yield (match[0], token_start, position, match[1])
+                break
+            else:
+                # If no rule matches, raise an error
+                raise ValueError("Syntax error in input text: " + data[position:position + 1].decode("utf-8", "replace"))
+
+    def _interpret_bytes(self, rules, data, position: int):
+        # Run the rules over text decoded from `position`, then map the characters
+        # they consumed back to a byte offset
+        char_stream = BufferedCharacterStream(_decode_from(data, position))
+        match = self._interpret(rules, char_stream)
+        consumed = char_stream.items[:char_stream.position]
+        return match, position + len(consumed.encode("utf-8"))
+
+    @staticmethod
+    def _interpret(rules, char_stream):
+        for rule in rules:
+            match = rule.match(char_stream)
+            if match is not None:
+                return match
+        return None
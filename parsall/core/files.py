@@ -0,0 +1,55 @@
+import os
+import sys
+
+
+def atomic_write(path: str, data: bytes):
+    """
+        Write `data` to `path`, creating its directory. The data goes to a temporary
+        file that is then renamed over `path`, so a concurrent reader never sees half a file.
+    """
+    import tempfile
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+# Modules whose code decides what a lexer produces, saved results depend on them
+CORE_MODULES = ("parsall.lexing", "parsall.core.rule", "parsall.core.compiler", "parsall.core.charclass", "parsall.core.Streams")
+
+
+def _module_file(module: str):
+    loaded = sys.modules.get(module)
+    if loaded is not None:
+        return getattr(loaded, "__file__", None)
+
+    # Our own modules are found without importlib.util, which costs more than the rest of a warm start
+    package, _, rest = module.partition(".")
+    if package == "parsall" and rest:
+        return os.path.join(os.path.dirname(os.path.dirname(__file__)), *rest.split(".")) + ".py"
+
+    import importlib.util
+    spec = importlib.util.find_spec(module)
+    return spec.origin if spec is not None else None
+
+
+def module_stamp(module: str) -> str:
+    """
+        The path, modification time and size of a module's source, to tell when saved
+        results built by its code are stale. Just the name if it has no file.
+    """
+    origin = _module_file(module)
+    if not origin:
+        return module
+    try:
+        stat = os.stat(origin)
+    except OSError:
+        return origin
+    return f"{origin}:{stat.st_mtime_ns}:{stat.st_size}"
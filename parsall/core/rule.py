@@ -1,5 +1,32 @@
+import re
 from typing import List, Tuple
 from parsall.core.Streams import CharacterStream
+from parsall.core import charclass
+from parsall.core.charclass import ClassSet, DIGIT, IDENTIFIER_START, WORD
+
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+
+class CharacterClass:
+    """
+        A set of characters defined by a predicate, for `first_set`s that are too
+        large to list, e.g. `CharacterClass(str.isdecimal)`.
+    """
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def __contains__(self, character):
+        return character is not None and self.predicate(character)
+
+def union_first_sets(first_sets):
+    """
+        Combine several `first_set`s, None (any character) wins.
+    """
+    first_sets = list(first_sets)
+    if any(first_set is None for first_set in first_sets):
+        return None
+    if all(isinstance(first_set, frozenset) for first_set in first_sets):
+        return frozenset().union(*first_sets)
+    return CharacterClass(lambda c: any(c in first_set for first_set in first_sets))
 
 class SyntaxRule:
     """ 
@@ -8,8 +35,17 @@ class SyntaxRule:
         The base class for lexer rules. Inherit from this class to define a custom rule.
         The rule should at least impliment the `match(self, char_stream: CharacterStream)`
         function - this is used for the lexing stage.
+
+        Rules that can only start matching on certain characters should set `first_set`
+        to those characters (anything supporting `in`), so the lexer can skip them
+        everywhere else. None means the rule is tried at every position.
+
+        A subclass that overrides `match` does not inherit its parent's `first_set`,
+        see `dispatch_first_set`.
     """
 
+    first_set = None
+
     def match(self, char_stream: CharacterStream) -> str:
         """
             Implement your match condition here.
@@ -22,9 +58,38 @@ class SyntaxRule:
         # the beginning of the token sequence, or None otherwise.
         raise NotImplementedError("SyntaxRule is intended to abstract and as such it cannot be instantiated")#TODO: ignore case is currently not implemented
 
+def _defined_at(mro, name: str) -> int:
+    return next((index for index, cls in enumerate(mro) if name in cls.__dict__), len(mro))
+
+
+def dispatch_first_set(rule: SyntaxRule):
+    """
+        The `first_set` the lexer may skip `rule` by, or None to try it everywhere.
+
+        A `first_set` only describes the `match` it was written for. It counts when it
+        was set by the class defining the rule's `match` or a subclass of it (in a class
+        body, or by an `__init__` at least as derived), so a subclass overriding `match`
+        of a built-in rule is not filtered by the built-in's first characters.
+    """
+    mro = type(rule).__mro__
+    if "first_set" in getattr(rule, "__dict__", ()):
+        setter = _defined_at(mro, "__init__")
+    else:
+        setter = _defined_at(mro, "first_set")
+
+    if setter > _defined_at(mro, "match"):
+        return None
+    return rule.first_set
+
+
+# Marks a combined first_set that has not been worked out yet
+_UNSET = object()
+
+
 class IgnoreRule(SyntaxRule):
     def __init__(self, ignore_list: List[str]):
         self.ignore = ignore_list
+        self.first_set = frozenset(c for c in ignore_list if len(c) == 1)
 
     def match(self, char_stream: CharacterStream) -> str:
         if char_stream.peek() in self.ignore:
@@ -38,6 +103,7 @@ class WordRule(SyntaxRule):
         self.word = word
         self.token_name = token_name
         self.length = len(word)
+        self.first_set = frozenset(word[0]) if word else None
 
     def match(self, char_stream: CharacterStream) -> str:
 
@@ -48,83 +114,82 @@ class WordRule(SyntaxRule):
         # if (c := char_stream.peek(self.length)) and c.isalpha():
         #     return None
 
-        # If the target word is present, consume the same number of characters as the length of the word
-        match_text = ""
-        for _ in range(len(self.word)):
-            match_text += char_stream.pop()
+        # If the target word is present, skip over it, the token text is the word itself
+        char_stream.advance(self.length)
 
         # Return the word as a match object
-        return (self.token_name, match_text)
+        return (self.token_name, self.word)
 
 class NumberRule(SyntaxRule):
+    first_set = ClassSet(DIGIT)
+
     def match(self, char_stream: CharacterStream) -> str:
-        # Attempt to consume characters until a non-digit character is encountered
-        match_text = ""
-        while char_stream.peek() is not None and char_stream.peek().isdigit():
-            match_text += char_stream.pop()
+        # Find the end of the run of digits, if there is one
+        m = char_stream.match(charclass.RUNS[DIGIT])
 
         # If we successfully consume at least one digit, return the number as a match object
-        if match_text:
-            return ("Number", int(match_text))
-        else:
+        if m is None:
             return None
+
+        char_stream.advance(m.end() - m.start())
+        return ("Number", int(m.group()))
         
 class IdentifierRule(SyntaxRule):
+    first_set = ClassSet(IDENTIFIER_START)
+
     def match(self, char_stream: CharacterStream) -> str:
         # Check if the first character is a letter or underscore
         first_char = char_stream.peek()
-        if not first_char.isalpha() and first_char != '_':
+        if first_char is None or not charclass.classes(first_char) & IDENTIFIER_START:
             return None
-        
-        # Check that the identifier does not start with a number
-        if first_char.isdigit():
-            return None
-        
-        # Start building the identifier
-        identifier = char_stream.pop()
-        
-        # Add any additional letters, underscores, or digits
-        while True:
-            next_char = char_stream.peek()
-            if next_char is None or not (next_char.isalnum() or next_char == '_'):
-                break
-            identifier += char_stream.pop()
-        
-        return ("symbol", identifier)
+
+        # The rest is any run of letters, underscores or digits (\w is isalnum() plus '_')
+        m = char_stream.match(charclass.RUNS[WORD])
+        char_stream.advance(m.end() - m.start())
+
+        return ("symbol", m.group())
     
 class StringRule(SyntaxRule):
+    first_set = frozenset("\"'")
+
+    bodies = {
+        quote: re.compile("(?:[^" + quote + "\\\\]|\\\\[" + quote + "\\\\trxn])*")
+        for quote in "\"'"
+    }
+
     def match(self, char_stream: CharacterStream) -> str:
         quote = char_stream.peek()
         if quote != '"' and quote != "'":
             return None
 
         # Consume the opening quote
-        char_stream.pop()
+        char_stream.advance()
 
-        match_text = ""
-        while True:
-            next_char = char_stream.pop()
-            if next_char == quote:
-                return ("string", match_text)
-            elif next_char == "\\":
-                # Consume the escaped character
-                next_char = char_stream.pop()
-                if next_char is None:
-                    raise ValueError("Syntax error in input text")
-                elif next_char == quote or next_char in "\\trxn":
-                    match_text += next_char
-                else:
-                    raise ValueError("Syntax error in input text: " + next_char)
-            else:
-                match_text += next_char
-
-            if char_stream.peek() is None:
-                raise ValueError("Syntax error in input text")
+        # Scan to the first character that is not plain text or a valid escape
+        m = char_stream.match(self.bodies[quote])
+        char_stream.advance(m.end() - m.start())
+
+        next_char = char_stream.peek()
+        if next_char is None or (next_char == "\\" and char_stream.peek(1) is None):
+            raise ValueError("Syntax error in input text")
+        elif next_char != quote:
+            raise ValueError("Syntax error in input text: " + char_stream.peek(1))
+
+        # Consume the closing quote
+        char_stream.advance()
+
+        # Escapes keep the escaped character itself, so only strip the backslashes
+        match_text = m.group()
+        if "\\" in match_text:
+            match_text = _ESCAPE.sub(r"\1", match_text)
+
+        return ("string", match_text)
             
 class CharacterRule(SyntaxRule):
     def __init__(self, token_name, character):
         self.character = character
         self.token_name = token_name
+        self.first_set = frozenset((character,))
 
     def match(self, char_stream: CharacterStream) -> str:
         if char_stream.peek() == self.character:
@@ -137,21 +202,38 @@ class CompoundRule(SyntaxRule):
         self.rules = rules_config
         self.token_name = token_name
 
+    @property
+    def first_set(self):
+        # Whatever the first rule starts with, unless there is nothing to match.
+        # Worked out on first use, change `rules` before the rule is given to a lexer.
+        first_set = self.__dict__.get("_first_set", _UNSET)
+        if first_set is _UNSET:
+            first_set = self._first_set = dispatch_first_set(self.rules[0][0]) if self.rules else None
+        return first_set
+
     def match(self, text):
-        match_text = ""
+        parts = []
         for rule, include_text in self.rules:
             rule_match = rule.match(text)
             if rule_match is None:
                 return None
             if include_text:
-                match_text += rule_match[1]
-        return (self.token_name, match_text)
+                parts.append(rule_match[1])
+        return (self.token_name, "".join(parts))
 
 
 class Ruleset(SyntaxRule):
     def __init__(self, rules):
         self.rules = rules
 
+    @property
+    def first_set(self):
+        # Worked out on first use, change `rules` before the rule is given to a lexer
+        first_set = self.__dict__.get("_first_set", _UNSET)
+        if first_set is _UNSET:
+            first_set = self._first_set = union_first_sets(dispatch_first_set(rule) for rule in self.rules)
+        return first_set
+
     def match(self, text):
         for rule in self.rules:
             match = rule.match(text)
@@ -161,21 +243,66 @@ class Ruleset(SyntaxRule):
     
 class CharacterSet(Ruleset):
     def __init__(self, token_name, characters):
+        self.token_name = token_name
         self.rules = []
         for c in characters:
             self.rules.append(CharacterRule(token_name, c))
 
-class WordSet(Ruleset):
-    def __init__(self, token_name, words: list[str]):
-        self.rules = []
-        for word in words:
-            self.rules.append(WordRule(token_name, word))
+class WordSet(SyntaxRule):
+    """
+        Matches any of a list of words (keywords, multi-character operators...) in a
+        single pass over a prefix trie. The longest word present wins, so `and_eq` is
+        not split into `and` + `_eq`.
+
+        With `word_boundary=True` a word only matches when it is not directly followed
+        by a letter, digit or underscore, so `in` no longer matches the front of `int`.
+    """
+
+    # Key marking the end of a word in a trie node, peek() never returns ""
+    END = ""
+
+    def __init__(self, token_name, words: list[str], *, word_boundary = False):
+        self.token_name = token_name
+        self.words = [word for word in dict.fromkeys(words) if word]
+        self.word_boundary = word_boundary
+
+        self.trie = {}
+        for word in self.words:
+            node = self.trie
+            for c in word:
+                node = node.setdefault(c, {})
+            node[WordSet.END] = word
+
+        self.first_set = frozenset(self.trie)
+
+    def match(self, char_stream: CharacterStream) -> str:
+        node = self.trie
+        best = None
+        depth = 0
+
+        # Walk the trie as far as the input allows, remembering the last complete word
+        while True:
+            c = char_stream.peek(depth)
+            if WordSet.END in node and not (self.word_boundary and charclass.is_word(c)):
+                best = node[WordSet.END]
+            node = node.get(c)
+            if node is None:
+                break
+            depth += 1
+
+        if best is None:
+            return None
+
+        char_stream.advance(len(best))
+        return (self.token_name, best)
 
 class CommentRule(SyntaxRule):
     def __init__(self, comment_pattern, terminator) -> None:
         self.begin = comment_pattern
         self.terminator = terminator
         self.pattern_length = len(comment_pattern)
+        self.first_set = frozenset(comment_pattern[0]) if comment_pattern else None
+
     def match(self, char_stream: CharacterStream) -> str:
         
         if char_stream.lookahead(self.pattern_length) != self.begin:
@@ -183,21 +310,24 @@ class CommentRule(SyntaxRule):
         
         char_stream.advance(self.pattern_length)
 
-        comment_string = ""
-        while char_stream.peek() != self.terminator:
-            comment_string += char_stream.pop()
+        # Jump straight to the terminator rather than walking the comment
+        start = char_stream.position
+        end = char_stream.find(self.terminator)
 
-        # TODO: Provide a global method to eat a terminating chacter and raise
-        #       required errors
-        result = CharacterRule("", self.terminator).match(char_stream)
+        if end == -1:
+            # The comment runs to the end of the text, the error is found there
+            char_stream.advance(char_stream.length - start)
+            raise SyntaxError("Unterminated comment, expected " + repr(self.terminator))
+
+        comment_string = char_stream.items[start:end]
+        char_stream.advance(end - start + len(self.terminator))
 
-        if not result:
-            raise SyntaxError(char_stream.peek())
-        
         return ("Comment", comment_string)
 
 
 class AlphaCharacterRule(SyntaxRule):
+    first_set = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
     def match(self, char_stream: CharacterStream):
 
         code = ord(char_stream.peek())
@@ -213,15 +343,15 @@ class GreedyConsumerRule(SyntaxRule):
 
     def match(self, char_stream: CharacterStream):
 
-        value = ""
+        parts = []
         while token := self.consumer.match(char_stream):
-            value += token[1]
+            parts.append(token[1])
 
         result = self.end.match(char_stream)
 
         if not result:
             raise SyntaxError(char_stream.peek())
         
-        return ("", value)
+        return ("", "".join(parts))
     
 
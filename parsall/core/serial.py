@@ -0,0 +1,556 @@
+"""
+    A compact binary format for token lists and `ASTNode` trees.
+
+    A file is a 6 byte header, a body of records, then a footer:
+
+        header   magic (4 bytes), version, flags
+        body     one record per token (or per AST node, in post-order)
+        strings  every kind and string value once, UTF-8, followed by their offsets
+        index    the body offset of every `BLOCK`th record, for random access
+        trailer  record count, section offsets and the magic again
+
+    A record starts with a varint holding the kind's string id and a value tag. The
+    value follows: a string id, a zigzag varint, an 8 byte float or a pickle for
+    anything else, which readers only unpickle when asked to. Token spans are stored
+    as a varint delta from the previous token's end and a varint length. AST records
+    end with their number of children.
+
+    The string table sits after the body so records can be written as they come,
+    only the unique strings are held in memory until the file is closed.
+"""
+import pickle
+import struct
+import sys
+from array import array
+from typing import List, Tuple
+
+TOKENS_MAGIC = b"PLTK"
+TREE_MAGIC = b"PLAS"
+VERSION = 1
+
+# Header flags
+SPANS = 1
+
+# Records between random access entry points
+BLOCK = 1024
+
+# Value tags, kept in the low bits of each record's first varint
+_STRING, _INT, _NONE, _TRUE, _FALSE, _FLOAT, _OBJECT = range(7)
+_TAG_BITS = 3
+_TAG_MASK = (1 << _TAG_BITS) - 1
+
+_HEADER = struct.Struct("<4sBB")
+_TRAILER = struct.Struct("<QQQQQI4s")
+_FLOAT_STRUCT = struct.Struct("<d")
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position: int) -> Tuple[int, int]:
+    byte = data[position]
+    if byte < 0x80:
+        return byte, position + 1
+
+    result = byte & 0x7F
+    shift = 7
+    while True:
+        position += 1
+        byte = data[position]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position + 1
+        shift += 7
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _uint64s(values) -> bytes:
+    values = array('Q', values)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_uint64s(data, start: int, count: int) -> array:
+    values = array('Q')
+    values.frombytes(data[start:start + count * 8])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+class _Writer:
+    """
+        The string table, block index and footer shared by both writers.
+    """
+
+    def __init__(self, file, magic: bytes, flags: int):
+        self.file = file
+        self.magic = magic
+        self.count = 0
+        self.strings = {}
+        self.string_data = []
+        self.string_offsets = [0]
+        self.blocks = []
+        self.buffer = bytearray(_HEADER.pack(magic, VERSION, flags))
+        self.written = 0
+        self.closed = False
+
+    def string_id(self, text: str) -> int:
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.string_data)
+            encoded = text.encode("utf-8", "surrogatepass")
+            self.string_data.append(encoded)
+            self.string_offsets.append(self.string_offsets[-1] + len(encoded))
+        return string_id
+
+    def record(self, kind, value):
+        """
+            Append a record's kind and value to the buffer.
+        """
+        out = self.buffer
+        kind_id = self.string_id(kind) << _TAG_BITS
+
+        if isinstance(value, str):
+            _write_varint(out, kind_id | _STRING)
+            _write_varint(out, self.string_id(value))
+        elif value is None:
+            _write_varint(out, kind_id | _NONE)
+        elif value is True:
+            _write_varint(out, kind_id | _TRUE)
+        elif value is False:
+            _write_varint(out, kind_id | _FALSE)
+        elif type(value) is int:
+            _write_varint(out, kind_id | _INT)
+            _write_varint(out, _zigzag(value))
+        elif type(value) is float:
+            _write_varint(out, kind_id | _FLOAT)
+            out += _FLOAT_STRUCT.pack(value)
+        else:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            _write_varint(out, kind_id | _OBJECT)
+            _write_varint(out, len(data))
+            out += data
+
+    def start_record(self) -> bool:
+        """
+            Count a new record.
+
+            Returns
+            -------
+                True if the record starts a new block
+        """
+        if self.closed:
+            raise ValueError("Write to a closed writer")
+
+        starts_block = self.count % BLOCK == 0
+        if starts_block:
+            self.blocks.append(self.written + len(self.buffer))
+        self.count += 1
+        return starts_block
+
+    def flush(self, force=False):
+        if force or len(self.buffer) >= 65536:
+            self.file.write(self.buffer)
+            self.written += len(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush(force=True)
+
+        strings_start = self.written
+        string_bytes = b"".join(self.string_data)
+        self.file.write(string_bytes)
+        self.file.write(_uint64s(self.string_offsets))
+
+        index_start = strings_start + len(string_bytes) + len(self.string_offsets) * 8
+        self.file.write(_uint64s(self.blocks))
+        self.file.write(_TRAILER.pack(
+            self.count, strings_start, len(self.string_data), index_start, len(self.blocks), BLOCK, self.magic
+        ))
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TokenWriter(_Writer):
+    """
+        Write tokens to a binary file one at a time.
+
+            with open("tokens.bin", "wb") as file, TokenWriter(file, spans=True) as writer:
+                for token, start, end in lexer.scan(text):
+                    writer.write(token, start, end)
+
+        Closing the writer writes the footer, the file itself is left open.
+    """
+
+    def __init__(self, file, spans=False):
+        super().__init__(file, TOKENS_MAGIC, SPANS if spans else 0)
+        self.spans = spans
+        self.previous_end = 0
+
+    def write(self, token: Tuple, start: int = None, end: int = None):
+        if self.start_record():
+            # Spans are relative within a block so any block can be decoded alone
+            self.previous_end = 0
+
+        kind, value = token
+        self.record(kind, value)
+
+        if self.spans:
+            if start is None:
+                raise ValueError("This writer stores spans, write() needs start and end")
+            _write_varint(self.buffer, _zigzag(start - self.previous_end))
+            _write_varint(self.buffer, end - start)
+            self.previous_end = end
+
+        self.flush()
+
+
+class TreeWriter(_Writer):
+    """
+        Write `ASTNode` trees, each node after its children.
+    """
+
+    def __init__(self, file):
+        super().__init__(file, TREE_MAGIC, 0)
+
+    def write(self, node):
+        # Post-order without recursion, so deep trees do not hit the recursion limit
+        stack = [(node, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if expanded:
+                self.start_record()
+                self.record(current.type, current.value)
+                _write_varint(self.buffer, len(current.children))
+                self.flush()
+            else:
+                stack.append((current, True))
+                for child in reversed(current.children):
+                    stack.append((child, False))
+
+
+class _Reader:
+    """
+        Reads the header and footer of a buffer (bytes or an `mmap`), strings are
+        decoded the first time they are used.
+    """
+
+    def __init__(self, data, magic: bytes, mapped=None, objects=False):
+        self.data = data
+        self._mapped = mapped
+        self.objects = objects
+
+        if len(data) < _HEADER.size + _TRAILER.size:
+            raise ValueError("Not a parsall binary file, it is too short")
+
+        file_magic, version, self.flags = _HEADER.unpack_from(data, 0)
+        count, strings_start, string_count, index_start, block_count, block_size, end_magic = \
+            _TRAILER.unpack_from(data, len(data) - _TRAILER.size)
+
+        if file_magic != magic or end_magic != magic:
+            raise ValueError("Not a parsall binary file of the expected kind")
+        if version != VERSION:
+            raise ValueError(f"Unsupported parsall binary format version {version}")
+
+        self.count = count
+        self.block_size = block_size
+        self.body_end = strings_start
+        self.strings_start = strings_start
+        self.string_offsets = _read_uint64s(data, index_start - (string_count + 1) * 8, string_count + 1)
+        self.blocks = _read_uint64s(data, index_start, block_count)
+        self.strings = [None] * string_count
+
+    def string(self, string_id: int) -> str:
+        text = self.strings[string_id]
+        if text is None:
+            start = self.strings_start + self.string_offsets[string_id]
+            end = self.strings_start + self.string_offsets[string_id + 1]
+            text = self.strings[string_id] = str(self.data[start:end], "utf-8", "surrogatepass")
+        return text
+
+    def record(self, data, position: int):
+        """
+            Decode one record's kind and value from `data`.
+
+            Returns
+            -------
+                `(kind, value, position after the value)`
+        """
+        head, position = _read_varint(data, position)
+        kind = self.string(head >> _TAG_BITS)
+        tag = head & _TAG_MASK
+
+        if tag == _STRING:
+            string_id, position = _read_varint(data, position)
+            value = self.string(string_id)
+        elif tag == _INT:
+            value, position = _read_varint(data, position)
+            value = _unzigzag(value)
+        elif tag == _NONE:
+            value = None
+        elif tag == _TRUE:
+            value = True
+        elif tag == _FALSE:
+            value = False
+        elif tag == _FLOAT:
+            value = _FLOAT_STRUCT.unpack_from(data, position)[0]
+            position += _FLOAT_STRUCT.size
+        else:
+            if not self.objects:
+                raise ValueError("The file holds a pickled value and objects are not allowed")
+            length, position = _read_varint(data, position)
+            value = pickle.loads(data[position:position + length])
+            position += length
+
+        return kind, value, position
+
+    def close(self):
+        if self._mapped is not None:
+            self.data = None
+            self._mapped.close()
+            self._mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TokenFile(_Reader):
+    """
+        A read only sequence over a binary token file. Nothing is decoded up front:
+        indexing decodes the block of `BLOCK` records the token is in, iterating
+        decodes one block at a time.
+    """
+
+    def __init__(self, data, mapped=None, objects=False):
+        super().__init__(data, TOKENS_MAGIC, mapped, objects)
+        self.has_spans = bool(self.flags & SPANS)
+        self._block = None
+        self._block_index = -1
+
+    def _decode_block(self, block_index: int):
+        """
+            Returns
+            -------
+                `(tokens, spans)` for one block, spans is None without them
+        """
+        if block_index == self._block_index:
+            return self._block
+
+        start = self.blocks[block_index]
+        end = self.blocks[block_index + 1] if block_index + 1 < len(self.blocks) else self.body_end
+        # One copy of the block, decoding from bytes is much faster than from an mmap
+        data = bytes(self.data[start:end])
+
+        tokens = []
+        spans = [] if self.has_spans else None
+        count = min(self.block_size, self.count - block_index * self.block_size)
+        record = self.record
+        position = 0
+        previous_end = 0
+        for _ in range(count):
+            kind, value, position = record(data, position)
+            tokens.append((kind, value))
+
+            if spans is not None:
+                delta, position = _read_varint(data, position)
+                length, position = _read_varint(data, position)
+                token_start = previous_end + _unzigzag(delta)
+                previous_end = token_start + length
+                spans.append((token_start, previous_end))
+
+        self._block = (tokens, spans)
+        self._block_index = block_index
+        return self._block
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("token index out of range")
+
+        tokens, _ = self._decode_block(index // self.block_size)
+        return tokens[index % self.block_size]
+
+    def __iter__(self):
+        for block_index in range(len(self.blocks)):
+            tokens, _ = self._decode_block(block_index)
+            yield from tokens
+
+    def span(self, index: int) -> Tuple[int, int]:
+        if not self.has_spans:
+            raise ValueError("This file was written without spans")
+        if index < 0:
+            index += self.count
+
+        _, spans = self._decode_block(index // self.block_size)
+        return spans[index % self.block_size]
+
+    def scan(self):
+        """
+            Yield `(token, start, end)` triples, like `DefaultLexer.scan`.
+        """
+        if not self.has_spans:
+            raise ValueError("This file was written without spans")
+        for block_index in range(len(self.blocks)):
+            tokens, spans = self._decode_block(block_index)
+            for token, (start, end) in zip(tokens, spans):
+                yield token, start, end
+
+    def __repr__(self):
+        return f"TokenFile({self.count} tokens)"
+
+
+def _open(file):
+    """
+        Map a path or a real file, or read a file-like object that can not be mapped.
+
+        Returns
+        -------
+            `(data, mmap or None)`
+    """
+    import mmap
+    import os
+
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as opened:
+            # An empty file can not be mapped, the reader reports it as too short
+            if os.fstat(opened.fileno()).st_size == 0:
+                return b"", None
+            mapped = mmap.mmap(opened.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped, mapped
+
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return file.read(), None
+    return mapped, mapped
+
+
+def dump(tokens, file, spans=None):
+    """
+        Write a token list to a binary file object.
+
+        Args:
+            tokens: `(kind, value)` tuples, or a `TokenBuffer` (its spans are kept).
+            file: A file opened for binary writing.
+            spans: Optional `(start, end)` pairs, one per token.
+    """
+    from parsall.core.tokens import TokenBuffer
+
+    if isinstance(tokens, TokenBuffer) and spans is None:
+        spans = zip(tokens.starts, tokens.ends)
+
+    with TokenWriter(file, spans=spans is not None) as writer:
+        if spans is None:
+            for token in tokens:
+                writer.write(token)
+        else:
+            for token, (start, end) in zip(tokens, spans):
+                writer.write(token, start, end)
+
+
+def dumps(tokens, spans=None) -> bytes:
+    import io
+    out = io.BytesIO()
+    dump(tokens, out, spans)
+    return out.getvalue()
+
+
+def load(file, objects=False) -> TokenFile:
+    """
+        Open a binary token file, memory mapping it where possible.
+
+        Args:
+            file: A path or a binary file object.
+            objects: Unpickle values stored as a pickle, the same as `loads`. Only for
+                files you trust.
+
+        Returns
+        -------
+            A lazy `TokenFile`, close it (or use it with `with`) to release the map
+    """
+    data, mapped = _open(file)
+    try:
+        return TokenFile(data, mapped, objects)
+    except BaseException:
+        if mapped is not None:
+            mapped.close()
+        raise
+
+
+def loads(data: bytes, objects=False) -> TokenFile:
+    """
+        Read a binary token file from `data`. A value stored as a pickle raises
+        `ValueError` unless `objects` is true, unpickling untrusted data can run code.
+    """
+    return TokenFile(data, objects=objects)
+
+
+def dump_tree(node, file):
+    """
+        Write an `ASTNode` tree to a binary file object.
+    """
+    with TreeWriter(file) as writer:
+        writer.write(node)
+
+
+def load_tree(file, objects=False):
+    """
+        Read an `ASTNode` tree back from a path or binary file object. `objects` is the
+        same as for `loads`.
+    """
+    from parsall.core._parser import ASTNode
+
+    data, mapped = _open(file)
+    try:
+        reader = _Reader(data, TREE_MAGIC, mapped, objects)
+    except BaseException:
+        if mapped is not None:
+            mapped.close()
+        raise
+
+    with reader:
+        body = bytes(data[_HEADER.size:reader.body_end])
+        built: List = []
+        position = 0
+        for _ in range(reader.count):
+            kind, value, position = reader.record(body, position)
+            child_count, position = _read_varint(body, position)
+
+            children = built[len(built) - child_count:] if child_count else None
+            if child_count:
+                del built[len(built) - child_count:]
+            built.append(ASTNode(kind, children, value))
+
+    if len(built) != 1:
+        raise ValueError(f"Expected a single tree, found {len(built)} roots")
+    return built[0]
@@ -0,0 +1,186 @@
+from array import array
+from bisect import bisect_right
+from typing import List, Tuple
+from parsall.core.Streams import TokenStream
+
+# Marks a token whose value is just the source text of its span
+SLICE = object()
+
+
+class TokenBuffer:
+    """
+        A columnar list of tokens over the source they were lexed from.
+
+        Token kinds are stored as small integer ids and each token as a start/end
+        offset into the source, so a token costs a handful of bytes instead of a
+        tuple. Indexing rebuilds the usual `(kind, value)` tuple on demand.
+
+        The span covers the token's value when the value is a plain slice of the
+        source (keywords, symbols, unescaped strings and comments without their
+        delimiters). Any other value (numbers, strings with escapes) is kept in
+        a side table and the span covers the whole lexeme instead.
+
+        The source may also be UTF-8 bytes or an `mmap`, offsets are then byte
+        offsets and token text is only decoded when it is accessed.
+
+        Offsets take 4 bytes each, or 8 for a source of 4 GiB (4G characters) or more.
+    """
+
+    def __init__(self, source, encoding="utf-8"):
+        self.source = source
+        self.encoding = None if isinstance(source, str) else encoding
+        self.kinds = array('H')
+        self.offset_type = 'I' if len(source) < 1 << 32 else 'Q'
+        self.starts = array(self.offset_type)
+        self.ends = array(self.offset_type)
+        self.values = {}
+        """Values that are not a slice of the source, by token index."""
+
+        self.kind_names: List[str] = []
+        self.kind_ids = {}
+        self._newlines = None
+        self._index = None
+
+    @classmethod
+    def from_scan(cls, source: str, scan) -> "TokenBuffer":
+        """
+            Build a buffer from `(token, start, end)` triples, as produced by `DefaultLexer.scan`.
+        """
+        buffer = cls(source)
+        for token, start, end in scan:
+            buffer.append(token, start, end)
+        return buffer
+
+    def add(self, kind: str, start: int, end: int, value=SLICE):
+        """
+            Add a token by its span, `value` is only needed when it is not the span's text.
+        """
+        if value is not SLICE:
+            self.values[len(self.kinds)] = value
+
+        self.kinds.append(self.kind_id(kind))
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def kind_id(self, kind: str) -> int:
+        kind_id = self.kind_ids.get(kind)
+        if kind_id is None:
+            kind_id = self.kind_ids[kind] = len(self.kind_names)
+            self.kind_names.append(kind)
+        return kind_id
+
+    def append(self, token: Tuple, start: int, end: int):
+        """
+            Add a token that was lexed from `source[start:end]`.
+        """
+        kind, value = token
+        index = len(self.kinds)
+
+        # Narrow the span down to the value itself when it appears in the lexeme
+        if isinstance(value, str) and (found := self.source.find(value, start, end)) != -1:
+            start, end = found, found + len(value)
+        else:
+            self.values[index] = value
+
+        self.kinds.append(self.kind_id(kind))
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self.kinds)
+
+        kind = self.kind_names[self.kinds[index]]
+        if index in self.values:
+            return (kind, self.values[index])
+        return (kind, self.text(index))
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def kind(self, index: int) -> str:
+        return self.kind_names[self.kinds[index]]
+
+    def span(self, index: int) -> Tuple[int, int]:
+        return (self.starts[index], self.ends[index])
+
+    def text(self, index: int) -> str:
+        """
+            The source text covered by the token's span.
+        """
+        text = self.source[self.starts[index]:self.ends[index]]
+        if self.encoding is not None:
+            text = text.decode(self.encoding)
+        return text
+
+    def view(self, index: int) -> memoryview:
+        """
+            A zero copy view of the token's span, for byte sources.
+        """
+        return memoryview(self.source)[self.starts[index]:self.ends[index]]
+
+    def line_col(self, offset: int) -> Tuple[int, int]:
+        """
+            Convert a source offset into a 1 based `(line, column)` pair. Columns
+            count bytes for byte sources.
+        """
+        if self._newlines is None:
+            # Offsets of every newline, built once on first use
+            newline = "\n" if self.encoding is None else b"\n"
+            newlines = array(self.offset_type)
+            index = self.source.find(newline)
+            while index != -1:
+                newlines.append(index)
+                index = self.source.find(newline, index + 1)
+            self._newlines = newlines
+
+        line = bisect_right(self._newlines, offset - 1)
+        line_start = self._newlines[line - 1] + 1 if line else 0
+        return (line + 1, offset - line_start + 1)
+
+    def position(self, index: int) -> Tuple[int, int]:
+        """
+            The `(line, column)` where token `index` starts.
+        """
+        return self.line_col(self.starts[index])
+
+    def stream(self) -> TokenStream:
+        """
+            A `TokenStream` over this buffer for `peek`/`pop` style parsers.
+        """
+        return TokenStream(self)
+
+    def find_all(self, *pattern: Tuple) -> List[int]:
+        """
+            Start positions of `pattern`, see `parsall.query.TokenIndex.find_all`. The
+            index is built on first use, do not add tokens after querying.
+        """
+        if self._index is None:
+            from parsall.query import TokenIndex
+            self._index = TokenIndex(self)
+        return self._index.find_all(*pattern)
+
+    def close(self):
+        """
+            Release the source if it is a file map (see `DefaultLexer.tokenise_file`).
+            Token text can not be read after this.
+        """
+        close = getattr(self.source, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"TokenBuffer({len(self)} tokens)"
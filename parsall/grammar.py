@@ -0,0 +1,363 @@
+from itertools import product
+from typing import List, Tuple
+from parsall.core.Streams import TokenStream
+
+# Matches any value of a token kind
+ANY = object()
+
+
+class MatchToken:
+    """
+        Matches a single token with the given kind and value, e.g. `MatchToken("keyword", "def")`.
+    """
+
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+
+    def sequences(self):
+        return [((self.kind, self.value),)]
+
+    def __repr__(self):
+        return f"MatchToken({self.kind!r}, {self.value!r})"
+
+
+class MatchTokenID:
+    """
+        Matches a single token of the given kind, whatever its value.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def sequences(self):
+        return [((self.kind, ANY),)]
+
+    def __repr__(self):
+        return f"MatchTokenID({self.kind!r})"
+
+
+class Chain:
+    """
+        Matches its elements one after the other.
+    """
+
+    def __init__(self, elements: list, name: str = None):
+        self.elements = elements
+        self.name = name
+
+    def sequences(self):
+        parts = [element.sequences() for element in self.elements]
+        return [sum(choice, ()) for choice in product(*parts)]
+
+    def __repr__(self):
+        return self.name or f"Chain({self.elements!r})"
+
+
+class RuleGroup:
+    """
+        Matches any one of its alternatives.
+    """
+
+    def __init__(self, alternatives: list, name: str = None):
+        self.alternatives = alternatives
+        self.name = name
+
+    def sequences(self):
+        return [sequence for alternative in self.alternatives for sequence in alternative.sequences()]
+
+    def __repr__(self):
+        return self.name or f"RuleGroup({self.alternatives!r})"
+
+
+class Ignore:
+    """
+        In a grammar, tells the parser what it may pass over.
+
+        `Ignore()` lets `parse` skip any token that is not part of a match. `Ignore(kinds)`
+        lets chains run across tokens of those kinds (comments, newlines...), they are
+        only skipped when they do not match the next element.
+    """
+
+    def __init__(self, kinds=()):
+        self.kinds = frozenset(kinds)
+
+
+class Match:
+    __slots__ = ("rule", "start", "end", "tokens")
+
+    def __init__(self, rule, start: int, end: int, tokens: List[Tuple]):
+        self.rule = rule
+        self.start = start
+        """Index of the first token matched."""
+        self.end = end
+        """Index just past the last token matched."""
+        self.tokens = tokens
+        """The tokens matched by the rule's elements, without skipped ones."""
+
+    @property
+    def name(self):
+        return getattr(self.rule, "name", None) or repr(self.rule)
+
+    def __repr__(self):
+        return f"Match({self.name}, {self.start}:{self.end}, {self.tokens!r})"
+
+
+class Parser:
+    """
+        Finds every rule of a grammar in a token list in a single pass.
+
+        The rules are compiled into one automaton, the same idea as Aho-Corasick over
+        strings: each token moves every partial match forward at once, so the cost per
+        token does not grow with the number of rules. Its states are built the first
+        time they are reached and then cost a dict lookup per token.
+
+        Tokens are first reduced to a class id with a lookup on their kind (and value
+        for kinds some rule matches by value). Tokens of a kind no rule starts with
+        (outside the FIRST sets) leave the start state without touching the automaton.
+
+            grammar = [Chain([MatchToken("keyword", "def"), MatchTokenID("symbol")]), Ignore()]
+            for match in Parser(grammar).parse(tokens):
+                ...
+    """
+
+    def __init__(self, grammar: list):
+        self.rules = []
+        self.ignore_rest = False
+        skip_kinds = set()
+
+        # Every rule becomes one or more flat sequences of (kind, value or ANY) atoms
+        self.sequences: List[Tuple] = []
+        self.sequence_rules = []
+        for entry in grammar:
+            if isinstance(entry, Ignore):
+                if entry.kinds:
+                    skip_kinds |= entry.kinds
+                else:
+                    self.ignore_rest = True
+                continue
+
+            self.rules.append(entry)
+            for sequence in entry.sequences():
+                if not sequence:
+                    raise ValueError(f"{entry!r} can match nothing")
+                self.sequences.append(sequence)
+                self.sequence_rules.append(entry)
+
+        self.skip_kinds = frozenset(skip_kinds)
+        self._build_classes()
+
+        # Lazily built automaton, state 0 is "nothing matched yet"
+        self.states = [frozenset()]
+        self.state_ids = {frozenset(): 0}
+        self.transitions = [{}]
+
+    def _build_classes(self):
+        """
+            Group tokens by the atoms they satisfy, every token with the same atoms
+            behaves the same in the automaton.
+        """
+        atoms_by_kind = {}
+        for sequence in self.sequences:
+            for kind, value in sequence:
+                atoms_by_kind.setdefault(kind, set()).add(value)
+
+        self.class_atoms = [frozenset()]
+        self.class_skips = [False]
+        class_ids = {(frozenset(), False): 0}
+
+        def class_id(atoms, skip):
+            key = (frozenset(atoms), skip)
+            if key not in class_ids:
+                class_ids[key] = len(self.class_atoms)
+                self.class_atoms.append(key[0])
+                self.class_skips.append(skip)
+            return class_ids[key]
+
+        # kind -> (class of any other value, {value: class})
+        self.kind_classes = {}
+        for kind in atoms_by_kind.keys() | self.skip_kinds:
+            values = atoms_by_kind.get(kind, ())
+            skip = kind in self.skip_kinds
+            any_atoms = {(kind, ANY)} if ANY in values else set()
+            by_value = {
+                value: class_id(any_atoms | {(kind, value)}, skip)
+                for value in values if value is not ANY
+            }
+            self.kind_classes[kind] = (class_id(any_atoms, skip), by_value)
+
+        # FIRST sets: which sequences can start on each atom
+        self.starts = {}
+        for index, sequence in enumerate(self.sequences):
+            self.starts.setdefault(sequence[0], []).append(index)
+        self.first_kinds = frozenset(kind for kind, _ in self.starts)
+
+    def classify(self, token) -> int:
+        entry = self.kind_classes.get(token[0])
+        if entry is None:
+            return 0
+        default, by_value = entry
+        if by_value:
+            try:
+                return by_value.get(token[1], default)
+            except TypeError:
+                # Unhashable values can only match by kind
+                return default
+        return default
+
+    def _step(self, state: int, token_class: int):
+        """
+            Work out (and remember) where `state` goes on a token of `token_class`.
+
+            Returns
+            -------
+                `(next state, indices of the sequences completed)`
+        """
+        atoms = self.class_atoms[token_class]
+        skip = self.class_skips[token_class]
+        sequences = self.sequences
+
+        positions = set()
+        completed = []
+
+        def advance(sequence, matched):
+            if matched == len(sequences[sequence]):
+                completed.append(sequence)
+            else:
+                positions.add((sequence, matched))
+
+        for sequence, matched in self.states[state]:
+            if sequences[sequence][matched] in atoms:
+                advance(sequence, matched + 1)
+            elif skip:
+                positions.add((sequence, matched))
+
+        for atom in atoms:
+            for sequence in self.starts.get(atom, ()):
+                advance(sequence, 1)
+
+        positions = frozenset(positions)
+        next_state = self.state_ids.get(positions)
+        if next_state is None:
+            next_state = self.state_ids[positions] = len(self.states)
+            self.states.append(positions)
+            self.transitions.append({})
+
+        result = (next_state, tuple(sorted(set(completed))))
+        self.transitions[state][token_class] = result
+        return result
+
+    def _start(self, sequence: int, tokens, end: int) -> Tuple[int, list]:
+        """
+            Find where an occurrence of `sequence` ending at token `end` began, taking the
+            latest start (the shortest match) when several would work.
+
+            Returns
+            -------
+                `(start, matched tokens)`
+        """
+        atoms = self.sequences[sequence]
+        if not self.skip_kinds:
+            start = end - len(atoms) + 1
+            return start, list(tokens[start:end + 1])
+
+        first = atoms[0]
+        candidate = end
+        while candidate >= 0:
+            token = tokens[candidate]
+            token_atoms = self.class_atoms[self.classify(token)]
+            if first in token_atoms:
+                run = self._run(atoms, tokens, candidate, end)
+                if run is not None:
+                    return candidate, run
+            elif token[0] not in self.skip_kinds and not token_atoms.intersection(atoms):
+                break
+            candidate -= 1
+
+        raise AssertionError("A completed sequence has no start")
+
+    def _run(self, atoms, tokens, start: int, end: int):
+        """
+            Match `atoms` from `start`, returning the matched tokens if it ends exactly at `end`.
+        """
+        matched = []
+        for index in range(start, end + 1):
+            token = tokens[index]
+            if atoms[len(matched)] in self.class_atoms[self.classify(token)]:
+                matched.append(token)
+                if len(matched) == len(atoms):
+                    return matched if index == end else None
+            elif token[0] not in self.skip_kinds:
+                return None
+        return None
+
+    def finditer(self, tokens):
+        """
+            Yield a `Match` for every occurrence of every rule, overlapping ones included,
+            in order of where they end.
+
+            Args:
+                tokens: A list of tokens, a `TokenStream` (from its current position)
+                    or anything else indexable such as a `TokenBuffer`.
+        """
+        if isinstance(tokens, TokenStream):
+            tokens = tokens.items[tokens.position:tokens.length]
+        elif not hasattr(tokens, "__getitem__"):
+            tokens = list(tokens)
+
+        transitions = self.transitions
+        first_kinds = self.first_kinds
+        classify = self.classify
+        step = self._step
+
+        state = 0
+        for index, token in enumerate(tokens):
+            # Nothing in progress and no rule starts with this kind of token
+            if state == 0 and token[0] not in first_kinds:
+                continue
+
+            token_class = classify(token)
+            result = transitions[state].get(token_class)
+            if result is None:
+                result = step(state, token_class)
+            state, completed = result
+
+            for sequence in completed:
+                start, matched = self._start(sequence, tokens, index)
+                yield Match(self.sequence_rules[sequence], start, index + 1, matched)
+
+    def parse(self, tokens) -> List[Match]:
+        """
+            The non-overlapping matches, leftmost first. Where several start at the same
+            token the longest wins, then the rule listed first.
+
+            Raises
+            ------
+                ValueError: A token is not part of any match and the grammar has no `Ignore()`
+        """
+        if isinstance(tokens, TokenStream):
+            tokens = tokens.items[tokens.position:tokens.length]
+        elif not hasattr(tokens, "__getitem__"):
+            tokens = list(tokens)
+
+        order = {id(rule): index for index, rule in enumerate(self.rules)}
+        found = sorted(self.finditer(tokens), key=lambda match: (match.start, -match.end, order[id(match.rule)]))
+
+        matches = []
+        position = 0
+        for match in found:
+            if match.start < position:
+                continue
+            if not self.ignore_rest:
+                self._check_gap(tokens, position, match.start)
+            matches.append(match)
+            position = match.end
+
+        if not self.ignore_rest:
+            self._check_gap(tokens, position, len(tokens))
+        return matches
+
+    def _check_gap(self, tokens, start: int, end: int):
+        for index in range(start, end):
+            if tokens[index][0] not in self.skip_kinds:
+                raise ValueError(f"Unexpected token {tokens[index]!r} at {index}")
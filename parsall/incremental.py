@@ -0,0 +1,224 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import List, Tuple
+from parsall.lexing import DefaultLexer
+
+_end = lambda span: span[2]
+
+
+def _split(text: str, size: int) -> List[str]:
+    return [text[index:index + size] for index in range(0, len(text), size)]
+
+
+def _starts(lengths, first=0) -> List[int]:
+    return [first + offset for offset in accumulate(lengths, initial=0)][:-1]
+
+
+class IncrementalLexer:
+    """
+        Keeps the tokens of a text up to date as it is edited, re-lexing only around
+        each edit instead of the whole text.
+
+        Lexing restarts at the last token boundary safely before the edit and stops
+        as soon as a new token ends where an old one did (after the edit), since the
+        rest of the text and so the rest of the tokens are unchanged.
+
+        The text is kept in pieces of about `piece_size` characters and the tokens in
+        blocks of about `block_size`, each block's spans relative to its own offset.
+        An edit only rewrites the pieces and blocks it touches and moves the offsets of
+        the later ones, so it costs about the edit plus one integer per piece and block,
+        rather than a copy of the text and of every token after it.
+
+            document = IncrementalLexer(lexer, text)
+            first, old_stop, new_tokens = document.edit(10, 12, "name")
+
+        Args:
+            lexer: The lexer to tokenise with.
+            text: The initial text.
+            margin: How far past the end of a token a rule may look ahead.
+    """
+
+    def __init__(self, lexer: DefaultLexer, text: str = "", *, margin=256, piece_size=4096, block_size=512):
+        self.lexer = lexer
+        self.margin = margin
+        self.piece_size = piece_size
+        self.block_size = block_size
+
+        self.pieces = _split(text, piece_size)
+        self.piece_starts = _starts(map(len, self.pieces))
+        self.length = len(text)
+
+        self.blocks: List[List[Tuple]] = []
+        self.offsets: List[int] = []
+        self._store(0, 0, list(lexer.scan(text)))
+
+    @property
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+    def __len__(self):
+        return sum(map(len, self.blocks))
+
+    def __iter__(self):
+        """
+            `(token, start, end)` for every token, with absolute offsets.
+        """
+        for block, offset in zip(self.blocks, self.offsets):
+            for token, start, end in block:
+                yield token, start + offset, end + offset
+
+    def tokens(self) -> List[Tuple]:
+        return [token for token, _, _ in self]
+
+    def _store(self, first_block: int, last_block: int, spans: List[Tuple]):
+        """
+            Replace `blocks[first_block:last_block]` by blocks holding `spans`, which
+            have absolute offsets.
+        """
+        blocks = []
+        offsets = []
+        for index in range(0, len(spans), self.block_size):
+            chunk = spans[index:index + self.block_size]
+            offset = chunk[0][1]
+            blocks.append([(token, start - offset, end - offset) for token, start, end in chunk])
+            offsets.append(offset)
+
+        self.blocks[first_block:last_block] = blocks
+        self.offsets[first_block:last_block] = offsets
+        return len(blocks)
+
+    def _read(self, pieces, starts, start: int, end: int) -> str:
+        """
+            `text[start:end]` of the text held in `pieces`.
+        """
+        if start >= end:
+            return ""
+        first = bisect_right(starts, start) - 1
+        last = bisect_left(starts, end)
+        joined = "".join(pieces[first:last])
+        return joined[start - starts[first]:end - starts[first]]
+
+    def _find_end(self, block_ends, block_firsts, end: int):
+        """
+            The index of the token ending exactly at `end`, or None.
+        """
+        block_index = bisect_left(block_ends, end)
+        if block_index == len(self.blocks):
+            return None
+        block = self.blocks[block_index]
+        relative = end - self.offsets[block_index]
+        index = bisect_left(block, relative, key=_end)
+        if index < len(block) and block[index][2] == relative:
+            return block_firsts[block_index] + index
+        return None
+
+    def edit(self, start: int, end: int, new_text: str):
+        """
+            Replace `text[start:end]` with `new_text` and update the tokens. If the new
+            text can not be lexed the document is left unchanged and the error raised.
+
+            Returns
+            -------
+                `(first, old_stop, new_tokens)`: the tokens `first` to `old_stop` were
+                replaced by `new_tokens`, `(token, start, end)` triples with absolute offsets
+        """
+        if not 0 <= start <= end <= self.length:
+            raise ValueError(f"Edit {start}:{end} is outside of the text")
+
+        delta = len(new_text) - (end - start)
+        edit_end = start + len(new_text)
+        length = self.length + delta
+
+        # The edited text, only the pieces around the edit are rebuilt
+        first_piece = max(bisect_right(self.piece_starts, start) - 1, 0)
+        last_piece = max(bisect_right(self.piece_starts, end) - 1, first_piece) + 1
+        base = self.piece_starts[first_piece] if self.pieces else 0
+        joined = "".join(self.pieces[first_piece:last_piece])
+        new_pieces = _split(joined[:start - base] + new_text + joined[end - base:], self.piece_size)
+
+        pieces = self.pieces[:first_piece] + new_pieces + self.pieces[last_piece:]
+        starts = self.piece_starts[:first_piece] + _starts(map(len, new_pieces), base)
+        starts.extend(piece_start + delta for piece_start in self.piece_starts[last_piece:])
+
+        block_ends = [offset + block[-1][2] for block, offset in zip(self.blocks, self.offsets)]
+        block_firsts = _starts(map(len, self.blocks))
+        count = block_firsts[-1] + len(self.blocks[-1]) if self.blocks else 0
+
+        # Tokens ending well before the edit can not have seen it, even through lookahead
+        restart = start - self.margin
+        block_index = bisect_right(block_ends, restart)
+        first = block_firsts[block_index] if block_index < len(self.blocks) else count
+        if block_index < len(self.blocks):
+            first += bisect_right(self.blocks[block_index], restart - self.offsets[block_index], key=_end)
+
+        if first == 0:
+            position = 0
+        else:
+            previous = bisect_right(block_firsts, first - 1) - 1
+            position = self.offsets[previous] + self.blocks[previous][first - 1 - block_firsts[previous]][2]
+
+        # Lex a window of the new text, trusting only tokens that end far enough from
+        # its end that more text could not change them. Grow it until the tokens line up.
+        relexed = []
+        old_stop = None
+        window = max(4 * (len(new_text) + self.margin), self.piece_size)
+        while old_stop is None:
+            window_end = min(position + window, length)
+            at_end = window_end == length
+            limit = window_end if at_end else window_end - self.margin
+
+            try:
+                for token, token_start, token_end in self.lexer.scan(self._read(pieces, starts, position, window_end)):
+                    token_end += position
+                    if token_end > limit:
+                        break
+                    relexed.append((token, token_start + position, token_end))
+                    if token_end < edit_end:
+                        continue
+
+                    # Past the edit, lined up with an old token boundary: the rest is unchanged
+                    index = self._find_end(block_ends, block_firsts, token_end - delta)
+                    if index is not None and index >= first:
+                        old_stop = index + 1
+                        break
+            except (ValueError, SyntaxError):
+                # Possibly a token cut off by the end of the window
+                if at_end:
+                    raise
+
+            if old_stop is None:
+                if at_end:
+                    old_stop = count
+                    break
+                if relexed:
+                    position = relexed[-1][2]
+                window *= 2
+
+        # Commit: the text, then the blocks around the changed tokens
+        self.pieces = pieces
+        self.piece_starts = starts
+        self.length = length
+
+        if not self.blocks:
+            self._store(0, 0, relexed)
+            return first, old_stop, relexed
+
+        first_block = min(bisect_right(block_firsts, first) - 1, len(self.blocks) - 1)
+        last_block = max(min(bisect_right(block_firsts, old_stop - 1) - 1, len(self.blocks) - 1), first_block)
+
+        head_offset = self.offsets[first_block]
+        head = self.blocks[first_block][:first - block_firsts[first_block]]
+        tail_offset = self.offsets[last_block] + delta
+        tail = self.blocks[last_block][max(old_stop - block_firsts[last_block], 0):]
+
+        spans = [(token, token_start + head_offset, token_end + head_offset) for token, token_start, token_end in head]
+        spans.extend(relexed)
+        spans.extend((token, token_start + tail_offset, token_end + tail_offset) for token, token_start, token_end in tail)
+
+        stored = self._store(first_block, last_block + 1, spans)
+        if delta:
+            offsets = self.offsets
+            for index in range(first_block + stored, len(offsets)):
+                offsets[index] += delta
+
+        return first, old_stop, relexed
@@ -0,0 +1,56 @@
+LANGUAGES = {
+    "python": "parsall.semantics.python",
+    "cpp": "parsall.semantics.cpp",
+}
+"""Language name -> module of its pack. A pack has a `rules()` function and an `ignore` string."""
+
+# Only what get_lexer needs is imported, and only when it is called, to keep start up short
+
+# Lexers built in this process, by (language, compiled)
+_lexers = {}
+
+
+def register_language(name: str, module: str):
+    """
+        Make a language pack available to `get_lexer`. Nothing is imported until it is used.
+
+        Args:
+            name: The name to ask `get_lexer` for.
+            module: Dotted path of a module with a `rules()` function and an `ignore` string.
+    """
+    LANGUAGES[name] = module
+    for key in [key for key in _lexers if key[0] == name]:
+        del _lexers[key]
+
+
+def _build(language: str, compiled: bool):
+    import importlib
+    from parsall.lexing import DefaultLexer
+
+    pack = importlib.import_module(LANGUAGES[language])
+    return DefaultLexer(pack.rules(), pack.ignore, compiled=compiled)
+
+
+def get_lexer(language: str, *, compiled=True):
+    """
+        The lexer for a registered language, built the first time it is asked for in
+        this process and shared after that.
+
+        The lexer is shared, so do not change its attributes. Build a `DefaultLexer`
+        from `pack.rules()` for anything custom (profiling, a token cache...).
+
+        Raises
+        ------
+            KeyError: The language is not registered
+    """
+    key = (language, compiled)
+    lexer = _lexers.get(key)
+    if lexer is not None:
+        return lexer
+
+    if language not in LANGUAGES:
+        raise KeyError(f"No language pack registered for {language!r}, known: {', '.join(sorted(LANGUAGES))}")
+
+    lexer = _build(language, compiled)
+    _lexers[key] = lexer
+    return lexer
@@ -1,27 +1,326 @@
-from parsall.core.Streams import CharacterStream
+from itertools import accumulate, islice
+from parsall.core.Streams import CharacterStream, BufferedCharacterStream
+from parsall.core.charclass import compile_ignore
+from parsall.core.rule import dispatch_first_set
+
+
+def read_chunks(source, chunk_size=65536):
+    """
+        Turn a string, a file object or an iterable of strings into an iterator of chunks.
+    """
+    if isinstance(source, str):
+        yield source
+        return
+
+    read = getattr(source, "read", None)
+    if read is not None:
+        while chunk := read(chunk_size):
+            yield chunk
+        return
+
+    yield from source
+
 
 class DefaultLexer:
-    def __init__(self, syntax_rules, ignore=" \t\n"):
+    def __init__(self, syntax_rules, ignore=" \t\n", *, compiled=False, profile=False, cache=None, recover=False):
+        """
+            Args:
+                syntax_rules: The rules to try, in priority order.
+                ignore: Characters skipped between tokens.
+                compiled: Fuse the built-in rules into a master regex. Custom rules
+                    are still called as normal and the tokens produced are identical.
+                profile: Record per rule statistics in `self.profiler`. Profiling
+                    always runs the rules one at a time, `compiled` is ignored.
+                cache: A `parsall.cache.TokenCache` to look `tokenise` results up in.
+                    A lexer with `recover` does not use it, diagnostics are not cached.
+                recover: Turn text no rule matches into `("Error", text)` tokens and carry
+                    on, recording a `parsall.recovery.Diagnostic` for each in
+                    `self.diagnostics`. Applies to `tokenise` and `tokenise_buffer`,
+                    `scan` and the streaming APIs still raise.
+        """
         self.syntax_rules = syntax_rules
         self.ignore = ignore
+        self.compiled = None
+        self.profiler = None
+        self.cache = cache
+        self.recover = recover
+        self.diagnostics = []
+        self._fingerprint = None
+        self.skip = compile_ignore(ignore)
+
+        # The rules actually tried by the interpreted loop
+        self.rules = syntax_rules
+
+        if profile:
+            from parsall.profiling import LexerProfiler
+            self.profiler = LexerProfiler(syntax_rules)
+            self.rules = self.profiler.rules
+        elif compiled:
+            from parsall.core.compiler import CompiledTokeniser
+            self.compiled = CompiledTokeniser(syntax_rules, ignore)
+
+        # Which rules can start on a given character, in priority order. ASCII is
+        # filled in up front, anything else the first time it is seen.
+        self.first_sets = [dispatch_first_set(rule) for rule in self.rules]
+        self.dispatch = {}
+        for code in range(128):
+            self.candidates(chr(code))
+
+    def candidates(self, character):
+        """
+            The `(index, rule)` pairs worth trying when the next character is `character`.
+        """
+        candidates = self.dispatch.get(character)
+        if candidates is None:
+            candidates = [
+                (index, rule) for index, (rule, first_set) in enumerate(zip(self.rules, self.first_sets))
+                if first_set is None or character in first_set
+            ]
+            self.dispatch[character] = candidates
+        return candidates
+
+    @property
+    def fingerprint(self) -> str:
+        """
+            A hash of `syntax_rules` and `ignore`, the same for identically configured
+            lexers in any process. Worked out on first use.
+        """
+        if self._fingerprint is None:
+            from parsall.cache import fingerprint
+            self._fingerprint = fingerprint(self.syntax_rules, self.ignore)
+        return self._fingerprint
+
+    def __getstate__(self):
+        # The compiled tables hold closures, rebuild them rather than pickling.
+        # The cache stays with this process.
+        return {
+            "syntax_rules": self.syntax_rules,
+            "ignore": self.ignore,
+            "compiled": self.compiled is not None,
+            "profile": self.profiler is not None,
+            "recover": self.recover,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(
+            state["syntax_rules"], state["ignore"], compiled=state["compiled"],
+            profile=state.get("profile", False), recover=state.get("recover", False)
+        )
 
     def tokenise(self, input_text):
+        if self.recover:
+            return [token for token, _, _ in self._recover_scan(input_text)]
+        if self.cache is not None:
+            return self.cache.tokenise(self, input_text)
+        return self._tokenise(input_text)
+
+    def _tokenise(self, input_text):
+        if self.compiled is not None:
+            return self.compiled.tokenise(input_text)
+
         # Create a CharacterStream object from the input text
+        return [token for token, _, _ in self._scan(CharacterStream(input_text))]
+
+    def tokenise_many(self, inputs, batch_size=4096):
+        """
+            Tokenise many small inputs (expressions, config lines...), giving the same
+            token lists as calling `tokenise` on each.
+
+            Inputs are joined in batches of `batch_size` and scanned in one loop, with
+            the stream ended at each input's end so no token runs across two inputs.
+            This saves setting up a scan per input: on one-line inputs the interpreted
+            lexer takes 10-25% less time, the compiled one spends nearly all its time
+            matching and gains little.
+            Custom rules must read through the stream (`peek`, `lookahead`, `match`...)
+            rather than `char_stream.items` for this to hold.
+
+            A lexer with `recover` or a `cache` tokenises the inputs one at a time,
+            `diagnostics` then only covers the last input.
+
+            Args:
+                inputs: Any iterable of strings.
+                batch_size: How many inputs to join and scan at once.
+
+            Returns
+            -------
+                A token list for each input, in order
+        """
+        results = []
+        inputs = iter(inputs)
+        while batch := list(islice(inputs, batch_size)):
+            if self.recover or self.cache is not None:
+                results.extend(self.tokenise(input_text) for input_text in batch)
+                continue
+
+            joined = "".join(batch)
+            ends = accumulate(map(len, batch))
+            if self.compiled is not None:
+                results.extend(self.compiled.tokenise_many(joined, ends))
+            else:
+                results.extend(self._tokenise_many(joined, ends))
+        return results
+
+    def _tokenise_many(self, input_text, ends):
         char_stream = CharacterStream(input_text)
+        skip = self.skip.match
+        match = self._match
+        results = []
 
-        # Start parsing the tokens using the syntax rules
-        parsed_text = []
-        while char_stream.peek() is not None:
-            while char_stream.peek() in self.ignore:
-                char_stream.pop()
-
-            for rule in self.syntax_rules:
-                match = rule.match(char_stream)
-                if match is not None:
-                    parsed_text.append(match)
+        for end in ends:
+            # The rules must not see past this input
+            char_stream.length = end
+            tokens = []
+
+            while True:
+                char_stream.position = skip(input_text, char_stream.position, end).end()
+                if char_stream.position >= end:
                     break
-            else:
+
+                token, _ = match(char_stream)
+                if token is None:
+                    # If no rule matches, raise an error
+                    raise ValueError("Syntax error in input text: " + char_stream.peek())
+                tokens.append(token)
+
+            results.append(tokens)
+            char_stream.position = end
+
+        return results
+
+    def scan(self, input_text, start=0):
+        """
+            Tokenise `input_text` from offset `start`, yielding `(token, start, end)`
+            where `input_text[start:end]` is the text each token was lexed from.
+        """
+        if self.compiled is not None:
+            return self.compiled.scan(input_text, start)
+
+        char_stream = CharacterStream(input_text)
+        char_stream.position = start
+        return self._scan(char_stream)
+
+    def tokenise_buffer(self, input_text):
+        """
+            Tokenise `input_text` into a compact `TokenBuffer` holding token kinds
+            and source offsets rather than one tuple per token.
+        """
+        from parsall.core.tokens import TokenBuffer
+        scan = self._recover_scan(input_text) if self.recover else self.scan(input_text)
+        return TokenBuffer.from_scan(input_text, scan)
+
+    def tokenise_file(self, path):
+        """
+            Tokenise a UTF-8 (or ASCII) file through a memory map, without reading or
+            decoding it up front. Token text is decoded from the map when accessed.
+
+            Returns
+            -------
+                A `TokenBuffer` over the mapped file, with byte offsets. The buffer owns
+                the map, `close()` it (or use it in a `with` block) when done.
+        """
+        import os
+        from parsall.core.Streams import MappedStream
+        from parsall.core.tokens import TokenBuffer
+
+        # An empty file can not be mapped, and has no tokens anyway
+        if os.path.getsize(path) == 0:
+            return TokenBuffer(b"")
+
+        # The byte scanner lives in the compiled backend, it gives the same tokens
+        compiled = self.compiled
+        if compiled is None:
+            from parsall.core.compiler import CompiledTokeniser
+            compiled = CompiledTokeniser(self.syntax_rules, self.ignore)
+
+        stream = MappedStream(path)
+        buffer = TokenBuffer(stream.items)
+        try:
+            for kind, start, end, value in compiled.scan_bytes(stream.items):
+                buffer.add(kind, start, end, value)
+        except BaseException:
+            stream.close()
+            raise
+        return buffer
+
+    def _recover_scan(self, input_text):
+        # Diagnostics are for the latest input only
+        from parsall.recovery import recover_scan
+        self.diagnostics = []
+        return recover_scan(self, input_text, 0, self.diagnostics)
+
+    def iter_tokens(self, source, chunk_size=65536):
+        """
+            Lazily tokenise a file object or an iterable of text chunks.
+
+            Only the unconsumed part of the input is kept in memory, tokens
+            may span chunk boundaries.
+        """
+        char_stream = BufferedCharacterStream(read_chunks(source, chunk_size))
+
+        if self.compiled is not None:
+            return self.compiled.iter_tokens(char_stream)
+
+        return (token for token, _, _ in self._scan(char_stream, release=True))
+
+    def atokenise(self, source, **options):
+        """
+            Tokenise an `asyncio.StreamReader` or async iterable of chunks with `async for`,
+            handing control back to the event loop as it goes. See `parsall.aio.atokenise`
+            for the options.
+        """
+        from parsall.aio import atokenise
+        return atokenise(self, source, **options)
+
+    def _match(self, char_stream):
+        """
+            Try the rules that can start on the next character, in priority order.
+
+            Returns
+            -------
+                `(token, start)`, or `(None, None)` if no rule matched
+        """
+        candidates = self.dispatch.get(char_stream.peek())
+        if candidates is None:
+            candidates = self.candidates(char_stream.peek())
+
+        for index, rule in candidates:
+            start = char_stream.position
+            match = rule.match(char_stream)
+            if match is not None:
+                return match, start
+
+            if char_stream.position != start:
+                # The rule consumed input without producing a token (IgnoreRule), the
+                # rest of the rules see a different character so try them all in order
+                for rule in self.rules[index + 1:]:
+                    start = char_stream.position
+                    match = rule.match(char_stream)
+                    if match is not None:
+                        return match, start
+                break
+
+        return None, None
+
+    def _scan(self, char_stream, release=False):
+        skip = self.skip
+
+        # Start parsing the tokens using the syntax rules
+        while True:
+            # Skip the whole run of ignored characters in one go
+            m = char_stream.match(skip)
+            char_stream.advance(m.end() - m.start())
+
+            # Trailing ignored characters, nothing left to match
+            if char_stream.peek() is None:
+                break
+
+            match, start = self._match(char_stream)
+            if match is None:
                 # If no rule matches, raise an error
                 raise ValueError("Syntax error in input text: " + char_stream.peek())
 
-        return parsed_text
\ No newline at end of file
+            offset = char_stream.offset
+            yield match, start + offset, char_stream.position + offset
+
+            if release:
+                char_stream.release()
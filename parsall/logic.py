@@ -0,0 +1,524 @@
+"""
+    Bit-parallel evaluation of boolean expressions, as parsed by `algebra.py`.
+
+    Expressions are trees of variable names (str), `('NOT', x)`, `('AND', [x, ...])`
+    and `('OR', x, y, ...)`, or `Node`s from a `NodeFactory`, which shares every
+    repeated subexpression. A truth table over `n` variables is held as one Python int
+    of `2 ** n` bits, bit `r` being the value for row `r`. Row `r` gives the first
+    variable the most significant bit of `r`, as in a written truth table.
+
+    Every operator is then a single big-int operation over all rows at once, which
+    makes 20+ variables practical where evaluating each assignment is not.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+VARIABLE, NOT, AND, OR, CONSTANT = range(5)
+
+
+class Node:
+    """
+        A shared expression node, only ever created by a `NodeFactory`. Two nodes of one
+        factory are the same object exactly when they are the same expression (up to the
+        order and repetition of `AND`/`OR` operands), so `is` compares expressions.
+
+        `op` is one of `"VAR"`, `"CONST"`, `"NOT"`, `"AND"`, `"OR"`.
+    """
+    __slots__ = ("op", "children", "value", "id")
+
+    def __init__(self, op: str, children: Tuple["Node", ...], value, id: int):
+        self.op = op
+        self.children = children
+        self.value = value
+        """The variable name for `VAR`, True or False for `CONST`."""
+        self.id = id
+
+    def __repr__(self):
+        if self.op == "VAR":
+            return str(self.value)
+        if self.op == "CONST":
+            return "1" if self.value else "0"
+        if self.op == "NOT":
+            child = self.children[0]
+            return (repr(child) if child.op == "VAR" else f"({child!r})") + "'"
+        if self.op == "AND":
+            return "".join(f"({child!r})" if child.op == "OR" else repr(child) for child in self.children)
+        return "+".join(repr(child) for child in self.children)
+
+
+def _variable_name(node):
+    if isinstance(node, str):
+        return node
+    if isinstance(node, Node) and node.op == "VAR":
+        return node.value
+    return None
+
+
+def children(tree) -> Sequence:
+    """
+        The operands of an `AND`/`OR`/`NOT` tuple or `Node`.
+    """
+    if isinstance(tree, Node):
+        return tree.children
+    if tree[0] == "AND" and len(tree) == 2 and isinstance(tree[1], list):
+        return tree[1]
+    return tree[1:]
+
+
+def variables(tree) -> List[str]:
+    """
+        The variables of an expression, sorted.
+    """
+    found = set()
+    seen = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        name = _variable_name(node)
+        if name is not None:
+            found.add(name)
+        elif id(node) not in seen:
+            # Shared subexpressions are only walked once
+            seen.add(id(node))
+            stack.extend(children(node))
+    return sorted(found)
+
+
+def column(index: int, count: int) -> int:
+    """
+        The truth table column of variable `index` out of `count`: bit `r` is set when
+        the variable is true in row `r`.
+    """
+    block = 1 << (count - 1 - index)
+    # One period is `block` rows false then `block` rows true, doubled up to 2 ** count rows
+    mask = ((1 << block) - 1) << block
+    width = block * 2
+    rows = 1 << count
+    while width < rows:
+        mask |= mask << width
+        width *= 2
+    return mask
+
+
+class CompiledExpression:
+    """
+        An expression flattened once into a list of instructions over numbered slots,
+        identical subexpressions sharing a slot.
+
+            expression = CompiledExpression(tree)
+            table = expression.truth_table()
+            table.minterms()
+    """
+
+    def __init__(self, tree, variable_names: List[str] = None):
+        self.variables = list(variable_names) if variable_names is not None else variables(tree)
+        self.variable_index = {name: index for index, name in enumerate(self.variables)}
+        self.program: List[Tuple] = []
+        """`(opcode, operand)` per slot, operands are slot numbers (a variable index for `VARIABLE`)."""
+        self._slots = {}
+        self.root = self._compile(tree)
+
+    def _emit(self, instruction: Tuple) -> int:
+        slot = self._slots.get(instruction)
+        if slot is None:
+            slot = self._slots[instruction] = len(self.program)
+            self.program.append(instruction)
+        return slot
+
+    def _compile(self, tree) -> int:
+        # Post-order without recursion, deep chains of NOTs are common in generated input
+        done = {}
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in done:
+                # A shared subexpression, already compiled
+                continue
+
+            name = _variable_name(node)
+            if name is not None:
+                if name not in self.variable_index:
+                    raise ValueError(f"Unknown variable {name!r}")
+                done[id(node)] = self._emit((VARIABLE, self.variable_index[name]))
+                continue
+
+            operands = children(node)
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in operands)
+                continue
+
+            slots = tuple(done[id(operand)] for operand in operands)
+            op = node.op if isinstance(node, Node) else node[0]
+            if op == "CONST":
+                slot = self._emit((CONSTANT, node.value))
+            elif op == "NOT":
+                if len(slots) != 1:
+                    raise ValueError(f"NOT takes one operand, not {len(slots)}")
+                slot = self._emit((NOT, slots[0]))
+            elif op in ("AND", "OR"):
+                if not slots:
+                    # An empty AND is true, an empty OR false
+                    slot = self._emit((CONSTANT, op == "AND"))
+                elif len(slots) == 1:
+                    slot = slots[0]
+                else:
+                    slot = self._emit((AND if op == "AND" else OR, tuple(sorted(set(slots)))))
+            else:
+                raise ValueError(f"Unknown operator {op!r}")
+            done[id(node)] = slot
+
+        return done[id(tree)]
+
+    def truth_table(self) -> "TruthTable":
+        """
+            Evaluate every assignment at once.
+        """
+        count = len(self.variables)
+        rows = 1 << count
+        ones = (1 << rows) - 1
+
+        values = []
+        for opcode, operand in self.program:
+            if opcode == VARIABLE:
+                value = column(operand, count)
+            elif opcode == NOT:
+                value = values[operand] ^ ones
+            elif opcode == AND:
+                value = ones
+                for slot in operand:
+                    value &= values[slot]
+            elif opcode == OR:
+                value = 0
+                for slot in operand:
+                    value |= values[slot]
+            else:
+                value = ones if operand else 0
+            values.append(value)
+
+        return TruthTable(self.variables, values[self.root])
+
+    def evaluate(self, assignment: Dict[str, bool]) -> bool:
+        """
+            The value for a single assignment of every variable.
+        """
+        values = []
+        for opcode, operand in self.program:
+            if opcode == VARIABLE:
+                value = bool(assignment[self.variables[operand]])
+            elif opcode == NOT:
+                value = not values[operand]
+            elif opcode == AND:
+                value = all(values[slot] for slot in operand)
+            elif opcode == OR:
+                value = any(values[slot] for slot in operand)
+            else:
+                value = operand
+            values.append(value)
+        return values[self.root]
+
+
+class TruthTable:
+    """
+        The value of an expression for every assignment of its variables, as a bitmask.
+    """
+
+    def __init__(self, variable_names: List[str], mask: int):
+        self.variables = variable_names
+        self.mask = mask
+        self.rows = 1 << len(variable_names)
+
+    def row(self, assignment: Dict[str, bool]) -> int:
+        row = 0
+        for name in self.variables:
+            row = (row << 1) | bool(assignment[name])
+        return row
+
+    def assignment(self, row: int) -> Dict[str, bool]:
+        count = len(self.variables)
+        return {name: bool(row >> (count - 1 - index) & 1) for index, name in enumerate(self.variables)}
+
+    def __getitem__(self, assignment: Dict[str, bool]) -> bool:
+        return bool(self.mask >> self.row(assignment) & 1)
+
+    def count(self) -> int:
+        """
+            How many assignments make the expression true.
+        """
+        return self.mask.bit_count()
+
+    def minterms(self) -> List[int]:
+        """
+            The rows where the expression is true, in order.
+        """
+        # Searching the binary text is done in C, one step per minterm rather than per row
+        bits = format(self.mask, "b")[::-1]
+        found = []
+        row = bits.find("1")
+        while row != -1:
+            found.append(row)
+            row = bits.find("1", row + 1)
+        return found
+
+    def is_tautology(self) -> bool:
+        return self.mask == (1 << self.rows) - 1
+
+    def is_satisfiable(self) -> bool:
+        return self.mask != 0
+
+    def __eq__(self, other):
+        if not isinstance(other, TruthTable):
+            return NotImplemented
+        return self.variables == other.variables and self.mask == other.mask
+
+    def __iter__(self):
+        """
+            Yield `(assignment, value)` for every row, only sensible for small tables.
+        """
+        for row in range(self.rows):
+            yield self.assignment(row), bool(self.mask >> row & 1)
+
+    def __repr__(self):
+        return f"TruthTable({len(self.variables)} variables, {self.count()} of {self.rows} rows true)"
+
+
+def truth_table(tree, variable_names: List[str] = None) -> TruthTable:
+    return CompiledExpression(tree, variable_names).truth_table()
+
+
+def equivalent(first, second) -> Tuple[bool, Dict[str, bool]]:
+    """
+        Check two expressions agree on every assignment of all their variables.
+
+        Returns
+        -------
+            `(True, None)`, or `(False, an assignment they differ on)`
+    """
+    names = sorted(set(variables(first)) | set(variables(second)))
+    difference = truth_table(first, names).mask ^ truth_table(second, names).mask
+    if not difference:
+        return True, None
+
+    lowest = (difference & -difference).bit_length() - 1
+    return False, TruthTable(names, 0).assignment(lowest)
+
+
+def postorder(root: Node, known=()):
+    """
+        Yield every distinct node below `root` once, children before their parents.
+        Nodes whose id is in `known` are skipped along with everything below them.
+    """
+    seen = set()
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if node.id in seen or node.id in known:
+            continue
+        if expanded or not node.children:
+            seen.add(node.id)
+            yield node
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+
+
+class NodeFactory:
+    """
+        Builds expressions as a DAG: a unique table maps `(op, operand ids)` to the one
+        node for it, so a repeated subexpression is stored (and analysed) once however
+        often it occurs. Memory grows with the number of distinct subexpressions.
+
+        `AND`/`OR` operands are sorted and deduplicated, and a single operand stands
+        for itself, so `AB`, `BA` and `ABA` are all one node.
+
+        Analyses (`variables`, `simplify`) are remembered per node. `stats()` reports
+        how often the unique table and the analysis caches were hit.
+    """
+
+    def __init__(self):
+        self.table = {}
+        self.nodes: List[Node] = []
+        self.hits = 0
+        self.misses = 0
+
+        self._variables = {}
+        self._simplified = {}
+        self.analysis_hits = {"variables": 0, "simplify": 0}
+        self.analysis_misses = {"variables": 0, "simplify": 0}
+
+    def _make(self, op: str, operands: Tuple[Node, ...] = (), value=None) -> Node:
+        key = (op, value, tuple(operand.id for operand in operands))
+        node = self.table.get(key)
+        if node is not None:
+            self.hits += 1
+            return node
+
+        self.misses += 1
+        node = self.table[key] = Node(op, operands, value, len(self.nodes))
+        self.nodes.append(node)
+        return node
+
+    def variable(self, name: str) -> Node:
+        return self._make("VAR", value=name)
+
+    def constant(self, value: bool) -> Node:
+        return self._make("CONST", value=bool(value))
+
+    def negate(self, operand: Node) -> Node:
+        return self._make("NOT", (operand,))
+
+    def conjunction(self, operands) -> Node:
+        return self._associative("AND", operands)
+
+    def disjunction(self, operands) -> Node:
+        return self._associative("OR", operands)
+
+    def _associative(self, op: str, operands) -> Node:
+        unique = {operand.id: operand for operand in operands}
+        if not unique:
+            # An empty AND is true, an empty OR false
+            return self.constant(op == "AND")
+        if len(unique) == 1:
+            return next(iter(unique.values()))
+        return self._make(op, tuple(unique[key] for key in sorted(unique)))
+
+    def build(self, tree) -> Node:
+        """
+            Share an `algebra.py` style tuple tree.
+        """
+        built = {}
+        stack = [(tree, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in built:
+                continue
+            if isinstance(node, str):
+                built[id(node)] = self.variable(node)
+                continue
+
+            operands = children(node)
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in operands)
+                continue
+
+            shared = [built[id(operand)] for operand in operands]
+            if node[0] == "NOT":
+                built[id(node)] = self.negate(shared[0])
+            elif node[0] == "AND":
+                built[id(node)] = self.conjunction(shared)
+            elif node[0] == "OR":
+                built[id(node)] = self.disjunction(shared)
+            else:
+                raise ValueError(f"Unknown operator {node[0]!r}")
+        return built[id(tree)]
+
+    def variables(self, root: Node) -> frozenset:
+        """
+            The variables `root` depends on.
+        """
+        cache = self._variables
+        if root.id in cache:
+            self.analysis_hits["variables"] += 1
+            return cache[root.id]
+
+        for node in postorder(root, cache):
+            self._count("variables", node, cache)
+            if node.op == "VAR":
+                cache[node.id] = frozenset((node.value,))
+            else:
+                cache[node.id] = frozenset().union(*(cache[child.id] for child in node.children))
+        return cache[root.id]
+
+    def evaluate(self, root: Node, assignment: Dict[str, bool]) -> bool:
+        """
+            The value for one assignment, each shared node is evaluated once.
+        """
+        values = {}
+        for node in postorder(root):
+            if node.op == "VAR":
+                value = bool(assignment[node.value])
+            elif node.op == "CONST":
+                value = node.value
+            elif node.op == "NOT":
+                value = not values[node.children[0].id]
+            elif node.op == "AND":
+                value = all(values[child.id] for child in node.children)
+            else:
+                value = any(values[child.id] for child in node.children)
+            values[node.id] = value
+        return values[root.id]
+
+    def truth_table(self, root: Node, variable_names: List[str] = None) -> TruthTable:
+        if variable_names is None:
+            variable_names = sorted(self.variables(root))
+        return CompiledExpression(root, variable_names).truth_table()
+
+    def simplify(self, root: Node) -> Node:
+        """
+            An equivalent, usually smaller, node: constants are folded, double negations
+            removed, nested `AND`s and `OR`s flattened, `x x'` becomes 0 and `x + x'` 1,
+            and absorption applied (`x(x + y)` is `x`, `x + xy` is `x`).
+        """
+        cache = self._simplified
+        if root.id in cache:
+            self.analysis_hits["simplify"] += 1
+            return cache[root.id]
+
+        for node in postorder(root, cache):
+            self._count("simplify", node, cache)
+            cache[node.id] = self._simplify_node(node, [cache[child.id] for child in node.children])
+        return cache[root.id]
+
+    def _count(self, analysis: str, node: Node, cache: dict):
+        # Each operand's result is looked up in the cache rather than worked out again
+        self.analysis_misses[analysis] += 1
+        self.analysis_hits[analysis] += sum(1 for child in node.children if child.id in cache)
+
+    def _simplify_node(self, node: Node, operands: List[Node]) -> Node:
+        if node.op in ("VAR", "CONST"):
+            return node
+
+        if node.op == "NOT":
+            operand = operands[0]
+            if operand.op == "CONST":
+                return self.constant(not operand.value)
+            if operand.op == "NOT":
+                return operand.children[0]
+            return self.negate(operand)
+
+        # AND: 0 absorbs everything and 1 drops out, the other way round for OR
+        absorbing = node.op == "OR"
+        flat = {}
+        for operand in operands:
+            if operand.op == node.op:
+                flat.update((child.id, child) for child in operand.children)
+            elif operand.op == "CONST":
+                if operand.value == absorbing:
+                    return operand
+            else:
+                flat[operand.id] = operand
+
+        # x x' = 0 and x + x' = 1
+        for operand in flat.values():
+            if operand.op == "NOT" and operand.children[0].id in flat:
+                return self.constant(absorbing)
+
+        # Absorption: x(x + y) = x and x + xy = x
+        dual = "AND" if node.op == "OR" else "OR"
+        kept = [
+            operand for operand in flat.values()
+            if not (operand.op == dual and any(child.id in flat for child in operand.children))
+        ]
+
+        return self._associative(node.op, kept)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "nodes": len(self.nodes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "analysis_hits": dict(self.analysis_hits),
+            "analysis_misses": dict(self.analysis_misses),
+        }
@@ -0,0 +1,198 @@
+import os
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from parsall.core.compiler import compile_ignore
+from parsall.lexing import DefaultLexer
+
+# Each worker process gets its own copy of the lexer once, through the pool initializer
+_worker_lexer: DefaultLexer = None
+
+
+def _init_worker(lexer: DefaultLexer):
+    global _worker_lexer
+    _worker_lexer = lexer
+
+
+def _scan(lexer: DefaultLexer, text: str, start=0):
+    # `lexer.scan`, with error tokens instead of exceptions for a lexer with `recover`
+    if lexer.recover:
+        from parsall.recovery import recover_scan
+        return recover_scan(lexer, text, start)
+    return lexer.scan(text, start)
+
+
+def _lex_file(path, encoding, spans):
+    with open(path, 'r', encoding=encoding) as file:
+        text = file.read()
+
+    if spans:
+        return list(_scan(_worker_lexer, text))
+    return _worker_lexer.tokenise(text)
+
+
+def _lex_chunk(text, offset, is_last, margin):
+    """
+        Lex one speculative chunk of a larger input.
+
+        Returns
+        -------
+            `(tokens, keys, trusted, complete)`. `tokens` are `(token, start, end)` with
+            absolute offsets, `keys[i]` is where the lexer resumes (after ignored characters)
+            before token `i`, only the first `trusted` tokens are known not to depend on
+            text past the end of the chunk and `complete` is False if lexing raised.
+    """
+    skip = compile_ignore(_worker_lexer.ignore).match
+    length = len(text)
+
+    tokens = []
+    keys = [skip(text, 0).end() + offset]
+    complete = True
+    try:
+        # Plain scan even with `recover`, the parent lexes around errors itself
+        for token, start, end in _worker_lexer.scan(text):
+            tokens.append((token, start + offset, end + offset))
+            keys.append(skip(text, end).end() + offset)
+    except Exception:
+        # Most likely a token cut off by the end of the chunk. A genuine error is
+        # raised again when the parent lexes this stretch itself.
+        complete = False
+
+    if is_last:
+        trusted = len(tokens)
+    else:
+        limit = offset + length - margin
+        trusted = bisect_right(keys, limit, 1) - 1
+
+    return tokens, keys, trusted, complete
+
+
+def split_points(text: str, chunk_size: int):
+    """
+        Candidate offsets to split `text` at, each just after a newline. These are only
+        guesses, chunks are checked against each other when the results are merged.
+    """
+    points = [0]
+    while (index := text.find("\n", points[-1] + chunk_size)) != -1 and index + 1 < len(text):
+        points.append(index + 1)
+    return points
+
+
+def _merge(lexer: DefaultLexer, text: str, starts, chunks):
+    """
+        Stitch chunk results together into exactly the sequential token list.
+
+        Chunk `k + 1` takes over as soon as the lexer resumes at a position chunk
+        `k + 1` also resumed at. Where no chunk can be trusted (a token straddled a
+        split point by more than the overlap) the parent lexes the gap itself.
+    """
+    skip = compile_ignore(lexer.ignore).match
+    result = []
+
+    k = 0
+    tokens, keys, trusted, complete = chunks[0]
+    pos = skip(text, 0).end()
+    i = 0 if keys[0] == pos else trusted
+    fallback = None
+
+    while True:
+        # Switch to a later chunk once we resume somewhere it resumed too
+        if k + 1 < len(chunks) and pos >= starts[k + 1]:
+            for j in range(bisect_right(starts, pos) - 1, k, -1):
+                next_keys = chunks[j][1]
+                index = bisect_left(next_keys, pos)
+                if index < len(next_keys) and next_keys[index] == pos and index <= chunks[j][2]:
+                    k = j
+                    tokens, keys, trusted, complete = chunks[k]
+                    i = index
+                    fallback = None
+                    break
+
+        if fallback is None and i < trusted:
+            result.append(tokens[i])
+            i += 1
+            pos = keys[i]
+            continue
+
+        if fallback is None and k == len(chunks) - 1 and i == len(tokens) and complete:
+            break
+
+        # Nothing trustworthy left in this chunk, lex sequentially until a chunk lines up
+        if fallback is None:
+            fallback = _scan(lexer, text, pos)
+            i = trusted
+
+        item = next(fallback, None)
+        if item is None:
+            break
+        result.append(item)
+        pos = skip(text, item[2]).end()
+
+    return result
+
+
+def parallel_tokenise(lexer: DefaultLexer, paths, *, max_workers=None, split_size=None,
+                      overlap=65536, margin=256, encoding='utf-8', spans=False):
+    """
+        Tokenise many files across a process pool.
+
+        Whole files are the unit of work. A file larger than `split_size` characters is
+        also split into chunks at newlines, lexed in parallel and merged back so the
+        tokens are identical to `lexer.tokenise`.
+
+        Args:
+            lexer: The lexer to use, it is pickled once into every worker.
+            paths: The files to read.
+            split_size: Chunk size used to split large files, None never splits.
+            overlap: How far each chunk is lexed past its end to find a common token boundary.
+            margin: How far past a token's end a rule may look ahead, tokens this close to
+                the end of a chunk are re-checked.
+            spans: Return `(token, start, end)` triples instead of tokens.
+
+        Returns
+        -------
+            A list with the tokens of each file, in the order of `paths`. A lexer with
+            `recover` gives error tokens as `tokenise` does, but leaves `diagnostics` alone.
+    """
+    paths = list(paths)
+    results = [None] * len(paths)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(lexer,)) as pool:
+        pending = []
+        for index, path in enumerate(paths):
+            if split_size is not None and os.path.getsize(path) > split_size:
+                with open(path, 'r', encoding=encoding) as file:
+                    text = file.read()
+                pending.append((index, text, _submit_chunks(pool, text, split_size, overlap, margin)))
+            else:
+                results[index] = pool.submit(_lex_file, path, encoding, spans)
+
+        for index, text, (starts, futures) in pending:
+            merged = _merge(lexer, text, starts, [future.result() for future in futures])
+            results[index] = merged if spans else [token for token, _, _ in merged]
+
+        return [result if isinstance(result, list) else result.result() for result in results]
+
+
+def parallel_tokenise_text(lexer: DefaultLexer, text: str, *, max_workers=None, chunk_size=1 << 20,
+                           overlap=65536, margin=256, spans=False):
+    """
+        Tokenise one large string by splitting it at newlines across a process pool.
+        See `parallel_tokenise` for the arguments.
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(lexer,)) as pool:
+        starts, futures = _submit_chunks(pool, text, chunk_size, overlap, margin)
+        merged = _merge(lexer, text, starts, [future.result() for future in futures])
+
+    return merged if spans else [token for token, _, _ in merged]
+
+
+def _submit_chunks(pool, text, chunk_size, overlap, margin):
+    starts = split_points(text, chunk_size)
+    ends = starts[1:] + [len(text)]
+
+    futures = []
+    for start, end in zip(starts, ends):
+        end = min(end + overlap, len(text))
+        futures.append(pool.submit(_lex_chunk, text[start:end], start, end == len(text), margin))
+
+    return starts, futures
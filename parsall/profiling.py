@@ -0,0 +1,145 @@
+from time import perf_counter
+from typing import List
+from parsall.core.Streams import CharacterStream
+from parsall.core.rule import SyntaxRule, dispatch_first_set
+
+
+class ProfiledRule(SyntaxRule):
+    """
+        Wraps a rule and records how often it is tried, how often it matches,
+        how many characters it consumes and how long it takes.
+    """
+
+    def __init__(self, rule: SyntaxRule):
+        self.rule = rule
+        self.attempts = 0
+        self.matches = 0
+        self.characters = 0
+        self.seconds = 0.0
+        self.first_characters = {}
+        """How many matches started on each character."""
+
+    def match(self, char_stream: CharacterStream) -> str:
+        self.attempts += 1
+        position = char_stream.position
+        first_character = char_stream.peek()
+        start = perf_counter()
+
+        match = self.rule.match(char_stream)
+
+        self.seconds += perf_counter() - start
+        if match is not None:
+            self.matches += 1
+            self.characters += char_stream.position - position
+            self.first_characters[first_character] = self.first_characters.get(first_character, 0) + 1
+        return match
+
+    @property
+    def first_set(self):
+        return dispatch_first_set(self.rule)
+
+    @property
+    def name(self) -> str:
+        token_name = getattr(self.rule, "token_name", None)
+        return type(self.rule).__name__ + (f"({token_name!r})" if token_name else "")
+
+
+class LexerProfiler:
+    """
+        Per rule statistics for a `DefaultLexer` created with `profile=True`.
+
+        Only the profiled lexer pays for the bookkeeping: it runs the wrapped rules
+        through the interpreted path, a lexer without `profile` is untouched.
+    """
+
+    def __init__(self, syntax_rules: List[SyntaxRule]):
+        self.rules = [ProfiledRule(rule) for rule in syntax_rules]
+
+    def reset(self):
+        for rule in self.rules:
+            rule.attempts = rule.matches = rule.characters = 0
+            rule.seconds = 0.0
+            rule.first_characters = {}
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "rule": rule.name,
+                "index": index,
+                "attempts": rule.attempts,
+                "matches": rule.matches,
+                "failures": rule.attempts - rule.matches,
+                "characters": rule.characters,
+                "seconds": rule.seconds,
+            }
+            for index, rule in enumerate(self.rules)
+        ]
+
+    def suggested_order(self) -> List[SyntaxRule]:
+        """
+            The original rules sorted by how often they matched, most frequent first.
+
+            This is only safe to use where the rules do not compete for the same text,
+            reordering overlapping rules (keywords before identifiers...) changes the
+            tokens produced.
+        """
+        ranked = sorted(self.rules, key=lambda rule: rule.matches, reverse=True)
+        return [rule.rule for rule in ranked]
+
+    def estimated_attempts(self, order: List[SyntaxRule] = None) -> int:
+        """
+            How many rule attempts the recorded input would take with rules in `order`
+            (the current order by default), assuming every token is still matched by
+            the same rule.
+
+            The lexer only tries the rules whose first characters include the token's
+            first character, so a token costs one attempt for each such rule up to and
+            including the one that matches it.
+        """
+        if order is None:
+            order = [rule.rule for rule in self.rules]
+        first_sets = [dispatch_first_set(rule) for rule in order]
+        rank = {id(rule): position for position, rule in enumerate(order)}
+
+        attempts = 0
+        for rule in self.rules:
+            position = rank[id(rule.rule)]
+            for character, count in rule.first_characters.items():
+                tried = sum(
+                    1 for first_set in first_sets[:position + 1]
+                    if first_set is None or character in first_set
+                )
+                attempts += count * tried
+        return attempts
+
+    def suggestions(self) -> List[str]:
+        notes = []
+        for rule in self.rules:
+            if rule.attempts == 0:
+                notes.append(f"{rule.name} was never tried, none of its first characters came up without an earlier rule matching")
+            elif rule.matches == 0:
+                notes.append(f"{rule.name} never matched but was tried {rule.attempts} times")
+
+        current = self.estimated_attempts()
+        ordered = self.estimated_attempts(self.suggested_order())
+        if ordered < current:
+            names = ", ".join(ProfiledRule(rule).name for rule in self.suggested_order())
+            notes.append(
+                f"Ordering rules by hit frequency would take about {ordered} attempts instead of {current} "
+                f"(check overlapping rules keep their priority): {names}"
+            )
+        return notes
+
+    def report(self) -> str:
+        stats = self.stats()
+        total = sum(stat["seconds"] for stat in stats) or 1.0
+
+        lines = [f"{'rule':<32} {'attempts':>10} {'matches':>10} {'hit %':>7} {'chars':>10} {'time ms':>9} {'time %':>7}"]
+        for stat in stats:
+            hit_rate = stat["matches"] / stat["attempts"] if stat["attempts"] else 0.0
+            lines.append(
+                f"{stat['rule'][:32]:<32} {stat['attempts']:>10} {stat['matches']:>10} {hit_rate:>7.1%} "
+                f"{stat['characters']:>10} {stat['seconds'] * 1000:>9.2f} {stat['seconds'] / total:>7.1%}"
+            )
+        lines.extend(self.suggestions())
+        return "\n".join(lines)
@@ -0,0 +1,131 @@
+from array import array
+from typing import Dict, List, Tuple
+
+
+class TokenIndex:
+    """
+        Answers pattern queries over a token list without scanning it for each one.
+
+        A pattern is a sequence of `(kind, value)` elements matched against consecutive
+        tokens, a `None` value matches any value and a `None` kind any token:
+
+            index = TokenIndex(tokens)
+            index.find_all(("keyword", "def"), ("symbol", None), ("bracket", "("))
+
+        The first query builds an inverted index from each kind and each `(kind, value)`
+        to the positions it occurs at. A query starts from the element with the fewest
+        positions and only checks the other elements at the offsets it implies, so it
+        costs about as much as the rarest element's occurrences rather than the token count.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.by_kind: Dict = None
+        self.by_token: Dict = None
+
+    def build(self):
+        by_kind = {}
+        by_token = {}
+        for position, token in enumerate(self.tokens):
+            kind = token[0]
+            positions = by_kind.get(kind)
+            if positions is None:
+                positions = by_kind[kind] = array('I')
+            positions.append(position)
+
+            try:
+                positions = by_token.get(token)
+            except TypeError:
+                # Unhashable values are only indexed by kind
+                continue
+            if positions is None:
+                positions = by_token[token] = array('I')
+            positions.append(position)
+
+        self.by_kind = by_kind
+        self.by_token = by_token
+
+    def positions(self, element: Tuple):
+        """
+            Where a single element occurs, or None if it matches every token.
+        """
+        if self.by_kind is None:
+            self.build()
+
+        kind, value = element
+        if kind is None:
+            return None
+        if value is None:
+            return self.by_kind.get(kind, ())
+        try:
+            return self.by_token.get((kind, value), ())
+        except TypeError:
+            return None
+
+    def find_all(self, *pattern: Tuple) -> List[int]:
+        """
+            The start position of every occurrence of `pattern`, overlapping ones included.
+        """
+        if not pattern:
+            raise ValueError("An empty pattern matches nowhere")
+
+        tokens = self.tokens
+        last_start = len(tokens) - len(pattern)
+
+        # Drive the search from the rarest element
+        candidates = None
+        driver = None
+        for offset, element in enumerate(pattern):
+            positions = self.positions(element)
+            if positions is not None and (candidates is None or len(positions) < len(candidates)):
+                candidates = positions
+                driver = offset
+
+        if candidates is None:
+            starts = range(last_start + 1)
+        else:
+            starts = [position - driver for position in candidates if driver <= position <= last_start + driver]
+
+        checks = [(offset, kind, value) for offset, (kind, value) in enumerate(pattern) if offset != driver]
+        result = []
+        for start in starts:
+            for offset, kind, value in checks:
+                token = tokens[start + offset]
+                if (kind is not None and token[0] != kind) or (value is not None and token[1] != value):
+                    break
+            else:
+                result.append(start)
+        return result
+
+    def count(self, *pattern: Tuple) -> int:
+        return len(self.find_all(*pattern))
+
+    def find_many(self, patterns: List[Tuple]) -> Dict[Tuple, List[int]]:
+        """
+            Run several patterns in one pass over the tokens, with the automaton from
+            `parsall.grammar`. Worth it once there are many patterns of common tokens.
+
+            Returns
+            -------
+                The start positions of each pattern, keyed by the pattern
+        """
+        from parsall.grammar import Chain, MatchToken, MatchTokenID, Parser
+
+        def matcher(element):
+            kind, value = element
+            if kind is None:
+                raise ValueError("find_many needs a kind for every element, use find_all for wildcards")
+            return MatchTokenID(kind) if value is None else MatchToken(kind, value)
+
+        patterns = [tuple(pattern) for pattern in patterns]
+        chains = {}
+        for pattern in patterns:
+            if pattern not in chains:
+                chains[pattern] = Chain([matcher(element) for element in pattern])
+
+        found = {pattern: [] for pattern in chains}
+        pattern_of = {id(chain): pattern for pattern, chain in chains.items()}
+        for match in Parser(list(chains.values())).finditer(self.tokens):
+            found[pattern_of[id(match.rule)]].append(match.start)
+
+        return found
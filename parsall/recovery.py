@@ -0,0 +1,74 @@
+from typing import List
+from parsall.lexing import DefaultLexer
+
+# Kind of the token standing in for text no rule could lex
+ERROR = "Error"
+
+
+class Diagnostic:
+    """
+        A stretch of input that could not be lexed, `text[start:end]`.
+    """
+    __slots__ = ("start", "end", "message")
+
+    def __init__(self, start: int, end: int, message: str):
+        self.start = start
+        self.end = end
+        self.message = message
+
+    def __repr__(self):
+        return f"Diagnostic({self.start}:{self.end}, {self.message!r})"
+
+
+def _first_token_at(lexer: DefaultLexer, text: str, position: int):
+    """
+        Returns
+        -------
+            Where the next token would start lexing from `position`, or None if no rule
+            can lex there
+    """
+    try:
+        for _, start, _ in lexer.scan(text, position):
+            return start
+    except (ValueError, SyntaxError):
+        return None
+    # Only ignored characters are left
+    return len(text)
+
+
+def recover_scan(lexer: DefaultLexer, text: str, start: int = 0, diagnostics: List[Diagnostic] = None):
+    """
+        `lexer.scan`, except that input no rule matches (or a rule raises on, like an
+        unterminated string) becomes an `("Error", text)` token instead of an exception.
+
+        Lexing resumes at the next position where a rule matches. The error token covers
+        the skipped text up to there, less trailing ignored characters, and a `Diagnostic`
+        for it is appended to `diagnostics`.
+    """
+    skip = lexer.skip.match
+    ignored = "".join(c for c in lexer.ignore if len(c) == 1)
+    position = start
+
+    while True:
+        try:
+            for token, token_start, position in lexer.scan(text, position):
+                yield token, token_start, position
+            return
+        except (ValueError, SyntaxError) as error:
+            bad = skip(text, position).end()
+            message = str(error)
+
+        # Try every later position that is not ignored until a rule matches there
+        resume = None
+        candidate = bad + 1
+        while resume is None:
+            candidate = skip(text, candidate).end()
+            resume = _first_token_at(lexer, text, candidate)
+            candidate += 1
+
+        end = bad + len(text[bad:resume].rstrip(ignored))
+
+        if diagnostics is not None:
+            diagnostics.append(Diagnostic(bad, end, message))
+        yield (ERROR, text[bad:end]), bad, end
+        position = resume
@@ -101,4 +101,31 @@ bitwise_operators = ['<<', '>>', '&', '|']
 assignment_operators = ['=', '+=', '-=', '/=', '*=', '++', '--']
 index_operators = ['[', ']']
 string_delim = ['\"']
-special_characters = ['<', '>', ':']
\ No newline at end of file
+special_characters = ['<', '>', ':']
+
+
+ignore = " \t\r\n"
+
+
+def rules():
+    """
+        The rules for the `cpp` language pack, see `parsall.get_lexer`.
+
+        Preprocessor directives (`#include <vector>`) are lexed as a single `Comment`
+        token holding the rest of the line, they are not tokenised further.
+    """
+    from parsall.core.rule import CharacterSet, CommentRule, IdentifierRule, NumberRule, StringRule, WordSet
+    return [
+        # Comments go before the operators, which would otherwise take the `/`
+        CommentRule("//", '\n'),
+        CommentRule("/*", '*/'),
+        CommentRule("#", '\n'),
+        WordSet("keyword", keywords, word_boundary=True),
+        IdentifierRule(),
+        NumberRule(),
+        WordSet("operator", comparison_operators + assignment_operators + bitwise_operators),
+        CharacterSet("operator", "".join(math_operators + special_characters) + "!^~?"),
+        CharacterSet("scope", "".join(scope_modifiers + index_operators)),
+        CharacterSet("delim", ",.;"),
+        StringRule()
+    ]
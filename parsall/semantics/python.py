@@ -39,4 +39,25 @@ keywords = [
 ]
 
 standard_brackets = "[{()}]"
-standard_operators = "+/!+><=-&%@*^"
\ No newline at end of file
+standard_operators = "+/!+><=-&%@*^"
+
+
+ignore = " ;\t\r"
+
+
+def rules():
+    """
+        The rules for the `python` language pack, see `parsall.get_lexer`.
+    """
+    from parsall.core.rule import CharacterRule, CharacterSet, CommentRule, IdentifierRule, NumberRule, StringRule, WordSet
+    return [
+        WordSet("keyword", keywords, word_boundary=True),
+        IdentifierRule(),
+        NumberRule(),
+        CharacterSet("operator", standard_operators),
+        CharacterSet("bracket", standard_brackets),
+        CharacterSet("delim", ',.:'),
+        CharacterRule("newline", '\n'),
+        CommentRule("#", '\n'),
+        StringRule()
+    ]
@@ -0,0 +1,54 @@
+"""
+Lexing an async source must give the tokens (or the error) of lexing it all at once.
+"""
+import asyncio
+
+import pytest
+
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+
+async def _chunks(text, size, read):
+    for index in range(0, len(text), size):
+        read.append(index)
+        yield text[index:index + size]
+
+
+def _atokenise(lexer, text, size=64, **options):
+    read = []
+
+    async def collect():
+        return [token async for token in lexer.atokenise(_chunks(text, size, read), **options)]
+    return asyncio.run(collect()), read
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_tokens_across_chunks(compiled):
+    lexer = DefaultLexer(python.rules(), python.ignore, compiled=compiled)
+    # A string and a comment much longer than a chunk and the margin
+    text = "a = 'x" + "y" * 1000 + "'\n# " + "c" * 1000 + "\nb = 12345 + c\n" * 50
+    tokens, _ = _atokenise(lexer, text, margin=16)
+    assert tokens == lexer.tokenise(text)
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_early_error_is_raised_before_reading_on(compiled):
+    lexer = DefaultLexer(python.rules(), python.ignore, compiled=compiled)
+    text = "a = 1 + b ¬ c\n" + "x = 1\n" * 10000
+    with pytest.raises(ValueError):
+        lexer.tokenise(text)
+
+    read = []
+
+    async def collect():
+        return [token async for token in lexer.atokenise(_chunks(text, 64, read), margin=16)]
+    with pytest.raises(ValueError):
+        asyncio.run(collect())
+    assert len(read) == 1
+
+
+def test_error_at_the_end_is_raised():
+    lexer = DefaultLexer(python.rules(), python.ignore)
+    with pytest.raises((ValueError, SyntaxError)):
+        _atokenise(lexer, "a = 1\n" * 100 + "b = 'unterminated", margin=16)
@@ -0,0 +1,131 @@
+"""
+The token cache must hand back what the lexer gives, and miss whenever the lexer could give something else.
+"""
+import importlib
+import os
+import sys
+from fractions import Fraction
+
+import pytest
+
+from parsall.cache import TokenCache, fingerprint, token_size
+from parsall.core.rule import CharacterSet, IdentifierRule, NumberRule, SyntaxRule, WordSet
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+
+def _lexer(cache=None, **options):
+    return DefaultLexer(python.rules(), python.ignore, cache=cache, **options)
+
+
+class Constant(SyntaxRule):
+    def __init__(self, make):
+        self.make = make
+
+    def match(self, char_stream):
+        if char_stream.peek() == "$":
+            char_stream.advance()
+            return ("constant", self.make())
+        return None
+
+
+def _constant(value):
+    return Constant(lambda: value)
+
+
+def test_fingerprint_follows_the_configuration():
+    assert fingerprint(python.rules(), python.ignore) == fingerprint(python.rules(), python.ignore)
+    assert fingerprint(python.rules(), python.ignore) != fingerprint(python.rules(), " ")
+    assert fingerprint([WordSet("k", ["if"])], " ") != fingerprint([WordSet("k", ["in"])], " ")
+    assert fingerprint([CharacterSet("op", "+-"), NumberRule()], " ") != fingerprint([NumberRule(), CharacterSet("op", "+-")], " ")
+    # Functions are told apart by what they captured, not their shared lambda name
+    assert fingerprint([_constant(1)], " ") == fingerprint([_constant(1)], " ")
+    assert fingerprint([_constant(1)], " ") != fingerprint([_constant(2)], " ")
+
+
+def test_fingerprint_follows_the_rule_source(tmp_path, monkeypatch):
+    source = tmp_path / "custom_rules_for_cache.py"
+    source.write_text("from parsall.core.rule import IdentifierRule\nclass Custom(IdentifierRule):\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module("custom_rules_for_cache")
+    try:
+        before = fingerprint([module.Custom()], " ")
+        stat = os.stat(source)
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert fingerprint([module.Custom()], " ") != before
+    finally:
+        del sys.modules["custom_rules_for_cache"]
+
+
+def test_memory_hits_are_copies():
+    cache = TokenCache()
+    lexer = _lexer(cache)
+    tokens = lexer.tokenise("a = 1")
+    tokens.append("changed")
+    assert lexer.tokenise("a = 1") == _lexer().tokenise("a = 1")
+    assert cache.stats()["hits"] == 1 and cache.misses == 1
+
+
+def test_disk_round_trip(tmp_path):
+    text = "def f(x):\n    return x + 1.5 # 'c'\n"
+    first = TokenCache(tmp_path)
+    expected = _lexer(first).tokenise(text)
+    assert first.disk_writes == 1
+
+    # A new process would start with an empty memory tier
+    second = TokenCache(tmp_path)
+    assert _lexer(second).tokenise(text) == expected
+    assert second.disk_hits == 1 and second.misses == 0
+
+    # Another ignore set misses, the same rules in another lexer hit
+    DefaultLexer(python.rules(), " \n", cache=second).tokenise(text)
+    assert second.misses == 1
+    assert _lexer(second, compiled=True).tokenise(text) == expected
+
+
+def test_damaged_files_are_misses(tmp_path):
+    cache = TokenCache(tmp_path)
+    lexer = _lexer(cache)
+    expected = lexer.tokenise("a + b")
+    path = cache.path(cache.key("a + b", lexer.fingerprint))
+    with open(path, "r+b") as file:
+        file.truncate(10)
+
+    fresh = TokenCache(tmp_path)
+    assert _lexer(fresh).tokenise("a + b") == expected
+    assert fresh.misses == 1 and fresh.disk_hits == 0
+
+
+def test_custom_values_stay_in_memory(tmp_path):
+    cache = TokenCache(tmp_path)
+    lexer = DefaultLexer([Constant(lambda: Fraction(1, 3)), IdentifierRule()], cache=cache)
+    assert lexer.tokenise("$ a") == [("constant", Fraction(1, 3)), ("symbol", "a")]
+    assert cache.disk_writes == 0
+    assert lexer.tokenise("$ a") == [("constant", Fraction(1, 3)), ("symbol", "a")]
+    assert cache.hits == 1
+
+
+def test_memory_budget_evicts_least_recently_used():
+    lexer = _lexer()
+    # Too big for the budget at all, nothing is pushed out for it
+    cache = TokenCache(max_bytes=1)
+    cache.put("big", lexer.tokenise("a b c"))
+    assert cache.entries == {} and cache.evictions == 0
+
+    entry = token_size(lexer.tokenise("a b c"))
+    cache = TokenCache(max_bytes=2 * entry)
+    for key in ("one", "two", "three"):
+        cache.put(key, lexer.tokenise("a b c"))
+        if key == "two":
+            cache.get("one")
+    assert list(cache.entries) == ["one", "three"]
+    assert cache.evictions == 1 and cache.size <= cache.max_bytes
+
+
+def test_clear(tmp_path):
+    cache = TokenCache(tmp_path)
+    lexer = _lexer(cache)
+    lexer.tokenise("x")
+    cache.clear(disk=True)
+    assert cache.entries == {} and lexer.tokenise("x") == [("symbol", "x")]
+    assert cache.misses == 2
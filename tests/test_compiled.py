@@ -0,0 +1,123 @@
+"""
+The compiled backend must give exactly the tokens (or the error) the rules give one at a time.
+"""
+import random
+
+import pytest
+
+from parsall.core.rule import *
+from parsall.lexing import DefaultLexer
+from parsall.semantics import cpp, python
+
+ALPHABET = "ab_xyz019 \t\n+-*/=<>!&|()[]{};:,.'\"\\#é"
+
+# Built fresh for every lexer, `pick` chooses which ones take part
+RULE_POOL = [
+    lambda: WordSet("keyword", ["if", "in", "int", "for", "x"], word_boundary=True),
+    lambda: WordSet("keyword", ["if", "in", "int"]),
+    lambda: WordSet("empty", []),
+    lambda: WordSet("empty", [""]),
+    lambda: WordSet("operator", ["==", "=", "<=", "<<", "<", "->"]),
+    lambda: WordRule("arrow", "->"),
+    lambda: CharacterRule("arrow", "->"),
+    lambda: CharacterRule("empty", ""),
+    lambda: CharacterRule("newline", "\n"),
+    lambda: CharacterSet("operator", "+-*/=<>!&|"),
+    lambda: CharacterSet("bracket", "()[]{}"),
+    lambda: CharacterSet("nothing", ""),
+    lambda: CharacterSet("delim", ",.;:"),
+    lambda: CommentRule("//", "\n"),
+    lambda: CommentRule("/*", "*/"),
+    lambda: CommentRule("#", "\n"),
+    lambda: AlphaCharacterRule(),
+    lambda: IdentifierRule(),
+    lambda: NumberRule(),
+    lambda: StringRule(),
+]
+
+
+def _outcome(lexer, text):
+    try:
+        return lexer.tokenise(text)
+    except (ValueError, SyntaxError) as error:
+        return type(error)
+
+
+def _assert_same(make_rules, ignore, text):
+    interpreted = _outcome(DefaultLexer(make_rules(), ignore), text)
+    compiled = _outcome(DefaultLexer(make_rules(), ignore, compiled=True), text)
+    assert compiled == interpreted, (text, [type(rule).__name__ for rule in make_rules()])
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_rules_match_interpreted(seed):
+    rng = random.Random(seed)
+    pick = rng.sample(RULE_POOL, rng.randint(1, len(RULE_POOL)))
+    rng.shuffle(pick)
+    ignore = rng.choice([" \t\n", " \t", " "])
+
+    for _ in range(10):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40)))
+        _assert_same(lambda: [make() for make in pick], ignore, text)
+
+
+@pytest.mark.parametrize("pack", [python, cpp])
+def test_language_packs_match_interpreted(pack):
+    rng = random.Random(pack.__name__)
+    for _ in range(300):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 60)))
+        _assert_same(pack.rules, pack.ignore, text)
+
+
+def test_multi_character_character_rule_is_not_compiled():
+    rules = [CharacterRule("arrow", "->"), CharacterRule("e", ""), CharacterSet("operator", "->")]
+    lexer = DefaultLexer(rules, compiled=True)
+    assert lexer.tokenise("->") == [("operator", "-"), ("operator", ">")]
+
+
+def test_empty_word_set_does_not_loop():
+    lexer = DefaultLexer([WordSet("kw", []), IdentifierRule()], compiled=True)
+    assert lexer.tokenise("ab") == [("symbol", "ab")]
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+@pytest.mark.parametrize("pack", [python, cpp])
+def test_streaming_and_batches_match_tokenise(pack, compiled):
+    rng = random.Random(pack.__name__)
+    lexer = DefaultLexer(pack.rules(), pack.ignore, compiled=compiled)
+    inputs = []
+    while len(inputs) < 100:
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 30)))
+        if isinstance(_outcome(lexer, text), list):
+            inputs.append(text)
+
+    expected = [lexer.tokenise(text) for text in inputs]
+    assert lexer.tokenise_many(inputs, batch_size=7) == expected
+
+    for text, tokens in zip(inputs, expected):
+        assert list(lexer.iter_tokens(text[index:index + 3] for index in range(0, len(text), 3))) == tokens
+
+
+class SignedNumber(NumberRule):
+    # Inherits NumberRule's digits-only first_set, but also matches on "-"
+    def match(self, char_stream):
+        if char_stream.peek() == "-" and char_stream.peek(1) is not None and char_stream.peek(1).isdecimal():
+            char_stream.advance()
+            return ("Number", -NumberRule.match(self, char_stream)[1])
+        return NumberRule.match(self, char_stream)
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_subclass_overriding_match_is_tried_everywhere(compiled):
+    rules = [SignedNumber(), CharacterSet("op", "-+"), IdentifierRule()]
+    assert DefaultLexer(rules, compiled=compiled).tokenise("-5 a") == [("Number", -5), ("symbol", "a")]
+    assert dispatch_first_set(rules[0]) is None
+    assert dispatch_first_set(NumberRule()) is not None
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_batches_raise_like_tokenise(compiled):
+    lexer = DefaultLexer(python.rules(), python.ignore, compiled=compiled)
+    assert lexer.tokenise_many(["a", "", "  ", "b 1"]) == [[("symbol", "a")], [], [], [("symbol", "b"), ("Number", 1)]]
+    with pytest.raises(ValueError):
+        lexer.tokenise_many(["a", "1 ¬ 2", "b"])
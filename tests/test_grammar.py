@@ -0,0 +1,85 @@
+"""
+The grammar automaton must find exactly the matches of trying every rule at every token.
+"""
+import random
+
+import pytest
+
+from parsall.core.Streams import TokenStream
+from parsall.grammar import ANY, Chain, Ignore, MatchToken, MatchTokenID, Parser, RuleGroup
+
+KINDS = ["keyword", "symbol", "op"]
+VALUES = ["a", "b", "if", "+"]
+
+
+def _atom(rng):
+    if rng.random() < 0.4:
+        return MatchTokenID(rng.choice(KINDS))
+    return MatchToken(rng.choice(KINDS), rng.choice(VALUES))
+
+
+def _rule(rng, depth=0):
+    if depth < 2 and rng.random() < 0.3:
+        return RuleGroup([_rule(rng, depth + 1) for _ in range(rng.randint(1, 3))])
+    return Chain([_atom(rng) if rng.random() < 0.8 or depth >= 2 else _rule(rng, depth + 1)
+                  for _ in range(rng.randint(1, 3))])
+
+
+def _brute_force(rules, tokens):
+    found = set()
+    for index, rule in enumerate(rules):
+        for sequence in rule.sequences():
+            for start in range(len(tokens) - len(sequence) + 1):
+                window = tokens[start:start + len(sequence)]
+                if all(kind == token[0] and value in (ANY, token[1]) for (kind, value), token in zip(sequence, window)):
+                    found.add((index, start, start + len(sequence)))
+    return found
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_finditer_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rules = [_rule(rng) for _ in range(rng.randint(1, 6))]
+    tokens = [(rng.choice(KINDS + ["other"]), rng.choice(VALUES)) for _ in range(rng.randint(0, 60))]
+
+    parser = Parser(rules)
+    found = {(rules.index(match.rule), match.start, match.end) for match in parser.finditer(tokens)}
+    assert found == _brute_force(rules, tokens)
+    for match in parser.finditer(tokens):
+        assert match.tokens == tokens[match.start:match.end]
+
+
+def test_parse_takes_leftmost_longest():
+    short = Chain([MatchTokenID("symbol")], name="short")
+    long = Chain([MatchTokenID("symbol"), MatchToken("op", "=")], name="long")
+    tokens = [("symbol", "a"), ("op", "="), ("symbol", "b")]
+    matches = Parser([short, long]).parse(tokens)
+    assert [(match.name, match.start, match.end) for match in matches] == [("long", 0, 2), ("short", 2, 3)]
+
+
+def test_unmatched_tokens_need_ignore():
+    rule = Chain([MatchToken("keyword", "def"), MatchTokenID("symbol")])
+    tokens = [("symbol", "x"), ("keyword", "def"), ("symbol", "f")]
+    with pytest.raises(ValueError):
+        Parser([rule]).parse(tokens)
+    assert [(match.start, match.end) for match in Parser([rule, Ignore()]).parse(tokens)] == [(1, 3)]
+
+
+def test_skipped_kinds_inside_chains():
+    rule = Chain([MatchToken("keyword", "def"), MatchTokenID("symbol"), MatchToken("op", "(")])
+    tokens = [("keyword", "def"), ("comment", "c"), ("symbol", "f"), ("comment", "d"), ("op", "(")]
+    matches = Parser([rule, Ignore(["comment"])]).parse(tokens)
+    assert [(match.start, match.end) for match in matches] == [(0, 5)]
+    assert matches[0].tokens == [tokens[0], tokens[2], tokens[4]]
+
+
+def test_token_stream_and_unhashable_values():
+    rule = Chain([MatchTokenID("list"), MatchToken("op", "+")])
+    stream = TokenStream([("op", "+"), ("list", [1]), ("op", "+")])
+    stream.pop()
+    assert [(match.start, match.end) for match in Parser([rule]).finditer(stream)] == [(0, 2)]
+
+
+def test_empty_rule_is_rejected():
+    with pytest.raises(ValueError):
+        Parser([Chain([])])
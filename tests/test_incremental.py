@@ -0,0 +1,73 @@
+"""
+Editing an IncrementalLexer must leave the tokens a full scan of the edited text gives.
+"""
+import random
+
+import pytest
+
+from parsall.incremental import IncrementalLexer
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+WORDS = ["x", "name", "1", "2.5", "+", "==", "(", ")", " ", "\n", "'s'", "# c\n", "if", "for", ":"]
+
+
+def _source(rng, count):
+    return "".join(rng.choice(WORDS) for _ in range(count))
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_random_edits_match_full_scan(seed, compiled):
+    rng = random.Random(seed)
+    lexer = DefaultLexer(python.rules(), python.ignore, compiled=compiled)
+    text = _source(rng, 400)
+    # Small pieces and blocks so edits cross their boundaries
+    document = IncrementalLexer(lexer, text, margin=8, piece_size=16, block_size=4)
+
+    for _ in range(60):
+        start = rng.randint(0, len(text))
+        end = rng.randint(start, min(len(text), start + 12))
+        new_text = _source(rng, rng.randint(0, 4))
+        edited = text[:start] + new_text + text[end:]
+        try:
+            expected = list(lexer.scan(edited))
+        except (ValueError, SyntaxError):
+            with pytest.raises((ValueError, SyntaxError)):
+                document.edit(start, end, new_text)
+            assert document.text == text
+            continue
+
+        old = list(document)
+        first, old_stop, relexed = document.edit(start, end, new_text)
+        text = edited
+        assert document.text == text
+        assert list(document) == expected
+        assert old[:first] == expected[:first]
+        assert expected[first:first + len(relexed)] == relexed
+        assert len(expected) - len(relexed) - first == len(old) - old_stop
+
+
+def test_edit_relexes_only_near_the_edit():
+    lexer = DefaultLexer(python.rules(), python.ignore)
+    text = "value = 1\n" * 2000
+    document = IncrementalLexer(lexer, text, margin=16)
+
+    first, old_stop, relexed = document.edit(10005, 10006, "name")
+    assert old_stop - first < 20
+    assert len(relexed) < 20
+    assert document.tokens() == lexer.tokenise(text[:10005] + "name" + text[10006:])
+
+
+def test_empty_text():
+    lexer = DefaultLexer(python.rules(), python.ignore)
+    document = IncrementalLexer(lexer)
+    assert document.edit(0, 0, "a = 1") == (0, 0, [(("symbol", "a"), 0, 1), (("operator", "="), 2, 3), (("Number", 1), 4, 5)])
+    document.edit(0, 5, "")
+    assert list(document) == [] and document.text == ""
+
+
+def test_edit_outside_the_text():
+    document = IncrementalLexer(DefaultLexer(python.rules(), python.ignore), "a")
+    with pytest.raises(ValueError):
+        document.edit(0, 2, "")
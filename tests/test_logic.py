@@ -0,0 +1,95 @@
+"""
+Bit-parallel truth tables must agree with evaluating every assignment one at a time.
+"""
+import random
+from itertools import product
+
+import pytest
+
+from parsall.logic import CompiledExpression, TruthTable, column, equivalent, truth_table, variables
+
+NAMES = ["A", "B", "C", "D", "E"]
+
+
+def _tree(rng, depth=0):
+    if depth >= 4 or rng.random() < 0.3:
+        return rng.choice(NAMES)
+    op = rng.choice(["NOT", "AND", "OR", "AND_LIST"])
+    if op == "NOT":
+        return ("NOT", _tree(rng, depth + 1))
+    operands = [_tree(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    if op == "AND_LIST":
+        return ("AND", operands)
+    return (op, *operands)
+
+
+def _evaluate(tree, assignment):
+    if isinstance(tree, str):
+        return assignment[tree]
+    if tree[0] == "NOT":
+        return not _evaluate(tree[1], assignment)
+    operands = tree[1] if len(tree) == 2 and isinstance(tree[1], list) else tree[1:]
+    values = [_evaluate(operand, assignment) for operand in operands]
+    return all(values) if tree[0] == "AND" else any(values)
+
+
+def _rows(names):
+    # Row r gives the first variable the most significant bit
+    return [dict(zip(names, bits)) for bits in product([False, True], repeat=len(names))]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_truth_table_matches_row_by_row(seed):
+    rng = random.Random(seed)
+    tree = _tree(rng)
+    names = variables(tree)
+    table = truth_table(tree)
+    expression = CompiledExpression(tree)
+
+    expected = [_evaluate(tree, row) for row in _rows(names)]
+    assert [value for _, value in table] == expected
+    assert table.minterms() == [row for row, value in enumerate(expected) if value]
+    assert table.count() == sum(expected)
+    assert table.is_tautology() == all(expected)
+    assert table.is_satisfiable() == any(expected)
+    for row in _rows(names):
+        assert table[row] == expression.evaluate(row) == _evaluate(tree, row)
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_equivalent_gives_a_real_counterexample(seed):
+    rng = random.Random(seed)
+    first, second = _tree(rng), _tree(rng)
+    same, assignment = equivalent(first, second)
+    names = sorted(set(variables(first)) | set(variables(second)))
+    assert same == all(_evaluate(first, row) == _evaluate(second, row) for row in _rows(names))
+    if not same:
+        assert _evaluate(first, assignment) != _evaluate(second, assignment)
+
+
+def test_known_laws():
+    assert equivalent(("NOT", ("AND", "A", "B")), ("OR", ("NOT", "A"), ("NOT", "B"))) == (True, None)
+    assert equivalent(("OR", "A", ("AND", "A", "B")), "A") == (True, None)
+    assert truth_table(("OR", "A", ("NOT", "A"))).is_tautology()
+    assert not truth_table(("AND", "A", ("NOT", "A"))).is_satisfiable()
+    assert truth_table(("AND", [])).is_tautology() and not truth_table(("OR",)).is_satisfiable()
+
+
+def test_columns_and_variable_order():
+    assert [column(index, 3) for index in range(3)] == [0b11110000, 0b11001100, 0b10101010]
+    table = truth_table(("AND", "B", ("NOT", "A")), ["A", "B", "C"])
+    assert table.variables == ["A", "B", "C"]
+    assert table.minterms() == [2, 3]
+    assert table.assignment(2) == {"A": False, "B": True, "C": False}
+    assert table == TruthTable(["A", "B", "C"], 0b1100)
+
+
+def test_many_variables():
+    names = [f"x{index}" for index in range(20)]
+    table = truth_table(("OR", *names))
+    assert table.count() == (1 << 20) - 1 and table.minterms()[:2] == [1, 2]
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError):
+        truth_table(("XOR", "A", "B"))
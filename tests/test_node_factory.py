@@ -0,0 +1,111 @@
+"""
+Shared expression nodes must be unique per expression, and simplifying must keep the meaning.
+"""
+import random
+
+import pytest
+
+from parsall.logic import NodeFactory, equivalent, postorder, truth_table
+
+NAMES = ["A", "B", "C", "D"]
+
+
+def _tree(rng, depth=0):
+    if depth >= 4 or rng.random() < 0.25:
+        return rng.choice(NAMES)
+    op = rng.choice(["NOT", "AND", "OR"])
+    if op == "NOT":
+        return ("NOT", _tree(rng, depth + 1))
+    return (op, *(_tree(rng, depth + 1) for _ in range(rng.randint(0, 3))))
+
+
+def _node(factory, rng, depth=0):
+    # Built straight from the factory, constants included
+    if depth >= 4 or rng.random() < 0.25:
+        return rng.choice([factory.variable(rng.choice(NAMES))] * 4 + [factory.constant(rng.random() < 0.5)])
+    op = rng.choice(["NOT", "AND", "OR"])
+    if op == "NOT":
+        return factory.negate(_node(factory, rng, depth + 1))
+    operands = [_node(factory, rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return factory.conjunction(operands) if op == "AND" else factory.disjunction(operands)
+
+
+def _size(root):
+    return sum(1 for _ in postorder(root))
+
+
+def test_same_expression_same_node():
+    factory = NodeFactory()
+    a, b = factory.variable("A"), factory.variable("B")
+    assert factory.variable("A") is a
+    assert factory.conjunction([a, b]) is factory.conjunction([b, a, b])
+    assert factory.disjunction([a]) is a
+    assert factory.conjunction([]) is factory.constant(True)
+    assert factory.negate(a) is factory.negate(factory.variable("A"))
+    assert factory.conjunction([a, b]) is not factory.disjunction([a, b])
+    assert factory.stats()["hits"] > 0
+
+
+def test_build_shares_repeated_subtrees():
+    factory = NodeFactory()
+    term = ("AND", "A", ("NOT", "B"))
+    root = factory.build(("OR", term, ("AND", ("NOT", "B"), "A"), ("NOT", term)))
+    # A, B, B', AB', (AB')' and the OR
+    assert _size(root) == 6
+    assert factory.build(term) in root.children
+    with pytest.raises(ValueError):
+        factory.build(("XOR", "A", "B"))
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_node_truth_table_matches_tree(seed):
+    rng = random.Random(seed)
+    tree = _tree(rng)
+    factory = NodeFactory()
+    root = factory.build(tree)
+    names = sorted(factory.variables(root))
+    assert truth_table(root, names) == truth_table(tree, names)
+    for assignment, value in truth_table(tree, names):
+        assert factory.evaluate(root, assignment) == value
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_simplify_keeps_the_meaning(seed):
+    rng = random.Random(seed)
+    factory = NodeFactory()
+    root = _node(factory, rng)
+    simple = factory.simplify(root)
+
+    names = sorted(factory.variables(root))
+    assert truth_table(simple, names) == truth_table(root, names)
+    assert _size(simple) <= _size(root) + 1
+    # Simplifying again changes nothing and comes from the cache
+    hits = factory.analysis_hits["simplify"]
+    assert factory.simplify(root) is simple
+    assert factory.analysis_hits["simplify"] == hits + 1
+    assert factory.simplify(simple) is factory.simplify(factory.simplify(simple))
+
+
+def test_simplify_rules():
+    factory = NodeFactory()
+    a, b = factory.variable("A"), factory.variable("B")
+    not_a = factory.negate(a)
+    assert factory.simplify(factory.negate(not_a)) is a
+    assert factory.simplify(factory.conjunction([a, not_a])) is factory.constant(False)
+    assert factory.simplify(factory.disjunction([a, not_a])) is factory.constant(True)
+    assert factory.simplify(factory.conjunction([a, factory.disjunction([a, b])])) is a
+    assert factory.simplify(factory.disjunction([a, factory.conjunction([a, b])])) is a
+    assert factory.simplify(factory.conjunction([a, factory.constant(True)])) is a
+    assert factory.simplify(factory.conjunction([factory.conjunction([a, b]), a])) is factory.conjunction([a, b])
+    assert equivalent(factory.simplify(factory.negate(factory.constant(False))), factory.constant(True))[0]
+
+
+def test_variables_are_cached_per_node():
+    factory = NodeFactory()
+    shared = factory.build(("AND", "A", ("NOT", "B")))
+    root = factory.disjunction([shared, factory.variable("C")])
+    assert factory.variables(shared) == {"A", "B"}
+    misses = factory.analysis_misses["variables"]
+    assert factory.variables(root) == {"A", "B", "C"}
+    # Only the new nodes, the OR and C, are worked out
+    assert factory.analysis_misses["variables"] == misses + 2
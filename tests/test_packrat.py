@@ -0,0 +1,96 @@
+"""
+Packrat memoisation must not change what a parser produces, only how often rules run.
+"""
+from functools import partial
+
+import random
+
+from parsall.core._parser import ASTNode, BinaryOpRule, ChoiceRule, NumberRule, PackratMemo, Parser, ParenRule, ParserRule
+
+
+def test_memo_counts_hits_and_misses():
+    memo = PackratMemo()
+    assert memo.get("rule", 0) is None
+    memo.put("rule", 0, "node", 3)
+    assert memo.get("rule", 0) == ("node", 3)
+    assert memo.stats() == {"hits": 1, "misses": 1, "evictions": 0, "size": 1, "hit_rate": 0.5}
+
+
+def test_limit_evicts_least_recently_used():
+    memo = PackratMemo(limit=2)
+    memo.put("a", 0, "a", 1)
+    memo.put("b", 0, "b", 1)
+    memo.get("a", 0)
+    memo.put("c", 0, "c", 1)
+    assert memo.get("b", 0) is None
+    assert memo.get("a", 0) == ("a", 1) and memo.get("c", 0) == ("c", 1)
+    assert memo.evictions == 1 and len(memo.table) == 2
+
+
+def test_window_forgets_positions_left_behind():
+    memo = PackratMemo(window=2)
+    for position in range(6):
+        memo.put("rule", position, position, position + 1)
+    assert sorted(position for _, position in memo.table) == [3, 4, 5]
+    assert memo.evictions == 3
+
+
+class Assignment(ParserRule):
+    # Parses a term, then gives up unless "=" follows, so the term is tried again
+    def match(self):
+        target = self.parser.parse_term()
+        if target is None or self.parser.peek_token()[0] != "=":
+            return None
+        self.parser.get_token()
+        return ASTNode("=", [target, self.parser.parse_expression()])
+
+
+def _parser(tokens, **options):
+    term = partial(ChoiceRule, alternatives=[NumberRule, ParenRule])
+    return Parser(tokens, partial(ChoiceRule, alternatives=[Assignment, term]), term, **options)
+
+
+def test_backtracking_reuses_memoised_terms():
+    tokens = [("(", "("), ("number", "1"), (")", ")"), ("=", "="), ("number", "2")]
+    plain = _parser(tokens).parse()
+    parser = _parser(tokens, packrat=True)
+    assert repr(parser.parse()) == repr(plain)
+    assert parser.memo.hits > 0
+
+    tokens = [("(", "("), ("(", "("), ("number", "1"), (")", ")"), (")", ")")]
+    parser = _parser(tokens, packrat=True)
+    assert repr(parser.parse()) == repr(_parser(tokens).parse())
+    assert parser.memo.hits > 0
+
+
+def _chain_parser(tokens, **options):
+    term = partial(ChoiceRule, alternatives=[NumberRule, ParenRule])
+    rule = term
+    for level in (["*", "/"], ["+", "-"], ["<", ">"]):
+        rule = partial(BinaryOpRule, ops=level, next_rule=rule)
+    return Parser(tokens, rule, term, **options)
+
+
+def _expression_tokens(rng, operands, depth):
+    tokens = []
+    for index in range(operands):
+        if index:
+            op = rng.choice("*/+-<>")
+            tokens.append((op, op))
+        if depth and rng.random() < 0.3:
+            tokens.append(("(", "("))
+            tokens.extend(_expression_tokens(rng, 3, depth - 1))
+            tokens.append((")", ")"))
+        else:
+            tokens.append(("number", str(rng.randint(0, 9))))
+    return tokens
+
+
+def test_bounded_memos_give_the_same_tree():
+    tokens = _expression_tokens(random.Random(0), 300, 4)
+    expected = repr(_chain_parser(tokens).parse())
+    for options in ({}, {"memo_limit": 50}, {"memo_window": 8}):
+        parser = _chain_parser(tokens, packrat=True, **options)
+        assert repr(parser.parse()) == expected
+        if options:
+            assert parser.memo.evictions > 0
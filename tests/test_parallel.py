@@ -0,0 +1,73 @@
+"""
+Lexing in chunks and merging them must give exactly the tokens of a sequential scan.
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from parsall import parallel
+from parsall.lexing import DefaultLexer
+from parsall.recovery import recover_scan
+from parsall.semantics import cpp
+
+FRAGMENTS = ["x", "name", "12", "+", "<<=", ";", " ", "\n", "\n", '"s t"', "// line\n", "/* a\n\n b */", "if", "{", "}"]
+
+
+def _source(rng, count, bad=""):
+    return "".join(rng.choice(FRAGMENTS + list(bad)) for _ in range(count))
+
+
+def _merged(lexer, text, chunk_size, overlap, margin):
+    # The worker side run in this process, one chunk at a time
+    parallel._init_worker(lexer)
+    starts = parallel.split_points(text, chunk_size)
+    ends = starts[1:] + [len(text)]
+    chunks = []
+    for start, end in zip(starts, ends):
+        end = min(end + overlap, len(text))
+        chunks.append(parallel._lex_chunk(text[start:end], start, end == len(text), margin))
+    return parallel._merge(lexer, text, starts, chunks)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_merge_matches_scan(seed):
+    rng = random.Random(seed)
+    lexer = DefaultLexer(cpp.rules(), cpp.ignore, compiled=seed % 2 == 0)
+    text = _source(rng, rng.randint(0, 600))
+    # Overlaps shorter than a comment force the parent to lex the gap itself
+    merged = _merged(lexer, text, rng.randint(1, 80), rng.choice([0, 3, 20, 200]), rng.choice([0, 4, 16]))
+    assert merged == list(lexer.scan(text))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merge_with_recover_matches_recover_scan(seed):
+    rng = random.Random(seed)
+    lexer = DefaultLexer(cpp.rules(), cpp.ignore, recover=True)
+    text = _source(rng, rng.randint(0, 400), bad="@`$")
+    merged = _merged(lexer, text, rng.randint(1, 60), rng.choice([0, 5, 50]), 8)
+    assert merged == list(recover_scan(lexer, text))
+
+
+def test_merge_raises_like_scan():
+    lexer = DefaultLexer(cpp.rules(), cpp.ignore)
+    text = "a = 1;\n" * 50 + "@\n" + "b = 2;\n" * 50
+    with pytest.raises(ValueError):
+        _merged(lexer, text, 40, 10, 8)
+
+
+def test_pool(monkeypatch, tmp_path):
+    rng = random.Random(0)
+    lexer = DefaultLexer(cpp.rules(), cpp.ignore, compiled=True)
+    texts = [_source(rng, 2000), _source(rng, 10), ""]
+    paths = []
+    for index, text in enumerate(texts):
+        paths.append(tmp_path / f"{index}.cpp")
+        paths[-1].write_text(text, encoding="utf-8")
+
+    # Threads run the same worker code without starting processes
+    monkeypatch.setattr(parallel, "ProcessPoolExecutor", ThreadPoolExecutor)
+    expected = [lexer.tokenise(text) for text in texts]
+    assert parallel.parallel_tokenise(lexer, paths, max_workers=2, split_size=500, overlap=50) == expected
+    assert parallel.parallel_tokenise_text(lexer, texts[0], max_workers=2, chunk_size=300, overlap=30, spans=True) \
+        == list(lexer.scan(texts[0]))
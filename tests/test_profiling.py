@@ -0,0 +1,24 @@
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+SOURCE = "def f(x, y=2):\n    return x + y # sum\nname = 'text'\n" * 20
+
+
+def test_estimate_for_current_order_matches_recorded_attempts():
+    lexer = DefaultLexer(python.rules(), python.ignore, profile=True)
+    lexer.tokenise(SOURCE)
+    profiler = lexer.profiler
+
+    recorded = sum(rule.attempts for rule in profiler.rules)
+    assert profiler.estimated_attempts() == recorded
+    assert profiler.estimated_attempts([rule.rule for rule in profiler.rules]) == recorded
+
+
+def test_reordering_advice_compares_like_with_like():
+    lexer = DefaultLexer(python.rules(), python.ignore, profile=True)
+    lexer.tokenise(SOURCE)
+    profiler = lexer.profiler
+
+    ordered = profiler.estimated_attempts(profiler.suggested_order())
+    notes = profiler.suggestions()
+    assert (ordered < profiler.estimated_attempts()) == any("hit frequency" in note for note in notes)
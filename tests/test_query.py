@@ -0,0 +1,56 @@
+"""
+Index driven queries must find exactly what checking every position finds.
+"""
+import random
+
+import pytest
+
+from parsall.query import TokenIndex
+
+KINDS = ["keyword", "symbol", "op"]
+VALUES = ["a", "b", "+", 1]
+
+
+def _brute_force(tokens, pattern):
+    return [
+        start for start in range(len(tokens) - len(pattern) + 1)
+        if all((kind is None or token[0] == kind) and (value is None or token[1] == value)
+               for (kind, value), token in zip(pattern, tokens[start:]))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_find_all_matches_brute_force(seed):
+    rng = random.Random(seed)
+    tokens = [(rng.choice(KINDS), rng.choice(VALUES)) for _ in range(rng.randint(0, 80))]
+    index = TokenIndex(tokens)
+
+    for _ in range(20):
+        pattern = tuple((rng.choice(KINDS + [None]), rng.choice(VALUES + [None])) for _ in range(rng.randint(1, 4)))
+        assert index.find_all(*pattern) == _brute_force(tokens, pattern)
+        assert index.count(*pattern) == len(_brute_force(tokens, pattern))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_find_many_matches_find_all(seed):
+    rng = random.Random(seed)
+    tokens = [(rng.choice(KINDS), rng.choice(VALUES)) for _ in range(rng.randint(0, 80))]
+    index = TokenIndex(tokens)
+    patterns = [tuple((rng.choice(KINDS), rng.choice(VALUES + [None])) for _ in range(rng.randint(1, 3)))
+                for _ in range(10)]
+    assert index.find_many(patterns) == {pattern: index.find_all(*pattern) for pattern in patterns}
+
+
+def test_unhashable_values():
+    tokens = [("list", [1]), ("op", "+"), ("list", [1]), ("list", [2])]
+    index = TokenIndex(tokens)
+    assert index.find_all(("list", [1])) == [0, 2]
+    assert index.find_all(("op", "+"), ("list", None)) == [1]
+
+
+def test_bad_patterns():
+    index = TokenIndex([("op", "+")])
+    with pytest.raises(ValueError):
+        index.find_all()
+    with pytest.raises(ValueError):
+        index.find_many([((None, "+"),)])
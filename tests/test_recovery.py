@@ -0,0 +1,71 @@
+"""
+A lexer with `recover` turns bad input into error tokens and diagnostics, and lexes the rest as usual.
+"""
+import random
+
+import pytest
+
+from parsall.lexing import DefaultLexer
+from parsall.recovery import Diagnostic, recover_scan
+from parsall.semantics import python
+
+
+@pytest.fixture(params=[False, True], ids=["interpreted", "compiled"])
+def lexer(request):
+    return DefaultLexer(python.rules(), python.ignore, compiled=request.param, recover=True)
+
+
+def _diagnostics(lexer):
+    return [(d.start, d.end, d.message) for d in lexer.diagnostics]
+
+
+def test_bad_run_becomes_one_error_token(lexer):
+    assert lexer.tokenise("a $$ $ b") == [("symbol", "a"), ("Error", "$$ $"), ("symbol", "b")]
+    assert _diagnostics(lexer) == [(2, 6, "Syntax error in input text: $")]
+
+
+def test_unterminated_string(lexer):
+    tokens = lexer.tokenise('a = "open\nb = 2')
+    assert tokens[2] == ("Error", '"')
+    assert tokens[3:] == [("symbol", "open"), ("newline", "\n"), ("symbol", "b"), ("operator", "="), ("Number", 2)]
+    assert _diagnostics(lexer) == [(4, 5, "Syntax error in input text")]
+
+
+def test_error_at_the_end(lexer):
+    assert lexer.tokenise("x $ ") == [("symbol", "x"), ("Error", "$")]
+    assert _diagnostics(lexer) == [(2, 3, "Syntax error in input text: $")]
+
+
+def test_diagnostics_are_for_the_latest_input(lexer):
+    lexer.tokenise("$")
+    assert len(lexer.diagnostics) == 1
+    assert lexer.tokenise("a = 1") == DefaultLexer(python.rules(), python.ignore).tokenise("a = 1")
+    assert lexer.diagnostics == []
+
+
+def test_buffer(lexer):
+    buffer = lexer.tokenise_buffer("a ? b")
+    assert list(buffer) == [("symbol", "a"), ("Error", "?"), ("symbol", "b")]
+    assert buffer.span(1) == (2, 3)
+    assert _diagnostics(lexer) == [(2, 3, "Syntax error in input text: ?")]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_tokens_outside_errors_match_scan(seed):
+    rng = random.Random(seed)
+    plain = DefaultLexer(python.rules(), python.ignore)
+    lexer = DefaultLexer(python.rules(), python.ignore, recover=True)
+    text = "".join(rng.choice(["x", "1", " ", "\n", "+", "$", "?", "'s'", "'", "# c\n"]) for _ in range(80))
+
+    diagnostics = []
+    scanned = list(recover_scan(lexer, text, 0, diagnostics))
+    assert [token for token, _, _ in scanned] == lexer.tokenise(text)
+
+    position = 0
+    for diagnostic in diagnostics + [Diagnostic(len(text), len(text), "")]:
+        # Between errors, the tokens are those of a plain scan of that stretch
+        between = [span for span in scanned if position <= span[1] and span[2] <= diagnostic.start]
+        assert between == list(plain.scan(text[:diagnostic.start], position))
+        position = diagnostic.end
+        if diagnostic.message:
+            assert (("Error", text[diagnostic.start:diagnostic.end]), diagnostic.start, diagnostic.end) in scanned
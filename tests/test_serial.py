@@ -0,0 +1,109 @@
+"""
+Token lists and trees must read back from the binary format exactly as written.
+"""
+import io
+import random
+from fractions import Fraction
+
+import pytest
+
+from parsall.core import serial
+from parsall.core._parser import ASTNode
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+
+def _tokens(count, seed=0):
+    rng = random.Random(seed)
+    values = ["x", "", "é\U0001f600", "\ud800", 0, -1, 2 ** 70, -2 ** 70, 1.5, None, True, False]
+    return [(rng.choice(["symbol", "Number", "kind é"]), rng.choice(values)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("count", [0, 1, serial.BLOCK, 3 * serial.BLOCK + 7])
+def test_tokens_round_trip(count):
+    tokens = _tokens(count)
+    loaded = serial.loads(serial.dumps(tokens))
+    assert len(loaded) == count and not loaded.has_spans
+    assert list(loaded) == tokens
+    # Random access decodes the block the token is in
+    for index in random.Random(1).sample(range(count), min(count, 50)):
+        assert loaded[index] == tokens[index]
+    if count:
+        assert loaded[-1] == tokens[-1]
+
+
+def test_spans_round_trip():
+    tokens = _tokens(2 * serial.BLOCK + 3)
+    spans = []
+    position = 0
+    for _ in tokens:
+        start = position + random.randint(0, 3)
+        position = start + random.randint(0, 5)
+        spans.append((start, position))
+
+    loaded = serial.loads(serial.dumps(tokens, spans))
+    assert loaded.has_spans
+    assert list(loaded.scan()) == [(token, start, end) for token, (start, end) in zip(tokens, spans)]
+    assert loaded.span(serial.BLOCK + 1) == spans[serial.BLOCK + 1]
+
+
+def test_token_buffer_keeps_its_spans(tmp_path):
+    text = "a = 'b' + 12 # c\n" * 200
+    buffer = DefaultLexer(python.rules(), python.ignore).tokenise_buffer(text)
+    path = tmp_path / "tokens"
+    with open(path, "wb") as file:
+        serial.dump(buffer, file)
+
+    with serial.load(path) as loaded:
+        assert list(loaded) == list(buffer)
+        assert [loaded.span(index) for index in range(len(loaded))] == list(zip(buffer.starts, buffer.ends))
+
+
+def test_pickled_values_need_objects(tmp_path):
+    data = serial.dumps([("Number", Fraction(1, 3))])
+    with pytest.raises(ValueError):
+        list(serial.loads(data))
+    assert list(serial.loads(data, objects=True)) == [("Number", Fraction(1, 3))]
+
+    path = tmp_path / "tokens"
+    path.write_bytes(data)
+    with serial.load(path) as loaded, pytest.raises(ValueError):
+        list(loaded)
+    with serial.load(path, objects=True) as loaded:
+        assert list(loaded) == [("Number", Fraction(1, 3))]
+
+
+@pytest.mark.parametrize("data, message", [(b"", "too short"), (b"PLTK", "too short"), (b"x" * 100, "expected kind")])
+def test_bad_data_is_a_value_error(tmp_path, data, message):
+    path = tmp_path / "tokens"
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match=message):
+        serial.load(path)
+    with pytest.raises(ValueError, match=message):
+        serial.loads(data)
+    with pytest.raises(ValueError, match=message):
+        serial.load_tree(path)
+
+
+def _same_tree(left, right):
+    return (left.type == right.type and left.value == right.value and len(left.children) == len(right.children)
+            and all(_same_tree(a, b) for a, b in zip(left.children, right.children)))
+
+
+def test_tree_round_trip(tmp_path):
+    tree = ASTNode("module", [
+        ASTNode("assign", [ASTNode("name", value="x"), ASTNode("number", value=-3)]),
+        ASTNode("call", [ASTNode("name", value="f")] + [ASTNode("number", value=n) for n in range(2000)]),
+        ASTNode("pass"),
+    ])
+    path = tmp_path / "tree"
+    with open(path, "wb") as file:
+        serial.dump_tree(tree, file)
+    assert _same_tree(serial.load_tree(path), tree)
+
+    objects = ASTNode("fraction", value=Fraction(2, 3))
+    out = io.BytesIO()
+    serial.dump_tree(objects, out)
+    with pytest.raises(ValueError):
+        serial.load_tree(io.BytesIO(out.getvalue()))
+    assert serial.load_tree(io.BytesIO(out.getvalue()), objects=True).value == Fraction(2, 3)
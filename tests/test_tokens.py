@@ -0,0 +1,39 @@
+"""
+TokenBuffer spans must hold any offset of the source they cover.
+"""
+import mmap
+
+import pytest
+
+from parsall.core.tokens import TokenBuffer
+from parsall.lexing import DefaultLexer
+from parsall.semantics import python
+
+
+def test_buffer_matches_tokenise():
+    lexer = DefaultLexer(python.rules(), python.ignore)
+    text = "a = 'b\\'c' + 12 # note\nif x: pass\n"
+    buffer = lexer.tokenise_buffer(text)
+    assert list(buffer) == lexer.tokenise(text)
+    assert buffer.starts.typecode == "I"
+
+
+def test_offsets_past_4_gib(tmp_path):
+    path = tmp_path / "large"
+    size = (1 << 32) + 16
+    try:
+        # Sparse, only the last page is written
+        with open(path, "wb") as file:
+            file.seek(size - 8)
+            file.write(b"name = 1")
+        file = open(path, "rb")
+    except OSError:
+        pytest.skip("no room for a sparse 4 GiB file")
+
+    with file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = TokenBuffer(mapped)
+        buffer.add("symbol", size - 8, size - 4)
+        assert buffer.starts.typecode == "Q"
+        assert buffer[0] == ("symbol", "name")
+        assert buffer.span(0) == (size - 8, size - 4)
+        del buffer
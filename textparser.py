@@ -1,46 +1,26 @@
 from typing import List, Tuple
-from parsall.core.Streams import CharacterStream
-from parsall.lexing import DefaultLexer
-from parsall.core.rule import *
-from parsall.semantics import python
+import parsall
+from parsall.query import TokenIndex
 
 if __name__ == "__main__":
 
-    rules = [
-        WordSet("keyword", python.keywords), 
-        IdentifierRule(), 
-        NumberRule(), 
-        CharacterSet("operator", python.standard_operators), 
-        CharacterSet("bracket", python.standard_brackets), 
-        CharacterSet("delim", ',.:'), 
-        CharacterRule("newline", '\n'), 
-        CommentRule("#", '\n'),
-        StringRule()
-    ]
-
-    lexer = DefaultLexer(rules, ignore=" ;\t\r")
+    # The rules live in parsall.semantics.python, built once and shared
+    lexer = parsall.get_lexer("python")
 
     text = ""
     with open("test.code", 'r') as file:
         text = file.read()
 
-    import pprint
+    from parsall.core import serial
     result = lexer.tokenise(text)
 
-    with open("lexer.log", "w") as log_file:
-        pprint.pprint(result, log_file)
-
-    count = 0
-    assignment_count = 0
-    for i in range(len(result)-3):
-        tok1 = result[i]
-        tok2 = result[i+1]
-        tok3 = result[i+2]
+    # Read it back with serial.load("lexer.tokens")
+    with open("lexer.tokens", "wb") as token_file:
+        serial.dump(result, token_file)
 
-        if tok1[0] == "keyword" and tok2[0] == "symbol" and tok3[0] == "bracket":
-            if tok1[1] == 'def':
-                count += 1
-        elif tok1[1] == '=':
-            assignment_count += 1
+    # The first query indexes the tokens, every query after that is a lookup
+    index = TokenIndex(result)
+    count = index.count(("keyword", "def"), ("symbol", None), ("bracket", None))
+    assignment_count = index.count(("operator", "="))
 
     print(f"{count} total functions were found and {assignment_count} variable assignments were made")
\ No newline at end of file